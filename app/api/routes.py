@@ -1,33 +1,173 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from typing import List
-from app.models.query import QueryRequest, QueryResponse
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
+from typing import Any, List, Optional
+from app.core.config import settings
+from app.models.query import COLLECTION_PATTERN, BatchQueryResult, QueryRequest, QueryResponse
+from app.services.ingestion_jobs import IngestionJobs, IngestionQueueFull, JobStore
+from app.services.llm_gateway import LLMUnavailable
 from app.services.rag_pipeline import RAGPipeline
+from app.services.vector_store import CollectionNotFound
 
 router = APIRouter()
-rag_pipeline = RAGPipeline()
+_rag_pipeline: Optional[RAGPipeline] = None
+_ingestion_jobs: Optional[IngestionJobs] = None
+
+def get_rag_pipeline() -> RAGPipeline:
+    """
+    Shared pipeline instance, created on first use; its models load lazily
+    """
+    global _rag_pipeline
+    if _rag_pipeline is None:
+        _rag_pipeline = RAGPipeline()
+    return _rag_pipeline
+
+def get_ingestion_jobs() -> IngestionJobs:
+    """
+    Shared ingestion job queue; job state lives in the SQLite file INGEST_JOBS_DB
+    """
+    global _ingestion_jobs
+    if _ingestion_jobs is None:
+        _ingestion_jobs = IngestionJobs(
+            get_rag_pipeline(),
+            JobStore(settings.INGEST_JOBS_DB),
+            workers=settings.INGEST_WORKERS,
+            max_queued=settings.INGEST_QUEUE_MAX
+        )
+    return _ingestion_jobs
 
 @router.post("/query", response_model=QueryResponse)
-async def process_query(query: QueryRequest):
+async def process_query(query: QueryRequest, rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)):
     """
     Process a query using the RAG pipeline
     """
     try:
-        response = await rag_pipeline.process_query(query.text)
+        response = await rag_pipeline.process_query(
+            query.text,
+            fusion=query.fusion_overrides(),
+            session_id=query.session_id,
+            where=query.where_filter(),
+            collection=query.collection
+        )
         return QueryResponse(
             answer=response["answer"],
             sources=response["sources"],
-            confidence=response["confidence"]
+            confidence=response["confidence"],
+            context_tokens_saved=response.get("context_tokens_saved", 0),
+            session_id=query.session_id,
+            timings=response["timings"] if query.include_timings else None
+        )
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LLMUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/batch", response_model=List[BatchQueryResult])
+async def process_query_batch(queries: List[QueryRequest], rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)):
+    """
+    Process a batch of queries with shared embedding and vector search.
+    Failed items carry an `error` instead of failing the whole batch.
+    """
+    if len(queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {settings.BATCH_MAX_QUERIES} queries")
+    if any(query.session_id for query in queries):
+        raise HTTPException(status_code=400, detail="Sessions are not supported in batch queries")
+    try:
+        responses = await rag_pipeline.process_queries(
+            [query.text for query in queries],
+            fusion=[query.fusion_overrides() for query in queries],
+            where=[query.where_filter() for query in queries],
+            collections=[query.collection for query in queries]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return [
+        BatchQueryResult(answer="", sources=[], confidence=0.0, error=str(response))
+        if isinstance(response, Exception)
+        else BatchQueryResult(**{**response, "timings": response["timings"] if query.include_timings else None})
+        for query, response in zip(queries, responses)
+    ]
 
-@router.post("/ingest/document")
-async def ingest_document(file: UploadFile = File(...)):
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/query/stream")
+async def stream_query(query: QueryRequest, rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)):
+    """
+    Process a query and stream the answer as Server-Sent Events:
+    a `sources` event, then `token` events, then `done` (or `error`);
+    `done` carries per-stage timings when `include_timings` is set
+    """
+    async def event_stream():
+        try:
+            async for event in rag_pipeline.stream_query(
+                query.text,
+                fusion=query.fusion_overrides(),
+                session_id=query.session_id,
+                where=query.where_filter(),
+                collection=query.collection
+            ):
+                if event["event"] == "done" and not query.include_timings:
+                    event["data"].pop("timings", None)
+                yield _sse(event["event"], event["data"])
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@router.post("/ingest/document", status_code=202)
+async def ingest_document(
+    file: UploadFile = File(...),
+    collection: Optional[str] = Query(None, pattern=COLLECTION_PATTERN),
+    jobs: IngestionJobs = Depends(get_ingestion_jobs)
+):
     """
-    Ingest a new document (PDF or CSV) into the vector database
+    Queue a document (PDF or CSV) for ingestion into the vector database,
+    optionally into a named collection, created on first use.
+    Returns at once with a job; poll /ingest/jobs/{job_id} for progress.
     """
     try:
-        result = await rag_pipeline.ingest_document(file)
-        return {"message": "Document ingested successfully", "details": result}
+        job = await jobs.submit(file, collection)
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Document queued for ingestion", "details": job}
+
+@router.get("/ingest/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, jobs: IngestionJobs = Depends(get_ingestion_jobs)):
+    """
+    Status of an ingestion job: chunks parsed, embedded and stored, throughput and errors
+    """
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job {job_id} not found")
+    return job
+
+@router.delete("/documents/{source}")
+async def delete_document(
+    source: str,
+    collection: Optional[str] = Query(None, pattern=COLLECTION_PATTERN),
+    rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)
+):
+    """
+    Remove a document (by its uploaded file name) and all its chunks
+    """
+    try:
+        details = await rag_pipeline.delete_document(source, collection)
+    except CollectionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if details is None:
+        raise HTTPException(status_code=404, detail=f"Document {source} not found")
+    return {"message": "Document deleted", "details": details}
+
+@router.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str, rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)):
+    """
+    Forget a conversation session and its history
+    """
+    if not await asyncio.to_thread(rag_pipeline.sessions.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
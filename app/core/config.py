@@ -10,19 +10,124 @@ class Settings(BaseSettings):
     # Environment
     ENV: str = os.getenv("ENV", "development")
     
+    # Logging: JSON lines (or "text") to stdout and LOG_FILE ("" for stdout only), written by a
+    # background thread through a queue of LOG_QUEUE_SIZE records (full queue drops records);
+    # LOG_SAMPLE_RATE keeps the INFO logs of that share of requests
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_FILE: str = os.getenv("LOG_FILE", "logs/app.log")
+    LOG_ASYNC: bool = os.getenv("LOG_ASYNC", "true").lower() == "true"
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    
     # API Keys
     GROQ_API_KEY: Optional[str] = os.getenv("GROQ_API_KEY", "")
     
     # Vector Database
     VECTORDB_PATH: str = os.getenv("VECTORDB_PATH", "./data/vectordb")
     
+    # Vector index backend: "chroma", or "numpy" (memory-mapped matrix under VECTORDB_PATH/numpy,
+    # exact search; VECTOR_IVF_LISTS > 0 clusters it and searches the VECTOR_IVF_PROBES nearest clusters)
+    VECTOR_STORE: str = os.getenv("VECTOR_STORE", "chroma")
+    VECTOR_STORE_DTYPE: str = os.getenv("VECTOR_STORE_DTYPE", "float16")
+    VECTOR_IVF_LISTS: int = int(os.getenv("VECTOR_IVF_LISTS", "0"))
+    VECTOR_IVF_PROBES: int = int(os.getenv("VECTOR_IVF_PROBES", "8"))
+    
     # Groq Configuration
     GROQ_MODEL: str = os.getenv("GROQ_MODEL", "mixtral-8x7b-32768")
     
+    # LLM backends in order of preference: "groq:<model>" or "local" (extractive stand-in, no network);
+    # empty means groq:GROQ_MODEL. Each has its own concurrency limit, deadline and circuit breaker,
+    # and slow first tokens are hedged after the HEDGE_PERCENTILE time to first token (0 disables)
+    LLM_BACKENDS: str = os.getenv("LLM_BACKENDS", "")
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_DELAY_MS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "100"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET_SECONDS: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    
     # Data Paths
     RAW_DATA_PATH: str = os.getenv("RAW_DATA_PATH", "./data/raw")
     PROCESSED_DATA_PATH: str = os.getenv("PROCESSED_DATA_PATH", "./data/processed")
     
+    # Bulk ingestion
+    INGEST_EMBED_BATCH_SIZE: int = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+    INGEST_WRITE_BATCH_SIZE: int = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "512"))
+    
+    # On-disk cache of chunk embeddings keyed by model and text (float16 or float32)
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_DTYPE: str = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
+    
+    # Background ingestion jobs: concurrent jobs and queued jobs before uploads are refused
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "1"))
+    INGEST_QUEUE_MAX: int = int(os.getenv("INGEST_QUEUE_MAX", "100"))
+    INGEST_JOBS_DB: str = os.getenv("INGEST_JOBS_DB", "./data/ingest_jobs.db")
+    
+    # CSV row grouping: N rows per chunk, or one chunk per day/week/month/quarter/year
+    CSV_ROWS_PER_CHUNK: int = int(os.getenv("CSV_ROWS_PER_CHUNK", "1"))
+    CSV_GROUP_PERIOD: str = os.getenv("CSV_GROUP_PERIOD", "")
+    
+    # Chunk size in tokens per file type (0 keeps whole pages / row groups);
+    # keep below the embedding model's 256-token input limit
+    PDF_CHUNK_TOKENS: int = int(os.getenv("PDF_CHUNK_TOKENS", "200"))
+    PDF_CHUNK_OVERLAP_TOKENS: int = int(os.getenv("PDF_CHUNK_OVERLAP_TOKENS", "40"))
+    CSV_CHUNK_TOKENS: int = int(os.getenv("CSV_CHUNK_TOKENS", "0"))
+    
+    # Processes extracting PDF text in parallel (1 parses on the worker thread)
+    PDF_PARSE_WORKERS: int = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+    
+    # Route analytical queries over ingested CSVs to the structured-data executor
+    STRUCTURED_QUERIES_ENABLED: bool = os.getenv("STRUCTURED_QUERIES_ENABLED", "true").lower() == "true"
+    
+    # Load models in a background task at startup instead of on first request
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+    
+    # Concurrency
+    PIPELINE_WORKERS: int = int(os.getenv("PIPELINE_WORKERS", "4"))
+    
+    # Batch queries
+    BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", "256"))
+    BATCH_LLM_CONCURRENCY: int = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+    
+    # Concurrent identical generations (same question, context and model) share one LLM call
+    LLM_COALESCING_ENABLED: bool = os.getenv("LLM_COALESCING_ENABLED", "true").lower() == "true"
+    
+    # Chunks retrieved per query (after hybrid fusion)
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+    
+    # Context assembly: drop chunks at least this cosine-similar to a better one, optionally
+    # rerank with a local cross-encoder (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2), then pack
+    # into a token budget (0 disables packing)
+    CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "1024"))
+    CONTEXT_DEDUP_SIMILARITY: float = float(os.getenv("CONTEXT_DEDUP_SIMILARITY", "0.95"))
+    CONTEXT_RERANK_MODEL: str = os.getenv("CONTEXT_RERANK_MODEL", "")
+    
+    # Hybrid retrieval: BM25 hits fused with vector search by weighted reciprocal rank fusion
+    HYBRID_SEARCH_ENABLED: bool = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    HYBRID_VECTOR_WEIGHT: float = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+    HYBRID_LEXICAL_WEIGHT: float = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+    HYBRID_RRF_K: int = int(os.getenv("HYBRID_RRF_K", "60"))
+    
+    # Query embedding micro-batching
+    EMBEDDING_MAX_BATCH_SIZE: int = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+    EMBEDDING_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+    
+    # Conversation sessions: "memory" (per process) or "sqlite" (PROCESSED_DATA_PATH/sessions.db);
+    # history over SESSION_HISTORY_TOKENS is summarized, SESSION_MAX_BYTES caps each session
+    SESSION_STORE: str = os.getenv("SESSION_STORE", "memory")
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+    SESSION_TTL_SECONDS: float = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    SESSION_HISTORY_TOKENS: int = int(os.getenv("SESSION_HISTORY_TOKENS", "1000"))
+    SESSION_SUMMARY_TOKENS: int = int(os.getenv("SESSION_SUMMARY_TOKENS", "200"))
+    SESSION_MAX_BYTES: int = int(os.getenv("SESSION_MAX_BYTES", "65536"))
+    
+    # Answer cache (exact LRU/TTL tier plus semantic tier; 0 disables)
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+    ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "600"))
+    ANSWER_CACHE_SEMANTIC_DISTANCE: float = float(os.getenv("ANSWER_CACHE_SEMANTIC_DISTANCE", "0.05"))
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
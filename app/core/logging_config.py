@@ -1,46 +1,173 @@
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
+import zlib
+from datetime import datetime, timezone
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from prometheus_client import Counter
+
+from app.core.config import settings
+from app.core.tracing import trace_id_var
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
+
+LOG_RECORDS_DROPPED = Counter('rag_log_records_dropped_total', 'Log records dropped because the logging queue was full')
+
+_listener: Optional[QueueListener] = None
+
+
+class TraceIdFilter(logging.Filter):
+    """Tag records with the trace ID of the request being handled.
+
+    It runs in the caller, before records are queued, since the trace ID
+    lives in a context variable of the request's task.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "trace_id"):
+            record.trace_id = trace_id_var.get()
+        return True
+
+
+class TraceSamplingFilter(logging.Filter):
+    """Keep INFO and DEBUG records of a ``rate`` share of requests; warnings and errors are always kept.
+
+    Requests are sampled by trace ID, so a kept request keeps all its lines.
+    Records logged outside a request, such as startup and ingestion, are
+    always kept.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.threshold = int(max(0.0, min(1.0, rate)) * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = getattr(record, "trace_id", "")
+        if record.levelno >= logging.WARNING or not trace_id:
+            return True
+        return zlib.crc32(trace_id.encode("utf-8")) <= self.threshold
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per line, as parsed by the fluentd config in k8s/monitoring.
+
+    ``timestamp`` is UTC in ISO 8601 with a ``Z`` suffix, matching its
+    ``time_format``.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        trace_id = getattr(record, "trace_id", "")
+        if trace_id:
+            entry["trace_id"] = trace_id
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue records for the listener thread, dropping them rather than blocking when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now, while its arguments still hold their current values;
+        # the JSON or text formatting happens on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def _output_handlers(formatter: logging.Formatter) -> list:
+    handlers = []
+    if settings.LOG_FILE:
+        Path(settings.LOG_FILE).parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(RotatingFileHandler(
+            settings.LOG_FILE,
+            maxBytes=10*1024*1024,  # 10MB
+            backupCount=5
+        ))
+    handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logging():
-    # Create logs directory if it doesn't exist
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
-    # Configure logging format
-    log_format = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Configure file handler
-    file_handler = RotatingFileHandler(
-        log_dir / "app.log",
-        maxBytes=10*1024*1024,  # 10MB
-        backupCount=5
-    )
-    file_handler.setFormatter(log_format)
-    
-    # Configure console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(log_format)
-    
+    """Log to stdout and ``LOG_FILE`` as JSON (or text), through a queue by default.
+
+    With ``LOG_ASYNC`` the request path only renders the message and queues
+    the record; a listener thread formats and writes it. Calling this again
+    replaces the previous configuration.
+    """
+    global _listener
+    stop_logging()
+    formatter = JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = _output_handlers(formatter)
+
     # Configure root logger
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
+    root_logger.setLevel(settings.LOG_LEVEL.upper())
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+        handler.close()
+
+    filters = [TraceIdFilter()]
+    if settings.LOG_SAMPLE_RATE < 1.0:
+        filters.append(TraceSamplingFilter(settings.LOG_SAMPLE_RATE))
+
+    if settings.LOG_ASYNC:
+        queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        handlers = [queue_handler]
+    for handler in handlers:
+        for log_filter in filters:
+            handler.addFilter(log_filter)
+        root_logger.addHandler(handler)
+
     # Configure specific loggers
     loggers = [
         "app.api",
         "app.services",
         "app.core"
     ]
-    
+
     for logger_name in loggers:
         logger = logging.getLogger(logger_name)
-        logger.setLevel(logging.INFO)
+        logger.setLevel(settings.LOG_LEVEL.upper())
         logger.propagate = True
-    
-    return root_logger 
\ No newline at end of file
+
+    return root_logger
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,16 @@
+import uuid
+from contextvars import ContextVar
+
+TRACE_HEADER = "X-Request-ID"
+
+# Trace ID of the request being handled, set by the tracing middleware
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="")
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_trace_id() -> str:
+    """Trace ID of the current request, or a fresh one outside a request."""
+    return trace_id_var.get() or new_trace_id()
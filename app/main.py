@@ -1,18 +1,47 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from prometheus_fastapi_instrumentator import Instrumentator
 
-from app.api.routes import router as api_router
+from app.api.routes import get_ingestion_jobs, get_rag_pipeline, router as api_router
 from app.core.config import settings
 from app.core.logging_config import setup_logging
+from app.core.tracing import TRACE_HEADER, new_trace_id, trace_id_var
 
 # Set up logging
 logger = setup_logging()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Starting up RAG API")
+    logger.info("Environment: %s", settings.ENV)
+    logger.info("Model: %s", settings.GROQ_MODEL)
+
+    # Bind immediately; load models in the background so /health answers at once
+    pipeline = get_rag_pipeline()
+    warm_up = asyncio.create_task(pipeline.warm_up()) if settings.WARMUP_ON_STARTUP else None
+    app.state.warm_up = warm_up
+
+    # Resume ingestion jobs left unfinished by a previous run
+    ingestion_jobs = get_ingestion_jobs()
+    await ingestion_jobs.start()
+
+    yield
+
+    logger.info("Shutting down RAG API")
+    await ingestion_jobs.stop()
+    if warm_up is not None and not warm_up.done():
+        warm_up.cancel()
+    pipeline.close()
+
 app = FastAPI(
     title="iGenius RAG API",
     description="RAG Pipeline for Contextual Query Handling",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -24,6 +53,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Tag each request with a trace ID (from X-Request-ID or a new one) and echo it back"""
+    trace_id = request.headers.get(TRACE_HEADER) or new_trace_id()
+    token = trace_id_var.set(trace_id)
+    try:
+        response = await call_next(request)
+    finally:
+        trace_id_var.reset(token)
+    response.headers[TRACE_HEADER] = trace_id
+    return response
+
 # Prometheus metrics
 Instrumentator().instrument(app).expose(app)
 
@@ -35,12 +76,15 @@ async def health_check():
     logger.info("Health check requested")
     return {"status": "healthy"}
 
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Starting up RAG API")
-    logger.info(f"Environment: {settings.ENV}")
-    logger.info(f"Model: {settings.GROQ_MODEL}")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("Shutting down RAG API")
+@app.get("/ready")
+async def readiness_check():
+    """
+    Ready once the background warm-up has loaded the models (or immediately
+    when warm-up is disabled and components load on first use)
+    """
+    warm_up = getattr(app.state, "warm_up", None)
+    if warm_up is None or get_rag_pipeline().ready:
+        return {"status": "ready"}
+    if warm_up.done() and warm_up.exception() is not None:
+        return JSONResponse(status_code=503, content={"status": "error", "detail": str(warm_up.exception())})
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
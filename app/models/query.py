@@ -1,8 +1,59 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from datetime import date
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+
+# Collection names as Chroma accepts them: 3-63 characters, alphanumeric at both ends
+COLLECTION_PATTERN = r"^[a-zA-Z0-9][a-zA-Z0-9_-]{1,61}[a-zA-Z0-9]$"
+
+class FusionOptions(BaseModel):
+    """Per-request hybrid search overrides; unset fields use the configured defaults."""
+    vector_weight: Optional[float] = Field(None, ge=0)
+    lexical_weight: Optional[float] = Field(None, ge=0)
+    k: Optional[int] = Field(None, ge=1)
+
+class QueryFilters(BaseModel):
+    """Restrict retrieval to chunks whose metadata matches every set field."""
+    sources: Optional[List[str]] = Field(None, min_length=1)
+    file_types: Optional[List[Literal["pdf", "csv"]]] = Field(None, min_length=1)
+    # Overlap with the date range of CSV rows; chunks without dates never match
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+    def where(self) -> Optional[Dict[str, Any]]:
+        """The filters as a vector store ``where`` clause, or None when none is set."""
+        conditions: List[Dict[str, Any]] = []
+        if self.sources:
+            conditions.append({"source": {"$in": self.sources}})
+        if self.file_types:
+            conditions.append({"file_type": {"$in": list(self.file_types)}})
+        if self.date_from is not None:
+            conditions.append({"day_end": {"$gte": _day(self.date_from)}})
+        if self.date_to is not None:
+            conditions.append({"day_start": {"$lte": _day(self.date_to)}})
+        if len(conditions) > 1:
+            return {"$and": conditions}
+        return conditions[0] if conditions else None
+
+def _day(value: date) -> int:
+    # Chunk metadata stores days as YYYYMMDD integers so they compare numerically
+    return value.year * 10000 + value.month * 100 + value.day
 
 class QueryRequest(BaseModel):
     text: str
+    include_timings: bool = False
+    fusion: Optional[FusionOptions] = None
+    session_id: Optional[str] = Field(None, min_length=1, max_length=128)
+    filters: Optional[QueryFilters] = None
+    collection: Optional[str] = Field(None, pattern=COLLECTION_PATTERN)
+
+    def where_filter(self) -> Optional[Dict[str, Any]]:
+        return self.filters.where() if self.filters is not None else None
+
+    def fusion_overrides(self) -> Optional[Dict[str, float]]:
+        """Fusion settings this request overrides, or None to use the defaults."""
+        if self.fusion is None:
+            return None
+        return self.fusion.model_dump(exclude_none=True) or None
     
 class Source(BaseModel):
     document_id: str
@@ -13,3 +64,9 @@ class QueryResponse(BaseModel):
     answer: str
     sources: List[Source]
     confidence: float
+    context_tokens_saved: int = 0
+    session_id: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
+
+class BatchQueryResult(QueryResponse):
+    error: Optional[str] = None
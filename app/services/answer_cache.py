@@ -0,0 +1,153 @@
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+_TOKEN = re.compile(r"[\w$][\w$%.,:/-]*")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for exact-match caching (case, whitespace, trailing punctuation)."""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", query.strip().lower()))
+
+
+def key_tokens(query: str) -> FrozenSet[str]:
+    """Tokens two queries must share to match semantically: numbers, dates,
+    and names or tickers written with capitals (lowercased, without thousands
+    separators). A capitalized first word is taken as the start of the sentence."""
+    keys = set()
+    for position, token in enumerate(_TOKEN.findall(query)):
+        token = token.rstrip(".,:/-")
+        if any(char.isdigit() for char in token):
+            keys.add(token.replace(",", "").lower())
+        elif len(token) > 1 and any(char.isupper() for char in token) and (position > 0 or token.isupper()):
+            keys.add(token.lower())
+    return frozenset(keys)
+
+
+@dataclass
+class CacheEntry:
+    value: Dict[str, Any]
+    embedding: Optional[np.ndarray]
+    expires_at: float
+    key_tokens: FrozenSet[str] = frozenset()
+
+
+class AnswerCache:
+    """Two-tier in-process answer cache.
+
+    The exact tier is an LRU keyed on the normalized query and the collection
+    version. The semantic tier matches a new query embedding against the
+    embeddings of cached queries and returns the closest answer within
+    ``semantic_distance`` (cosine), among cached queries with the same
+    numbers, dates and names (see ``key_tokens``): "closing price on
+    2020-01-03" and "on 2020-01-06" embed almost alike. ``invalidate`` bumps the collection version
+    and drops every entry; it is called whenever the collection changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 600.0,
+        semantic_distance: float = 0.05,
+        on_evict: Optional[Callable[[str], None]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_distance = semantic_distance
+        self.on_evict = on_evict
+        self.version = 0
+        self._entries: "OrderedDict[Tuple[str, int], CacheEntry]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        """Exact-tier lookup on the normalized query."""
+        if not self.enabled:
+            return None
+        key = (normalize_query(query), self.version)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._evict(key, "expired")
+            return None
+        self._entries.move_to_end(key)
+        return dict(entry.value)
+
+    def get_semantic(self, query: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Semantic-tier lookup: closest cached query with the same key tokens
+        within the configured cosine distance."""
+        if not self.enabled or self.semantic_distance <= 0 or not embedding:
+            return None
+        self._expire()
+        tokens = key_tokens(query)
+        candidates = [
+            (key, entry) for key, entry in self._entries.items()
+            if entry.embedding is not None and entry.key_tokens == tokens
+        ]
+        if not candidates:
+            return None
+
+        matrix = np.stack([entry.embedding for _, entry in candidates])
+        distances = 1.0 - matrix @ _unit(embedding)
+        best = int(np.argmin(distances))
+        if distances[best] > self.semantic_distance:
+            return None
+
+        key, entry = candidates[best]
+        self._entries.move_to_end(key)
+        return dict(entry.value)
+
+    def put(
+        self,
+        query: str,
+        embedding: Optional[List[float]],
+        value: Dict[str, Any],
+        version: Optional[int] = None
+    ) -> None:
+        """Cache an answer computed against collection ``version`` (stale versions are dropped)."""
+        if not self.enabled or (version is not None and version != self.version):
+            return
+        key = (normalize_query(query), self.version)
+        self._entries[key] = CacheEntry(
+            value=dict(value),
+            embedding=_unit(embedding) if embedding else None,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            key_tokens=key_tokens(query)
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)), "capacity")
+
+    def invalidate(self) -> None:
+        """Drop every entry and move to a new collection version."""
+        self.version += 1
+        for key in list(self._entries):
+            self._evict(key, "invalidated")
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            self._evict(key, "expired")
+
+    def _evict(self, key: Tuple[str, int], reason: str) -> None:
+        del self._entries[key]
+        if self.on_evict is not None:
+            self.on_evict(reason)
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
@@ -0,0 +1,120 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.tokens import approximate_token_spans, estimate_tokens
+
+
+@dataclass
+class AssembledContext:
+    """Chunks chosen for the prompt, as indices into the retrieved chunks, best first."""
+    indices: List[int]
+    texts: List[str]
+    tokens_retrieved: int
+    tokens_used: int
+    duplicates: List[int] = field(default_factory=list)
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_retrieved - self.tokens_used
+
+
+def dedupe_indices(embeddings: Sequence[Sequence[float]], max_similarity: float) -> List[int]:
+    """Indices of chunks to keep, in order, dropping any whose cosine similarity
+    to an earlier kept chunk is at least ``max_similarity``."""
+    if not len(embeddings):
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+    kept: List[int] = []
+    for index, vector in enumerate(vectors):
+        if not kept or float(np.max(vectors[kept] @ vector)) < max_similarity:
+            kept.append(index)
+    return kept
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    spans = approximate_token_spans(text)
+    if len(spans) <= max_tokens:
+        return text
+    return text[:spans[max_tokens - 1][1]] if max_tokens > 0 else ""
+
+
+def pack_to_budget(texts: Sequence[str], max_tokens: int) -> List[str]:
+    """Greedily keep texts in order while they fit in ``max_tokens``; an empty
+    string marks a skipped text. When not even the first text fits, it is
+    truncated so the context is never empty."""
+    packed: List[str] = []
+    used = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if used + tokens <= max_tokens:
+            packed.append(text)
+            used += tokens
+        else:
+            packed.append("")
+    if texts and not any(packed):
+        packed[0] = truncate_to_tokens(texts[0], max_tokens)
+    return packed
+
+
+def assemble_context(
+    documents: Sequence[str],
+    embeddings: Optional[Sequence[Sequence[float]]],
+    max_tokens: int,
+    max_similarity: float = 1.0,
+    rerank: Optional[Callable[[List[str]], List[int]]] = None
+) -> AssembledContext:
+    """Dedupe retrieved chunks by embedding, optionally ``rerank`` the rest and
+    pack them, best first, into ``max_tokens``.
+
+    ``max_tokens <= 0`` disables packing and ``max_similarity >= 1`` disables
+    deduplication, as does a missing embedding for any chunk.
+    """
+    kept = list(range(len(documents)))
+    if max_similarity < 1.0 and embeddings is not None and len(embeddings) == len(documents):
+        kept = dedupe_indices(embeddings, max_similarity)
+    kept_set = set(kept)
+    duplicates = [index for index in range(len(documents)) if index not in kept_set]
+    if rerank is not None:
+        kept = [kept[position] for position in rerank([documents[index] for index in kept])]
+
+    texts = [documents[index] for index in kept]
+    if max_tokens > 0:
+        packed = pack_to_budget(texts, max_tokens)
+        kept = [index for index, text in zip(kept, packed) if text]
+        texts = [text for text in packed if text]
+    return AssembledContext(
+        indices=kept,
+        texts=texts,
+        tokens_retrieved=estimate_tokens("\n".join(documents)),
+        tokens_used=estimate_tokens("\n".join(texts)),
+        duplicates=duplicates
+    )
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a small local cross-encoder, loaded on first use."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> Any:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def rerank(self, query: str, texts: Sequence[str]) -> List[int]:
+        """Positions of ``texts`` ordered from most to least relevant."""
+        if len(texts) < 2:
+            return list(range(len(texts)))
+        scores = self.model.predict([(query, text) for text in texts])
+        return [int(position) for position in np.argsort(-np.asarray(scores), kind="stable")]
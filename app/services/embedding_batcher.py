@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Set, Tuple
+
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Metrics
+EMBEDDING_BATCH_SIZE = Histogram(
+    'rag_embedding_batch_size',
+    'Number of queries embedded together in one batch',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+EMBEDDING_QUEUE_TIME = Histogram(
+    'rag_embedding_queue_seconds',
+    'Time a query waits in the batcher before its batch is embedded',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+PendingQuery = Tuple[str, asyncio.Future, float]
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent query embeddings into a single ``embed_documents`` call.
+
+    Callers await ``embed_query``; queries are buffered until either
+    ``max_batch_size`` are pending or ``max_wait_ms`` has elapsed since the
+    first one arrived, then embedded together on ``executor``.
+    """
+
+    def __init__(
+        self,
+        embed_documents: Callable[[List[str]], List[List[float]]],
+        executor: Optional[Executor] = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        self.embed_documents = embed_documents
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._pending: List[PendingQuery] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[PendingQuery]) -> None:
+        now = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            EMBEDDING_QUEUE_TIME.observe(now - enqueued_at)
+        EMBEDDING_BATCH_SIZE.observe(len(batch))
+
+        # Identical queries in the same window only need embedding once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+
+        try:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(self.executor, self.embed_documents, texts)
+        except Exception as e:
+            logger.error("Error embedding batch of %d queries: %s", len(texts), e)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
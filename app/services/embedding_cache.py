@@ -0,0 +1,132 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from prometheus_client import Counter
+
+# Metrics
+EMBEDDING_CACHE_HITS_TOTAL = Counter('rag_embedding_cache_hits_total', 'Chunk embeddings served from the on-disk cache')
+EMBEDDING_CACHE_MISSES_TOTAL = Counter('rag_embedding_cache_misses_total', 'Chunk embeddings computed by the model')
+
+KEY_SIZE = 16
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """Content address of a chunk embedding: hash of the model name and the chunk text."""
+    return hashlib.blake2b(f"{model_name}\0{text}".encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+
+class EmbeddingCache:
+    """Append-only, content-addressed store of chunk embeddings.
+
+    Vectors are appended to ``vectors.bin`` and read back through a memory
+    map; their keys are appended in the same order to ``keys.bin`` and loaded
+    into an in-memory hash index on first use. A vector only counts once its
+    key is written, so an interrupted append is discarded on the next load.
+    """
+
+    def __init__(self, directory: str, model_name: str, dtype: str = "float16"):
+        self.directory = Path(directory)
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[bytes, int]] = None
+        self._dimensions: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.bin"
+
+    @property
+    def _keys_path(self) -> Path:
+        return self.directory / "keys.bin"
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.directory / "meta.json"
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def _load(self) -> Dict[bytes, int]:
+        if self._index is not None:
+            return self._index
+        self._index = {}
+        if self._meta_path.exists():
+            meta = json.loads(self._meta_path.read_text())
+            if meta["dtype"] != self.dtype.name:
+                raise ValueError(f"Embedding cache in {self.directory} stores {meta['dtype']}, not {self.dtype.name}")
+            self._dimensions = meta["dimensions"]
+            keys = self._keys_path.read_bytes() if self._keys_path.exists() else b""
+            row_bytes = self._dimensions * self.dtype.itemsize
+            vectors_size = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+            rows = min(len(keys) // KEY_SIZE, vectors_size // row_bytes)
+            # Drop the tail of an interrupted append so rows and keys stay aligned
+            if vectors_size != rows * row_bytes:
+                with open(self._vectors_path, "r+b") as f:
+                    f.truncate(rows * row_bytes)
+            if len(keys) != rows * KEY_SIZE:
+                with open(self._keys_path, "r+b") as f:
+                    f.truncate(rows * KEY_SIZE)
+            self._index = {keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(rows)}
+        return self._index
+
+    def _map(self, rows: int) -> np.memmap:
+        if self._vectors is None or len(self._vectors) < rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self._dimensions))
+        return self._vectors
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vectors for ``texts``, with None for each miss."""
+        keys = [cache_key(self.model_name, text) for text in texts]
+        with self._lock:
+            index = self._load()
+            rows = [index.get(key) for key in keys]
+            hits = [row for row in rows if row is not None]
+            vectors = self._map(len(index)) if hits else None
+
+        results = [vectors[row].astype(np.float32).tolist() if row is not None else None for row in rows]
+        EMBEDDING_CACHE_HITS_TOTAL.inc(len(hits))
+        EMBEDDING_CACHE_MISSES_TOTAL.inc(len(rows) - len(hits))
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Append vectors for texts that are not cached yet."""
+        if not texts:
+            return
+        array = np.asarray(vectors, dtype=self.dtype)
+        with self._lock:
+            index = self._load()
+            if self._dimensions is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._dimensions = array.shape[1]
+                self._meta_path.write_text(json.dumps({
+                    "model": self.model_name,
+                    "dtype": self.dtype.name,
+                    "dimensions": self._dimensions
+                }))
+            elif array.shape[1] != self._dimensions:
+                raise ValueError(f"Expected {self._dimensions}-dimensional embeddings, got {array.shape[1]}")
+
+            new_rows: List[int] = []
+            new_keys: Dict[bytes, None] = {}
+            for position, text in enumerate(texts):
+                key = cache_key(self.model_name, text)
+                if key not in index and key not in new_keys:
+                    new_rows.append(position)
+                    new_keys[key] = None
+            if not new_keys:
+                return
+
+            # Vectors first, keys second: a key is only ever written for a complete vector
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(array[new_rows]).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(b"".join(new_keys))
+            for key in new_keys:
+                index[key] = len(index)
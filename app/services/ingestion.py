@@ -0,0 +1,333 @@
+import hashlib
+from collections import deque
+from concurrent.futures import Executor, Future
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import numpy as np
+import pandas as pd
+import pypdf
+
+from app.services.tokens import TokenSpans, approximate_token_spans, estimate_tokens
+
+T = TypeVar("T")
+
+# A parsed chunk of text with the metadata stored next to its vector
+Document = Tuple[str, Dict[str, Any]]
+
+SUPPORTED_EXTENSIONS = ('.csv', '.pdf')
+CSV_READ_CHUNKSIZE = 10_000
+# Rows per document at most, so a wide period or an unsorted date column cannot build the whole file into one
+CSV_MAX_GROUP_ROWS = 10_000
+CSV_GROUP_PERIODS = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+DATE_COLUMN_NAMES = ("date", "datetime", "timestamp", "time")
+HASH_BLOCK_SIZE = 1024 * 1024
+PDF_PAGES_PER_TASK = 16
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file's contents, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, text: str, occurrence: int = 0) -> str:
+    """Vector ID of a chunk, from its document and text: a chunk keeps its ID
+    across versions of the document as long as its text is unchanged.
+    ``occurrence`` tells apart identical chunks within one document."""
+    key = f"{source}\0{occurrence}\0{text}".encode("utf-8")
+    return hashlib.sha256(key).hexdigest()[:32]
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield lists of at most ``size`` items without materialising the iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _is_boundary(text: str, spans: List[Tuple[int, int]], index: int) -> bool:
+    """Whether whitespace separates token ``index`` from the token before it."""
+    return spans[index - 1][1] < spans[index][0] and not text[spans[index - 1][1]:spans[index][0]].strip()
+
+
+def _break_point(text: str, spans: List[Tuple[int, int]], start: int, end: int) -> int:
+    """Token index to end a chunk at, searching its second half for the last
+    sentence end, then line end, then word boundary."""
+    line_break = word_break = None
+    for index in range(end, start + (end - start) // 2, -1):
+        if _is_boundary(text, spans, index):
+            if text[spans[index - 1][1] - 1] in ".!?":
+                return index
+            if line_break is None and "\n" in text[spans[index - 1][1]:spans[index][0]]:
+                line_break = index
+            word_break = word_break or index
+    return line_break or word_break or end
+
+
+def split_text(
+    text: str,
+    chunk_tokens: int,
+    overlap_tokens: int = 0,
+    token_spans: TokenSpans = approximate_token_spans
+) -> Iterator[Tuple[int, int]]:
+    """Yield ``(start, end)`` character spans of at most ``chunk_tokens`` tokens.
+
+    Chunks end at a sentence, line or word boundary where one falls in their
+    second half, and each chunk repeats roughly the last ``overlap_tokens``
+    tokens of the previous one, starting on a word boundary.
+    """
+    spans = token_spans(text)
+    if not spans:
+        return
+    chunk_tokens = max(1, chunk_tokens)
+    overlap_tokens = min(max(0, overlap_tokens), chunk_tokens // 2)
+
+    start = 0
+    while True:
+        end = min(start + chunk_tokens, len(spans))
+        if end < len(spans):
+            end = _break_point(text, spans, start, end)
+        yield spans[start][0], spans[end - 1][1]
+        if end == len(spans):
+            return
+        next_start = max(end - overlap_tokens, start + 1)
+        while next_start < end and not _is_boundary(text, spans, next_start):
+            next_start += 1
+        start = next_start
+
+
+def detect_date_column(columns: Iterable[Any]) -> Optional[str]:
+    """Pick the column that most likely holds the row date of a time-series CSV."""
+    for column in columns:
+        name = str(column).strip().lower()
+        if name in DATE_COLUMN_NAMES or name.endswith("date"):
+            return column
+    return None
+
+
+def render_rows(frame: pd.DataFrame) -> pd.Series:
+    """Render every row as ``"col: value, col: value"`` using column-wise string ops."""
+    columns = [str(column) for column in frame.columns]
+    text = columns[0] + ": " + frame.iloc[:, 0].astype(str)
+    for position, name in enumerate(columns[1:], start=1):
+        text = text + ", " + name + ": " + frame.iloc[:, position].astype(str)
+    return text
+
+
+def _group_keys(frame: pd.DataFrame, rows_per_chunk: int, period: Optional[str], date_column: Optional[str]) -> np.ndarray:
+    if period:
+        if date_column is None:
+            raise ValueError(f"Cannot group CSV rows by {period}: no date column found")
+        dates = pd.to_datetime(frame[date_column], errors="coerce")
+        return dates.dt.to_period(CSV_GROUP_PERIODS[period]).astype(str).to_numpy()
+    return np.arange(len(frame)) // rows_per_chunk
+
+
+def _split_group(texts: List[str], start: int, end: int, max_tokens: int) -> Iterator[Tuple[int, int]]:
+    """Cut rows ``start:end`` into runs of whole rows of at most ``max_tokens`` tokens."""
+    if max_tokens <= 0 or end - start == 1:
+        yield start, end
+        return
+    run_start, run_tokens = start, 0
+    for index in range(start, end):
+        tokens = estimate_tokens(texts[index])
+        if index > run_start and run_tokens + tokens > max_tokens:
+            yield run_start, index
+            run_start, run_tokens = index, 0
+        run_tokens += tokens
+    yield run_start, end
+
+
+def _frame_documents(
+    frame: pd.DataFrame,
+    keys: np.ndarray,
+    row_start: int,
+    date_column: Optional[str],
+    max_tokens: int = 0,
+    max_group_rows: int = CSV_MAX_GROUP_ROWS
+) -> Iterator[Document]:
+    if frame.empty:
+        return
+    texts = render_rows(frame).tolist()
+    dates = frame[date_column].astype(str).tolist() if date_column is not None else None
+    # Dates as YYYYMMDD integers, so vector store filters can compare them (0 if unparseable)
+    days = None
+    if date_column is not None:
+        parsed = pd.to_datetime(frame[date_column], errors="coerce")
+        days = (parsed.dt.year * 10000 + parsed.dt.month * 100 + parsed.dt.day).fillna(0).astype(np.int64).to_numpy()
+
+    # Consecutive rows with the same key form one document of at most max_group_rows rows,
+    # split to fit max_tokens
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]).tolist()
+    groups = (
+        (piece, min(piece + max_group_rows, end))
+        for start, end in zip(starts, starts[1:] + [len(texts)])
+        for piece in range(start, end, max_group_rows)
+    )
+    for start, end in (run for group in groups for run in _split_group(texts, *group, max_tokens)):
+        metadata: Dict[str, Any] = {"row_start": row_start + start, "rows": end - start}
+        if dates is not None:
+            metadata["date_start"] = dates[start]
+            metadata["date_end"] = dates[end - 1]
+            group_days = days[start:end][days[start:end] > 0]
+            if len(group_days):
+                metadata["day_start"] = int(group_days.min())
+                metadata["day_end"] = int(group_days.max())
+        yield texts[start] if end - start == 1 else "\n".join(texts[start:end]), metadata
+
+
+def iter_csv_documents(
+    path: str,
+    rows_per_chunk: int = 1,
+    period: Optional[str] = None,
+    date_column: Optional[str] = None,
+    chunksize: int = CSV_READ_CHUNKSIZE,
+    on_frame: Optional[Callable[[pd.DataFrame], None]] = None,
+    max_tokens: int = 0,
+    max_group_rows: int = CSV_MAX_GROUP_ROWS
+) -> Iterator[Document]:
+    """Stream a CSV as documents of ``rows_per_chunk`` rows, or one per calendar ``period``.
+
+    The file is read ``chunksize`` rows at a time and rendered column-wise.
+    Consecutive rows that share a group key form one document; the trailing
+    group of each read chunk is carried over so groups never split at read
+    boundaries. Groups longer than ``max_group_rows`` are cut every
+    ``max_group_rows`` rows, so at most that many rows are carried over
+    (period grouping expects rows sorted by date; unsorted rows give many
+    small groups), and groups longer than ``max_tokens`` (when set) are split
+    into runs of whole rows. ``on_frame`` receives every raw chunk, e.g. to
+    persist it as a typed table in the same pass.
+    """
+    if period and period not in CSV_GROUP_PERIODS:
+        raise ValueError(f"Unsupported CSV grouping period: {period}")
+    rows_per_chunk = max(1, rows_per_chunk)
+    max_group_rows = max(1, max_group_rows)
+    grouped = bool(period) or rows_per_chunk > 1
+
+    carry: Optional[pd.DataFrame] = None
+    row_start = 0
+    for frame in pd.read_csv(path, chunksize=chunksize):
+        if on_frame is not None:
+            on_frame(frame)
+        if carry is not None:
+            frame = pd.concat([carry, frame], ignore_index=True)
+        date_column = date_column or detect_date_column(frame.columns)
+        keys = _group_keys(frame, rows_per_chunk, period, date_column)
+
+        # Hold back the trailing group: it may continue in the next read chunk.
+        # Its full max_group_rows pieces are complete documents already
+        tail = int(np.cumprod(keys[::-1] == keys[-1]).sum()) % max_group_rows if grouped else 0
+        complete = len(frame) - tail
+        carry = frame.iloc[complete:]
+        yield from _frame_documents(
+            frame.iloc[:complete], keys[:complete], row_start, date_column, max_tokens, max_group_rows
+        )
+        row_start += complete
+
+    if carry is not None and not carry.empty:
+        keys = _group_keys(carry, rows_per_chunk, period, date_column)
+        yield from _frame_documents(carry, keys, row_start, date_column, max_tokens, max_group_rows)
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract the text of pages ``start..stop-1`` (1-based); runs in pool workers."""
+    with open(path, "rb") as f:
+        pdf = pypdf.PdfReader(f)
+        return [(number, pdf.pages[number - 1].extract_text()) for number in range(start, stop)]
+
+
+def iter_pdf_pages(
+    path: str,
+    executor: Optional[Executor] = None,
+    max_pending: int = 1,
+    pages_per_task: int = PDF_PAGES_PER_TASK
+) -> Iterator[Tuple[int, str]]:
+    """Stream ``(page_number, text)`` in page order.
+
+    With an ``executor``, page ranges of ``pages_per_task`` are extracted in
+    parallel, keeping at most ``max_pending`` ranges in flight so a slow
+    consumer does not pile up parsed text. Short PDFs are parsed inline.
+    """
+    with open(path, "rb") as f:
+        num_pages = len(pypdf.PdfReader(f).pages)
+
+    if executor is None or num_pages <= pages_per_task:
+        yield from extract_pdf_pages(path, 1, num_pages + 1)
+        return
+
+    ranges = iter(range(1, num_pages + 1, pages_per_task))
+    pending: "deque[Future]" = deque()
+    try:
+        while True:
+            while len(pending) < max(1, max_pending) and (start := next(ranges, None)) is not None:
+                pending.append(executor.submit(extract_pdf_pages, path, start, min(start + pages_per_task, num_pages + 1)))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_pdf_documents(
+    path: str,
+    chunk_tokens: int = 0,
+    overlap_tokens: int = 0,
+    token_spans: TokenSpans = approximate_token_spans,
+    executor: Optional[Executor] = None,
+    max_pending: int = 1
+) -> Iterator[Document]:
+    """Stream PDF text as one document per page, or as overlapping chunks of ``chunk_tokens``.
+
+    Chunk metadata records the page and the character span within the page.
+    Page extraction runs on ``executor`` when given (see ``iter_pdf_pages``).
+    """
+    for page_number, text in iter_pdf_pages(path, executor, max_pending):
+        if not text.strip():
+            continue
+        if chunk_tokens <= 0:
+            yield text, {"page": page_number}
+            continue
+        for start, end in split_text(text, chunk_tokens, overlap_tokens, token_spans):
+            yield text[start:end], {"page": page_number, "char_start": start, "char_end": end}
+
+
+def iter_documents(
+    path: str,
+    file_extension: str,
+    csv_rows_per_chunk: int = 1,
+    csv_group_period: Optional[str] = None,
+    csv_on_frame: Optional[Callable[[pd.DataFrame], None]] = None,
+    chunk_tokens: int = 0,
+    chunk_overlap_tokens: int = 0,
+    token_spans: TokenSpans = approximate_token_spans,
+    pdf_executor: Optional[Executor] = None,
+    pdf_max_pending: int = 1
+) -> Iterator[Document]:
+    """Stream ``(text, metadata)`` documents from a saved upload.
+
+    ``chunk_tokens`` caps the size of each document (0 disables chunking);
+    overlap only applies to PDF text, CSV documents are cut on row boundaries.
+    """
+    if file_extension == '.csv':
+        return iter_csv_documents(
+            path,
+            rows_per_chunk=csv_rows_per_chunk,
+            period=csv_group_period,
+            on_frame=csv_on_frame,
+            max_tokens=chunk_tokens
+        )
+    if file_extension == '.pdf':
+        return iter_pdf_documents(
+            path,
+            chunk_tokens,
+            chunk_overlap_tokens,
+            token_spans,
+            executor=pdf_executor,
+            max_pending=pdf_max_pending
+        )
+    raise ValueError(f"Unsupported file type: {file_extension}")
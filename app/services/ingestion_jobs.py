@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from fastapi import UploadFile
+from prometheus_client import Counter, Gauge
+
+from app.services.rag_pipeline import RAGPipeline
+
+logger = logging.getLogger(__name__)
+
+# Metrics
+INGEST_QUEUE_DEPTH = Gauge('rag_ingest_queue_depth', 'Ingestion jobs waiting for a worker')
+INGEST_JOBS_RUNNING = Gauge('rag_ingest_jobs_running', 'Ingestion jobs currently being processed')
+INGEST_JOBS_TOTAL = Counter('rag_ingest_jobs_total', 'Finished ingestion jobs', ['status'])
+
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+PROGRESS_STAGES = ("parsed", "embedded", "stored")
+# Progress is written to the job store at most this often; final counts are always written
+PROGRESS_WRITE_INTERVAL = 0.5
+
+
+class IngestionQueueFull(Exception):
+    pass
+
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(value, timezone.utc).isoformat() if value is not None else None
+
+
+class JobStore:
+    """Ingestion job records in a local SQLite file, so job state survives restarts."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, filename TEXT NOT NULL, path TEXT NOT NULL, file_hash TEXT, "
+                "status TEXT NOT NULL, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+                "parsed INTEGER DEFAULT 0, embedded INTEGER DEFAULT 0, stored INTEGER DEFAULT 0, "
+                "error TEXT, result TEXT)"
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "collection" not in columns:
+                # Job stores created before named collections existed
+                conn.execute("ALTER TABLE jobs ADD COLUMN collection TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def create(self, filename: str, path: str, file_hash: str, collection: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, filename, path, file_hash, collection, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, filename, path, file_hash, collection, QUEUED, time.time())
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Jobs that were queued or running when the process last stopped, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        end = row["finished_at"] or time.time()
+        elapsed = end - row["started_at"] if row["started_at"] is not None else 0.0
+        return {
+            "job_id": row["id"],
+            "filename": row["filename"],
+            "path": row["path"],
+            "file_hash": row["file_hash"],
+            "collection": row["collection"],
+            "status": row["status"],
+            "created_at": _timestamp(row["created_at"]),
+            "started_at": _timestamp(row["started_at"]),
+            "finished_at": _timestamp(row["finished_at"]),
+            "progress": {stage: row[stage] for stage in PROGRESS_STAGES},
+            "docs_per_second": round(row["stored"] / elapsed, 2) if elapsed > 0 else 0.0,
+            "error": row["error"],
+            "result": json.loads(row["result"]) if row["result"] else None
+        }
+
+
+class IngestionJobs:
+    """Bounded queue of ingestion jobs processed by background worker tasks.
+
+    ``submit`` saves the upload and returns a queued job at once; ``workers``
+    tasks run the pipeline's ingestion and record progress in the job store.
+    Jobs left queued or running by a previous process are resumed on
+    ``start`` (re-ingestion is idempotent, so a half-done job simply restarts).
+    """
+
+    def __init__(self, pipeline: RAGPipeline, store: JobStore, workers: int = 1, max_queued: int = 100):
+        self.pipeline = pipeline
+        self.store = store
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Slots taken by uploads still being saved
+        self._reserved = 0
+
+    async def start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        for job in await asyncio.to_thread(self.store.unfinished):
+            if os.path.exists(job["path"]):
+                logger.info("Resuming ingestion job %s (%s)", job["job_id"], job["filename"])
+                await asyncio.to_thread(self.store.update, job["job_id"], status=QUEUED)
+                self._queue.put_nowait(job["job_id"])
+            else:
+                await asyncio.to_thread(self.store.update, job["job_id"], status=FAILED, error="Uploaded file no longer exists")
+        INGEST_QUEUE_DEPTH.set(self._queue.qsize())
+        for _ in range(self.workers):
+            task = asyncio.create_task(self._work())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue = None
+
+    async def submit(self, file: UploadFile, collection: Optional[str] = None) -> Dict[str, Any]:
+        await self.start()
+        # Check and reserve without awaiting in between, so concurrent uploads cannot overfill the queue
+        if self._queue.qsize() + self._reserved >= self.max_queued:
+            raise IngestionQueueFull(f"Ingestion queue is full ({self.max_queued} jobs waiting)")
+        self._reserved += 1
+        try:
+            path, file_hash = await self.pipeline.save_upload(file, collection)
+            job_id = await asyncio.to_thread(self.store.create, file.filename, path, file_hash, collection)
+            self._queue.put_nowait(job_id)
+        finally:
+            self._reserved -= 1
+        INGEST_QUEUE_DEPTH.set(self._queue.qsize())
+        logger.info("Queued ingestion job %s for %s", job_id, file.filename)
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status for the API (without the server-side file path)."""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None:
+            del job["path"]
+        return job
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            INGEST_QUEUE_DEPTH.set(self._queue.qsize())
+            INGEST_JOBS_RUNNING.inc()
+            try:
+                await self._run(job_id)
+            except Exception:
+                # Keep the worker alive for the next jobs, e.g. when the job store could not be written
+                logger.exception("Ingestion job %s could not be processed", job_id)
+            finally:
+                INGEST_JOBS_RUNNING.dec()
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        await asyncio.to_thread(
+            self.store.update, job_id, status=RUNNING, started_at=time.time(),
+            parsed=0, embedded=0, stored=0, error=None
+        )
+        progress: Dict[str, int] = {}
+        writes: Set[asyncio.Task] = set()
+        last_write = 0.0
+
+        def on_progress(counts: Dict[str, int]) -> None:
+            # Called on the event loop after every batch: write in a thread, and not too often
+            nonlocal last_write
+            progress.update(counts)
+            now = time.monotonic()
+            if now - last_write >= PROGRESS_WRITE_INTERVAL:
+                last_write = now
+                writes.add(asyncio.create_task(asyncio.to_thread(self.store.update, job_id, **counts)))
+
+        try:
+            result = await self.pipeline.ingest_file(
+                job["path"],
+                job["filename"],
+                job["file_hash"],
+                on_progress=on_progress,
+                collection=job["collection"]
+            )
+        except asyncio.CancelledError:
+            # Shutting down: leave the job running so the next start resumes it
+            raise
+        except Exception as e:
+            logger.error("Ingestion job %s failed: %s", job_id, e)
+            await asyncio.gather(*writes)
+            await asyncio.to_thread(
+                self.store.update, job_id, status=FAILED, finished_at=time.time(), error=str(e), **progress
+            )
+            INGEST_JOBS_TOTAL.labels(status=FAILED).inc()
+            return
+        # Earlier progress writes must not land after the final counts
+        await asyncio.gather(*writes)
+        await asyncio.to_thread(
+            self.store.update, job_id, status=COMPLETED, finished_at=time.time(), result=result, **progress
+        )
+        INGEST_JOBS_TOTAL.labels(status=COMPLETED).inc()
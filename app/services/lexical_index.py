@@ -0,0 +1,286 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Words, numbers, dates and tickers: "2020-01-03", "5.96" and "nvda" stay whole
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[.\-][^\W_]+)*")
+SEGMENT_MAX_DOCS = 10_000
+MAX_SEGMENTS = 8
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+@dataclass(frozen=True)
+class FusionParams:
+    """Reciprocal rank fusion settings: per-retriever weights and the rank constant k."""
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+    k: int = 60
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    weights: Sequence[float],
+    k: int = 60
+) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: each ID scores ``sum(weight / (k + rank))``, best first.
+
+    A ranking with zero weight is ignored rather than contributing zero-score IDs.
+    """
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        if weight <= 0:
+            continue
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class _Segment:
+    """One immutable batch of indexed documents, its postings memory-mapped from disk."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.ids: List[str] = json.loads((path / "ids.json").read_text())
+        self.deletes: List[str] = json.loads((path / "deletes.json").read_text())
+        self.terms: Dict[str, List[int]] = json.loads((path / "terms.json").read_text())
+        self.docs = np.load(path / "docs.npy", mmap_mode="r")
+        self.freqs = np.load(path / "freqs.npy", mmap_mode="r")
+        self.lengths = np.load(path / "lengths.npy", mmap_mode="r")
+        self.live = np.ones(len(self.ids), dtype=bool)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Live document positions and term frequencies for ``term``."""
+        offset, count = self.terms.get(term, (0, 0))
+        docs = self.docs[offset:offset + count]
+        freqs = self.freqs[offset:offset + count]
+        live = self.live[docs]
+        return docs[live], freqs[live]
+
+    @staticmethod
+    def write(
+        path: Path,
+        ids: List[str],
+        lengths: List[int],
+        postings: Dict[str, Tuple[List[int], List[int]]],
+        deletes: Iterable[str] = ()
+    ) -> None:
+        # A directory left by an interrupted write is not in the manifest yet
+        shutil.rmtree(path, ignore_errors=True)
+        path.mkdir(parents=True)
+        terms, docs, freqs = {}, [], []
+        for term in sorted(postings):
+            term_docs, term_freqs = postings[term]
+            terms[term] = [len(docs), len(term_docs)]
+            docs.extend(term_docs)
+            freqs.extend(term_freqs)
+        np.save(path / "docs.npy", np.asarray(docs, dtype=np.int32))
+        np.save(path / "freqs.npy", np.asarray(freqs, dtype=np.int32))
+        np.save(path / "lengths.npy", np.asarray(lengths, dtype=np.int32))
+        (path / "terms.json").write_text(json.dumps(terms))
+        (path / "ids.json").write_text(json.dumps(ids))
+        (path / "deletes.json").write_text(json.dumps(list(deletes)))
+
+
+class LexicalIndex:
+    """Persistent BM25 index over chunk texts, keyed by vector store chunk ID.
+
+    Documents are added in immutable segments (postings, frequencies and
+    lengths as ``.npy`` files opened with ``mmap_mode``) listed in
+    ``manifest.json``. Re-adding an ID supersedes the older copy and
+    ``delete`` records tombstones, so updates never rewrite existing
+    segments; once there are more than ``MAX_SEGMENTS`` they are merged into
+    one, dropping superseded and deleted documents.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._segments: Optional[List[_Segment]] = None
+        self._locations: Dict[str, Tuple[int, int]] = {}
+        self._pending: List[Tuple[str, Counter, int]] = []
+        self._pending_deletes: List[str] = []
+        self._next_segment = 0
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.directory / "manifest.json"
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._locations)
+
+    def load(self) -> None:
+        """Open the committed segments now rather than on the first search."""
+        with self._lock:
+            self._load()
+
+    def _load(self) -> List[_Segment]:
+        if self._segments is not None:
+            return self._segments
+        names: List[str] = []
+        if self._manifest_path.exists():
+            manifest = json.loads(self._manifest_path.read_text())
+            names, self._next_segment = manifest["segments"], manifest["next_segment"]
+        self._segments = [_Segment(self.directory / name) for name in names]
+        self._refresh()
+        return self._segments
+
+    def _refresh(self) -> None:
+        """Recompute which copy of each ID is live, replaying segments in order."""
+        locations: Dict[str, Tuple[int, int]] = {}
+        for number, segment in enumerate(self._segments):
+            for doc_id in segment.deletes:
+                locations.pop(doc_id, None)
+            for position, doc_id in enumerate(segment.ids):
+                locations[doc_id] = (number, position)
+        for segment in self._segments:
+            segment.live[:] = False
+        for number, position in locations.values():
+            self._segments[number].live[position] = True
+        self._locations = locations
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]) -> None:
+        """Queue documents for indexing; they become searchable on ``commit``."""
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                tokens = tokenize(text)
+                self._pending.append((doc_id, Counter(tokens), len(tokens)))
+            if len(self._pending) >= SEGMENT_MAX_DOCS:
+                self._flush()
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Queue removal of documents; applied on ``commit``."""
+        ids = set(ids)
+        with self._lock:
+            self._pending = [document for document in self._pending if document[0] not in ids]
+            self._pending_deletes.extend(ids)
+
+    def commit(self) -> None:
+        """Write queued changes as a new segment and merge segments if there are too many."""
+        with self._lock:
+            self._flush()
+            if len(self._segments) > MAX_SEGMENTS:
+                self._merge()
+
+    def _flush(self) -> None:
+        segments = self._load()
+        if not self._pending and not self._pending_deletes:
+            return
+        # Later copies of an ID within the batch win, as they would across segments
+        latest = {doc_id: index for index, (doc_id, _, _) in enumerate(self._pending)}
+        documents = [self._pending[index] for index in sorted(latest.values())]
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for position, (_, counts, _) in enumerate(documents):
+            for term, frequency in counts.items():
+                term_postings = postings.setdefault(term, ([], []))
+                term_postings[0].append(position)
+                term_postings[1].append(frequency)
+
+        name = f"seg_{self._next_segment:06d}"
+        _Segment.write(
+            self.directory / name,
+            [doc_id for doc_id, _, _ in documents],
+            [length for _, _, length in documents],
+            postings,
+            deletes=self._pending_deletes
+        )
+        self._next_segment += 1
+        self._pending, self._pending_deletes = [], []
+        segments.append(_Segment(self.directory / name))
+        self._write_manifest()
+        self._refresh()
+
+    def _merge(self) -> None:
+        """Rewrite all live documents as a single segment."""
+        ids: List[str] = []
+        lengths: List[int] = []
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for segment in self._segments:
+            # Position of each live document in the merged segment
+            remap = np.cumsum(segment.live) - 1 + len(ids)
+            ids.extend(doc_id for doc_id, live in zip(segment.ids, segment.live) if live)
+            lengths.extend(np.asarray(segment.lengths)[segment.live].tolist())
+            for term in segment.terms:
+                docs, freqs = segment.postings(term)
+                if len(docs):
+                    term_postings = postings.setdefault(term, ([], []))
+                    term_postings[0].extend(remap[docs].tolist())
+                    term_postings[1].extend(freqs.tolist())
+
+        old = self._segments
+        name = f"seg_{self._next_segment:06d}"
+        _Segment.write(self.directory / name, ids, lengths, postings)
+        self._next_segment += 1
+        self._segments = [_Segment(self.directory / name)]
+        self._write_manifest()
+        self._refresh()
+        for segment in old:
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def _write_manifest(self) -> None:
+        # Replace atomically: readers see the old or the new segment list, never half of one
+        tmp_path = self.directory / "manifest.json.tmp"
+        tmp_path.write_text(json.dumps({
+            "segments": [segment.path.name for segment in self._segments],
+            "next_segment": self._next_segment
+        }))
+        os.replace(tmp_path, self._manifest_path)
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """Top ``n_results`` ``(id, bm25_score)`` pairs for ``query``.
+
+        Only the postings of the query terms are read under the lock; scoring
+        runs outside it, so searches do not wait for each other or hold up
+        ``add`` and ``commit``.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            segments = self._load()
+            num_docs = len(self._locations)
+            if not terms or not num_docs:
+                return []
+            total_length = sum(int(np.asarray(s.lengths)[s.live].sum()) for s in segments)
+            # Copies of the live postings and their document lengths: a later commit may
+            # change which documents are live or merge these segments away
+            matches = {}
+            for term in terms:
+                matches[term] = []
+                for segment in segments:
+                    docs, freqs = segment.postings(term)
+                    matches[term].append((docs, freqs, np.asarray(segment.lengths[docs])))
+            ids = [segment.ids for segment in segments]
+        average_length = max(total_length / num_docs, 1.0)
+
+        scores = [np.zeros(len(segment_ids), dtype=np.float32) for segment_ids in ids]
+        for term, per_segment in matches.items():
+            frequency = sum(len(docs) for docs, _, _ in per_segment)
+            if not frequency:
+                continue
+            idf = math.log(1 + (num_docs - frequency + 0.5) / (frequency + 0.5))
+            for segment_scores, (docs, freqs, lengths) in zip(scores, per_segment):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / average_length)
+                segment_scores[docs] += idf * freqs * (BM25_K1 + 1) / (freqs + norm)
+
+        hits = []
+        for segment_ids, segment_scores in zip(ids, scores):
+            positions = np.flatnonzero(segment_scores)
+            if len(positions) > n_results:
+                positions = positions[np.argpartition(segment_scores[positions], -n_results)[-n_results:]]
+            hits.extend((segment_ids[position], float(segment_scores[position])) for position in positions)
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:n_results]
@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from prometheus_client import Counter, Gauge, Histogram
+from pydantic import ConfigDict
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Metrics
+LLM_BACKEND_REQUESTS = Counter(
+    'rag_llm_backend_requests_total',
+    'Requests to each LLM backend by outcome (success, error, timeout, cancelled, rejected)',
+    ['backend', 'outcome']
+)
+LLM_BACKEND_TIME = Histogram(
+    'rag_llm_backend_seconds',
+    'Time of successful generations per LLM backend',
+    ['backend'],
+    buckets=LATENCY_BUCKETS
+)
+LLM_BACKEND_FIRST_TOKEN = Histogram(
+    'rag_llm_backend_first_token_seconds',
+    'Time to the first token per LLM backend, including waiting for a concurrency slot',
+    ['backend'],
+    buckets=LATENCY_BUCKETS
+)
+LLM_HEDGED_REQUESTS = Counter(
+    'rag_llm_hedged_requests_total',
+    'Second requests sent because the first had no token after the hedge delay',
+    ['backend']
+)
+LLM_FALLBACKS = Counter('rag_llm_fallbacks_total', 'Requests sent to another backend after one failed', ['backend'])
+LLM_CIRCUIT_OPEN = Gauge('rag_llm_circuit_open', 'Whether the circuit breaker of an LLM backend is open', ['backend'])
+
+
+class LLMUnavailable(Exception):
+    """Every LLM backend failed or has an open circuit breaker."""
+
+
+class CircuitBreaker:
+    """Stop sending requests to a backend after ``failure_threshold`` consecutive failures.
+
+    Once open, the breaker rejects requests for ``reset_seconds``, then lets a
+    single trial request through (half open): its success closes the breaker,
+    its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; in the half-open state only one may be."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Forget a request that ended without a verdict, such as a cancelled one."""
+        self._trial_in_flight = False
+
+
+class LLMBackend:
+    """A chat model behind a concurrency limit, a deadline and a circuit breaker.
+
+    ``timeout_seconds`` bounds each request, including the wait for one of
+    ``max_concurrency`` slots. Times to first token of recent successful
+    requests are kept to derive the hedge delay.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: BaseChatModel,
+        max_concurrency: int = 16,
+        timeout_seconds: float = 30.0,
+        breaker: Optional[CircuitBreaker] = None,
+        window: int = 200
+    ):
+        self.name = name
+        self.model = model
+        self.timeout_seconds = timeout_seconds
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self.breaker = breaker or CircuitBreaker()
+        self.first_token_times: Deque[float] = deque(maxlen=window)
+
+    def hedge_delay(self, percentile: float, min_delay: float, min_samples: int = 20) -> Optional[float]:
+        """The ``percentile`` of recent times to first token, or None until enough are known."""
+        if percentile <= 0 or len(self.first_token_times) < min_samples:
+            return None
+        ordered = sorted(self.first_token_times)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100.0))
+        return max(min_delay, ordered[index])
+
+
+class LLMGateway(BaseChatModel):
+    """Chat model that spreads requests over a list of LLM backends.
+
+    Backends are tried in order. A request goes to the first backend whose
+    circuit breaker lets it through. If that request fails or misses its deadline
+    before the first token, the request moves to the next backend, such as a
+    cheaper model or the local stand-in. If no token has arrived after the
+    backend's ``hedge_percentile`` time to first token, a second request is
+    hedged to the next backend (or the same one when it is the only one). The
+    first to produce a token is streamed and the other is cancelled. Once
+    tokens have been streamed, a failure is raised instead of starting over.
+    If no backend can answer, ``LLMUnavailable`` is raised.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    backends: List[LLMBackend]
+    hedge_percentile: float = 95.0
+    hedge_min_delay_ms: float = 100.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "llm-gateway"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        # Synchronous calls only fall back in order; hedging needs the event loop
+        errors = []
+        for backend in self.backends:
+            if not backend.breaker.allow():
+                LLM_BACKEND_REQUESTS.labels(backend=backend.name, outcome="rejected").inc()
+                continue
+            try:
+                result = backend.model.invoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                self._record_failure(backend, "error")
+                errors.append(f"{backend.name}: {e}")
+                continue
+            self._record_success(backend)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=result.content))])
+        raise LLMUnavailable(self._unavailable_message(errors))
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        text = "".join([token async for token in self.stream_text(messages, stop=stop, **kwargs)])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async for token in self.stream_text(messages, stop=stop, **kwargs):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def stream_text(self, messages: List[BaseMessage], **kwargs: Any) -> AsyncIterator[str]:
+        """Stream the answer's text from the first backend to produce a token."""
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks: List[asyncio.Task] = []
+        launched: List[LLMBackend] = []
+        running: List[int] = []
+        untried = list(self.backends)
+        errors: List[str] = []
+        winner: Optional[int] = None
+        hedge_at: Optional[float] = None
+
+        def launch(backend: LLMBackend) -> bool:
+            nonlocal hedge_at
+            if not backend.breaker.allow():
+                LLM_BACKEND_REQUESTS.labels(backend=backend.name, outcome="rejected").inc()
+                return False
+            attempt = len(tasks)
+            tasks.append(asyncio.create_task(self._attempt(attempt, backend, messages, queue, kwargs)))
+            launched.append(backend)
+            running.append(attempt)
+            delay = backend.hedge_delay(self.hedge_percentile, self.hedge_min_delay_ms / 1000.0)
+            hedge_at = time.monotonic() + delay if delay is not None and len(tasks) == 1 else None
+            return True
+
+        def launch_next() -> Optional[LLMBackend]:
+            while untried:
+                backend = untried.pop(0)
+                if launch(backend):
+                    return backend
+            return None
+
+        try:
+            if launch_next() is None:
+                raise LLMUnavailable(self._unavailable_message(errors))
+            while True:
+                timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+                try:
+                    attempt, kind, payload = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    # No token yet from the first request: hedge a second one
+                    hedge_at = None
+                    backend = untried.pop(0) if untried else launched[0]
+                    if launch(backend):
+                        LLM_HEDGED_REQUESTS.labels(backend=backend.name).inc()
+                    continue
+                if winner is None:
+                    if kind == "error":
+                        running.remove(attempt)
+                        errors.append(payload)
+                        if not running:
+                            # Every request so far failed before its first token
+                            fallback = launch_next()
+                            if fallback is None:
+                                raise LLMUnavailable(self._unavailable_message(errors))
+                            LLM_FALLBACKS.labels(backend=fallback.name).inc()
+                        continue
+                    # The first request to produce a token (or to finish) wins
+                    winner = attempt
+                    hedge_at = None
+                    for other in running:
+                        if other != attempt:
+                            tasks[other].cancel()
+                if attempt != winner:
+                    continue
+                if kind == "token":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise LLMUnavailable(payload)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _attempt(
+        self, attempt: int, backend: LLMBackend, messages: List[BaseMessage], queue: asyncio.Queue, kwargs: Any
+    ) -> None:
+        """Send one request to ``backend``, putting ``(attempt, "token" | "done" | "error", payload)`` on ``queue``."""
+        start_time = time.perf_counter()
+        first_token = True
+        try:
+            async with asyncio.timeout(backend.timeout_seconds), backend.semaphore:
+                async for chunk in backend.model.astream(messages, **kwargs):
+                    if first_token:
+                        elapsed = time.perf_counter() - start_time
+                        backend.first_token_times.append(elapsed)
+                        LLM_BACKEND_FIRST_TOKEN.labels(backend=backend.name).observe(elapsed)
+                        first_token = False
+                    queue.put_nowait((attempt, "token", chunk.content))
+        except asyncio.CancelledError:
+            LLM_BACKEND_REQUESTS.labels(backend=backend.name, outcome="cancelled").inc()
+            backend.breaker.release()
+            raise
+        except TimeoutError:
+            self._record_failure(backend, "timeout")
+            logger.warning("LLM backend %s missed its %gs deadline", backend.name, backend.timeout_seconds)
+            queue.put_nowait((attempt, "error", f"{backend.name}: no answer within {backend.timeout_seconds:g}s"))
+            return
+        except Exception as e:
+            self._record_failure(backend, "error")
+            logger.warning("LLM backend %s failed: %s", backend.name, e)
+            queue.put_nowait((attempt, "error", f"{backend.name}: {e}"))
+            return
+        self._record_success(backend)
+        LLM_BACKEND_TIME.labels(backend=backend.name).observe(time.perf_counter() - start_time)
+        queue.put_nowait((attempt, "done", None))
+
+    @staticmethod
+    def _record_success(backend: LLMBackend) -> None:
+        backend.breaker.record_success()
+        LLM_BACKEND_REQUESTS.labels(backend=backend.name, outcome="success").inc()
+        LLM_CIRCUIT_OPEN.labels(backend=backend.name).set(0)
+
+    @staticmethod
+    def _record_failure(backend: LLMBackend, outcome: str) -> None:
+        backend.breaker.record_failure()
+        LLM_BACKEND_REQUESTS.labels(backend=backend.name, outcome=outcome).inc()
+        LLM_CIRCUIT_OPEN.labels(backend=backend.name).set(1 if backend.breaker.opened_at is not None else 0)
+
+    @staticmethod
+    def _unavailable_message(errors: List[str]) -> str:
+        if not errors:
+            return "All LLM backends are unavailable (circuit breakers open)"
+        return "All LLM backends failed: " + "; ".join(errors)
+
+
+class ExtractiveChatModel(BaseChatModel):
+    """Local stand-in for an LLM that needs no network or model.
+
+    It answers with the opening words of the prompt's context (the text after
+    the first ``": "`` of the system message), so it can serve as a last
+    resort fallback that still returns the retrieved facts, and as a
+    deterministic backend in tests.
+    """
+
+    max_words: int = 60
+    prefix: str = "The language model is unavailable. The most relevant retrieved text is: "
+
+    @property
+    def _llm_type(self) -> str:
+        return "extractive"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        system = next((str(message.content) for message in messages if message.type == "system"), "")
+        context = system.partition(": ")[2] or (str(messages[-1].content) if messages else "")
+        return self.prefix + " ".join(context.split()[:self.max_words])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
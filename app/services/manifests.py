@@ -0,0 +1,110 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+
+# Metadata recording where a chunk sits in its document, which shifts when earlier content changes
+POSITION_FIELDS = frozenset({"chunk", "page", "row_start", "char_start", "char_end"})
+
+
+def metadata_digest(metadata: Dict[str, Any]) -> str:
+    """Digest of a chunk's metadata as ``<content>:<position>``.
+
+    A chunk whose text and digest are unchanged needs no write; one whose
+    content part is unchanged only moved, and needs a metadata update.
+    """
+    content = {key: value for key, value in metadata.items() if key not in POSITION_FIELDS}
+    position = {key: value for key, value in metadata.items() if key in POSITION_FIELDS}
+    return f"{_digest(content)}:{_digest(position)}"
+
+
+def content_digest(digest: str) -> str:
+    """The part of a metadata digest that leaves out position fields."""
+    return digest.partition(":")[0]
+
+
+def _digest(metadata: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class Manifest:
+    """The chunks of one version of a document: chunk ID -> metadata digest."""
+    source: str
+    file_hash: str
+    chunking: str
+    version: int
+    chunks: Dict[str, str] = field(default_factory=dict)
+    updated_at: float = 0.0
+
+
+class ManifestStore:
+    """Per-document chunk manifests in a local SQLite file.
+
+    Re-ingesting a document diffs its new chunks against the manifest of the
+    previous version: only new or changed chunks are written and chunks that
+    are gone are deleted. ``chunking`` records the chunking settings, since
+    the same file chunked differently is a different version.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "source TEXT PRIMARY KEY, file_hash TEXT NOT NULL, chunking TEXT NOT NULL, "
+                "version INTEGER NOT NULL, num_chunks INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "source TEXT NOT NULL, id TEXT NOT NULL, digest TEXT NOT NULL, PRIMARY KEY (source, id)) WITHOUT ROWID"
+            )
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, source: str) -> Optional[Manifest]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT file_hash, chunking, version, updated_at FROM documents WHERE source = ?", (source,)
+            ).fetchone()
+            if row is None:
+                return None
+            chunks = dict(conn.execute("SELECT id, digest FROM chunks WHERE source = ?", (source,)))
+        return Manifest(source, row[0], row[1], row[2], chunks, row[3])
+
+    def save(self, source: str, file_hash: str, chunking: str, chunks: Dict[str, str]) -> int:
+        """Replace the manifest of ``source``; returns its new version number."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT version FROM documents WHERE source = ?", (source,)).fetchone()
+            version = row[0] + 1 if row is not None else 1
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (source, file_hash, chunking, version, num_chunks, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (source, file_hash, chunking, version, len(chunks), time.time())
+            )
+            conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            conn.executemany(
+                "INSERT INTO chunks (source, id, digest) VALUES (?, ?, ?)",
+                ((source, doc_id, digest) for doc_id, digest in chunks.items())
+            )
+        return version
+
+    def delete(self, source: str) -> bool:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            return conn.execute("DELETE FROM documents WHERE source = ?", (source,)).rowcount > 0
@@ -1,245 +1,1393 @@
 import os
-from typing import List, Dict, Any, Union
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import replace
+from functools import partial
+from contextlib import contextmanager
+from typing import List, Dict, Any, AsyncIterator, Iterator, NamedTuple, Optional, Set, Tuple, Union, Callable
 from fastapi import UploadFile
 from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from chromadb import PersistentClient
 from langgraph.graph import Graph, END
-import pandas as pd
-import pypdf
 from prometheus_client import Histogram, Counter
 from pydantic import BaseModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-import shutil
+import hashlib
+import json
 import logging
 import time
+import uuid
+import weakref
 from pathlib import Path
 from langchain_huggingface import HuggingFaceEmbeddings
+import numpy as np
 
 from app.core.config import settings
+from app.core.tracing import current_trace_id
+from app.services.answer_cache import AnswerCache, normalize_query
+from app.services.context_budget import CrossEncoderReranker, assemble_context, truncate_to_tokens
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
+from app.services.lexical_index import FusionParams, LexicalIndex, reciprocal_rank_fusion
+from app.services.llm_gateway import CircuitBreaker, ExtractiveChatModel, LLMBackend, LLMGateway
+from app.services.sessions import Session, SessionStore, SqliteSessionStore, Turn
+from app.services.single_flight import SingleFlight
+from app.services.structured_data import StructuredStore
+from app.services.vector_store import (
+    DEFAULT_COLLECTION,
+    ChromaVectorStore,
+    CollectionNotFound,
+    NumpyVectorStore,
+    VectorStore
+)
+from app.services.ingestion import (
+    HASH_BLOCK_SIZE,
+    SUPPORTED_EXTENSIONS,
+    Document,
+    batched,
+    chunk_id,
+    hash_file,
+    iter_documents
+)
+from app.services.manifests import Manifest, ManifestStore, content_digest, metadata_digest
+from app.services.tokens import approximate_token_spans, embedding_token_spans, estimate_tokens
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Metrics
-QUERY_PROCESSING_TIME = Histogram('rag_query_processing_seconds', 'Time spent processing queries')
+QUERY_PROCESSING_TIME = Histogram('rag_query_processing_seconds', 'End-to-end time to answer a query')
+QUERY_TIME_TO_FIRST_TOKEN = Histogram(
+    'rag_query_time_to_first_token_seconds',
+    'Time from receiving a streamed query to emitting its first answer token',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0)
+)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EMBEDDING_TIME = Histogram('rag_embedding_seconds', 'Time to embed a query, including batching delay', buckets=STAGE_BUCKETS)
+VECTOR_SEARCH_TIME = Histogram('rag_vector_search_seconds', 'Time spent in vector store queries', buckets=STAGE_BUCKETS)
+LEXICAL_SEARCH_TIME = Histogram('rag_lexical_search_seconds', 'Time spent in BM25 search and rank fusion', buckets=STAGE_BUCKETS)
+STRUCTURED_QUERY_TIME = Histogram('rag_structured_query_seconds', 'Time spent planning and running structured queries', buckets=STAGE_BUCKETS)
+PROMPT_BUILD_TIME = Histogram(
+    'rag_prompt_build_seconds',
+    'Time to render the generation prompt',
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram('rag_llm_time_to_first_token_seconds', 'Time from LLM request to its first token', buckets=STAGE_BUCKETS)
+LLM_TIME = Histogram('rag_llm_seconds', 'Total time of an LLM generation', buckets=STAGE_BUCKETS)
+LLM_PROMPT_TOKENS = Counter('rag_llm_prompt_tokens_total', 'Estimated prompt tokens sent to the LLM')
+LLM_COMPLETION_TOKENS = Counter('rag_llm_completion_tokens_total', 'Estimated completion tokens received from the LLM')
+LLM_CALLS_COALESCED = Counter(
+    'rag_llm_calls_coalesced_total',
+    'LLM calls saved by sharing an identical in-flight generation'
+)
+CONTEXT_TOKENS = Histogram(
+    'rag_context_tokens',
+    'Estimated size of the retrieved context per generation',
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192)
+)
+CONTEXT_ASSEMBLY_TIME = Histogram(
+    'rag_context_assembly_seconds',
+    'Time to dedupe, rerank and pack retrieved chunks into the context budget',
+    buckets=STAGE_BUCKETS
+)
+CONTEXT_TOKENS_SAVED = Counter('rag_context_tokens_saved_total', 'Estimated retrieved tokens left out of prompts by context assembly')
 DOCUMENT_PROCESSING_TIME = Histogram('rag_document_processing_seconds', 'Time spent processing documents')
+DOCUMENT_INGESTION_RATE = Histogram(
+    'rag_document_ingestion_docs_per_second',
+    'Documents ingested per second, per uploaded file',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+DOCUMENTS_INGESTED_TOTAL = Counter('rag_documents_ingested_total', 'Total number of documents written to the vector store')
 QUERIES_TOTAL = Counter('rag_queries_total', 'Total number of queries processed')
 ERRORS_TOTAL = Counter('rag_errors_total', 'Total number of errors encountered')
+CACHE_HITS_TOTAL = Counter('rag_cache_hits_total', 'Answer cache hits', ['tier'])
+CACHE_MISSES_TOTAL = Counter('rag_cache_misses_total', 'Answer cache misses', ['tier'])
+CACHE_EVICTIONS_TOTAL = Counter('rag_cache_evictions_total', 'Answer cache evictions', ['reason'])
+
+# Uploads wait here, one file per submission, until their ingestion moves them into place
+PENDING_UPLOADS_DIRECTORY = ".pending"
+
+RAG_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful AI assistant. Use the following context to answer the user's question: {context}"),
+    MessagesPlaceholder(variable_name="messages"),
+    ("human", "{query}")
+])
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "Summarize the conversation below in at most {max_words} words. Keep names, figures, dates "
+               "and open questions; reply with the summary only."),
+    ("human", "Summary so far:\n{summary}\n\nNew turns:\n{turns}")
+])
+
+class StoredChunk(NamedTuple):
+    """A chunk as written to the vector store, with the digest its manifest entry records."""
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+    digest: str
 
 class AgentState(BaseModel):
-    messages: List[Union[HumanMessage, AIMessage]]
+    trace_id: str = ""
+    messages: List[Union[SystemMessage, HumanMessage, AIMessage]]
     context: str = ""
     query: str = ""
+    documents: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    distances: List[float] = []
+    document_embeddings: List[Any] = []
+    context_tokens_saved: int = 0
+    query_embedding: List[float] = []
+    cache_hit: bool = False
+    structured_query: Optional[Any] = None
+    prefetched: bool = False
+    fusion: Optional[FusionParams] = None
+    collection: Optional[str] = None
+    where: Optional[Dict[str, Any]] = None
+    use_cache: bool = True
+    timings: Dict[str, float] = {}
+
+def _llm_backend_specs() -> List[str]:
+    """``LLM_BACKENDS`` as a list of ``provider:model`` specs, with Groq's default model filled in."""
+    specs = []
+    for spec in (settings.LLM_BACKENDS or f"groq:{settings.GROQ_MODEL}").split(","):
+        provider, _, model_name = spec.strip().partition(":")
+        if provider == "groq":
+            specs.append(f"groq:{model_name or settings.GROQ_MODEL}")
+        elif provider == "local":
+            specs.append(provider)
+        else:
+            raise ValueError(f"Unknown LLM backend: {spec}")
+    return specs
+
+def _llm_backends() -> List[LLMBackend]:
+    """The backends listed in ``LLM_BACKENDS``, each with its own limits and circuit breaker."""
+    backends = []
+    for spec in _llm_backend_specs():
+        provider, _, model_name = spec.partition(":")
+        if provider == "groq":
+            model = ChatGroq(groq_api_key=settings.GROQ_API_KEY, model_name=model_name)
+        else:
+            model = ExtractiveChatModel()
+        backends.append(LLMBackend(
+            spec,
+            model,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            timeout_seconds=settings.LLM_TIMEOUT_SECONDS,
+            breaker=CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_SECONDS)
+        ))
+    return backends
+
+def _collection_path(base: str, collection: str) -> str:
+    """Where a named collection keeps its files under ``base``."""
+    return os.path.join(base, "collections", collection)
+
+@contextmanager
+def _timed(state: AgentState, stage: str, histogram: Histogram) -> Iterator[None]:
+    """Observe the duration of a pipeline stage and add it to the state's timings."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        histogram.observe(elapsed)
+        state.timings[stage] = state.timings.get(stage, 0.0) + elapsed
 
 class RAGPipeline:
-    """Retrieval-Augmented Generation Pipeline"""
+    """Retrieval-Augmented Generation Pipeline
+
+    Construction is cheap: the language model, the embedding model and the
+    vector store are created on first use (or by ``warm_up``), so the API can
+    bind and answer health checks before any model is loaded.
+    """
     
     def __init__(self):
-        # Initialize language model
-        self.llm = ChatGroq(
-            groq_api_key=settings.GROQ_API_KEY,
-            model_name=settings.GROQ_MODEL
+        self._llm: Optional[LLMGateway] = None
+        self._embeddings: Optional[HuggingFaceEmbeddings] = None
+        self._vector_store: Optional[VectorStore] = None
+        self._chroma_client = None
+        # Stores of named collections (one per tenant or dataset), opened on first use
+        self._vector_stores: Dict[str, VectorStore] = {}
+        self._lexical_indexes: Dict[str, LexicalIndex] = {}
+        self._structured_stores: Dict[str, StructuredStore] = {}
+        self._manifests: Dict[str, ManifestStore] = {}
+        # Held weakly: a lock is dropped once no ingestion holds or waits on it
+        self._document_locks: "weakref.WeakValueDictionary[Tuple[str, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._pdf_executor: Optional[ProcessPoolExecutor] = None
+        self._init_lock = threading.Lock()
+        self.ready = False
+        self._background_tasks: Set[asyncio.Task] = set()
+        
+        # Bounded pool for blocking work (embedding, vector search, parsing)
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.PIPELINE_WORKERS,
+            thread_name_prefix="rag-worker"
         )
         
-        # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # Micro-batch concurrent query embeddings into single model calls
+        self.query_embedder = EmbeddingBatcher(
+            lambda texts: self.embeddings.embed_documents(texts),
+            executor=self.executor,
+            max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+            max_wait_ms=settings.EMBEDDING_MAX_WAIT_MS
+        )
         
-        # Initialize vector store
-        os.makedirs(settings.VECTORDB_PATH, exist_ok=True)
-        self.vector_store = PersistentClient(path=settings.VECTORDB_PATH)
-        self.collection = self.vector_store.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"}
+        # Concurrent identical generations (same question, context and model) share one LLM call
+        self.llm_flights = SingleFlight(on_shared=LLM_CALLS_COALESCED.inc)
+        
+        # Exact and semantic answer cache in front of the LLM
+        self.answer_cache = AnswerCache(
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            semantic_distance=settings.ANSWER_CACHE_SEMANTIC_DISTANCE,
+            on_evict=lambda reason: CACHE_EVICTIONS_TOTAL.labels(reason=reason).inc()
+        )
+        
+        # Typed tables of ingested CSVs for analytical queries
+        self.structured_store = StructuredStore(
+            os.path.join(settings.PROCESSED_DATA_PATH, "structured.db")
         )
         
-        # Create workflow
+        # Chunk embeddings from earlier ingestions, so re-ingesting unchanged text skips the model
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                os.path.join(settings.PROCESSED_DATA_PATH, "embedding_cache"),
+                EMBEDDING_MODEL,
+                dtype=settings.EMBEDDING_CACHE_DTYPE
+            )
+        
+        # BM25 over chunk text, fused with vector search for exact terms (tickers, dates, figures)
+        self.lexical_index: Optional[LexicalIndex] = None
+        if settings.HYBRID_SEARCH_ENABLED:
+            self.lexical_index = LexicalIndex(os.path.join(settings.PROCESSED_DATA_PATH, "lexical_index"))
+        
+        # Optional cross-encoder that reorders retrieved chunks before they are packed into the prompt
+        self.reranker: Optional[CrossEncoderReranker] = None
+        if settings.CONTEXT_RERANK_MODEL:
+            self.reranker = CrossEncoderReranker(settings.CONTEXT_RERANK_MODEL)
+        
+        # Conversation history per session_id, bounded by tokens (older turns are summarized) and bytes
+        session_limits = {
+            "max_sessions": settings.SESSION_MAX_SESSIONS,
+            "ttl_seconds": settings.SESSION_TTL_SECONDS,
+            "max_bytes": settings.SESSION_MAX_BYTES
+        }
+        if settings.SESSION_STORE == "sqlite":
+            self.sessions: SessionStore = SqliteSessionStore(
+                os.path.join(settings.PROCESSED_DATA_PATH, "sessions.db"), **session_limits
+            )
+        else:
+            self.sessions = SessionStore(**session_limits)
+        
+        # Create workflows: the full graph, and retrieval only for streamed answers
         self.workflow = self._create_workflow()
+        self.retrieval_workflow = self._create_workflow(include_generation=False)
+
+    @property
+    def llm(self) -> LLMGateway:
+        if self._llm is None:
+            with self._init_lock:
+                if self._llm is None:
+                    self._llm = LLMGateway(
+                        backends=_llm_backends(),
+                        hedge_percentile=settings.LLM_HEDGE_PERCENTILE,
+                        hedge_min_delay_ms=settings.LLM_HEDGE_MIN_DELAY_MS
+                    )
+        return self._llm
+
+    @property
+    def embeddings(self) -> HuggingFaceEmbeddings:
+        if self._embeddings is None:
+            with self._init_lock:
+                if self._embeddings is None:
+                    logger.info("Loading embedding model")
+                    self._embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        return self._embeddings
+
+    @property
+    def vector_store(self) -> VectorStore:
+        if self._vector_store is None:
+            with self._init_lock:
+                if self._vector_store is None:
+                    self._vector_store = self._open_vector_store(DEFAULT_COLLECTION)
+        return self._vector_store
+
+    def _open_vector_store(self, collection: str, create: bool = True) -> VectorStore:
+        os.makedirs(settings.VECTORDB_PATH, exist_ok=True)
+        if settings.VECTOR_STORE == "numpy":
+            directory = os.path.join(settings.VECTORDB_PATH, "numpy")
+            if collection != DEFAULT_COLLECTION:
+                directory = _collection_path(settings.VECTORDB_PATH, collection)
+                if not create and not os.path.isdir(directory):
+                    raise CollectionNotFound(collection)
+            return NumpyVectorStore(
+                directory,
+                dtype=settings.VECTOR_STORE_DTYPE,
+                ivf_lists=settings.VECTOR_IVF_LISTS,
+                ivf_probes=settings.VECTOR_IVF_PROBES
+            )
+        if self._chroma_client is None:
+            self._chroma_client = PersistentClient(path=settings.VECTORDB_PATH)
+        if not create and collection != DEFAULT_COLLECTION:
+            # Older Chroma versions list collection objects, newer ones names
+            names = {getattr(existing, "name", existing) for existing in self._chroma_client.list_collections()}
+            if collection not in names:
+                raise CollectionNotFound(collection)
+        return ChromaVectorStore(self._chroma_client.get_or_create_collection(
+            name=collection,
+            metadata={"hnsw:space": "cosine"}
+        ))
+
+    def vector_store_for(self, collection: Optional[str] = None, create: bool = False) -> VectorStore:
+        """Vector store of a named collection (None is the default one). Unknown
+        names raise CollectionNotFound unless ``create`` is set, as it is for ingestion."""
+        if collection in (None, DEFAULT_COLLECTION):
+            return self.vector_store
+        if collection not in self._vector_stores:
+            with self._init_lock:
+                if collection not in self._vector_stores:
+                    self._vector_stores[collection] = self._open_vector_store(collection, create)
+        return self._vector_stores[collection]
+
+    def lexical_index_for(self, collection: Optional[str] = None) -> Optional[LexicalIndex]:
+        if self.lexical_index is None or collection in (None, DEFAULT_COLLECTION):
+            return self.lexical_index
+        with self._init_lock:
+            if collection not in self._lexical_indexes:
+                self._lexical_indexes[collection] = LexicalIndex(
+                    os.path.join(_collection_path(settings.PROCESSED_DATA_PATH, collection), "lexical_index")
+                )
+            return self._lexical_indexes[collection]
 
-    def _create_workflow(self) -> Graph:
+    def structured_store_for(self, collection: Optional[str] = None) -> StructuredStore:
+        if collection in (None, DEFAULT_COLLECTION):
+            return self.structured_store
+        with self._init_lock:
+            if collection not in self._structured_stores:
+                self._structured_stores[collection] = StructuredStore(
+                    os.path.join(_collection_path(settings.PROCESSED_DATA_PATH, collection), "structured.db")
+                )
+            return self._structured_stores[collection]
+
+    def manifests_for(self, collection: Optional[str] = None) -> ManifestStore:
+        """Chunk manifests of the documents in a collection, for incremental re-ingestion."""
+        directory = settings.PROCESSED_DATA_PATH
+        if collection not in (None, DEFAULT_COLLECTION):
+            directory = _collection_path(directory, collection)
+        with self._init_lock:
+            if directory not in self._manifests:
+                self._manifests[directory] = ManifestStore(os.path.join(directory, "documents.db"))
+            return self._manifests[directory]
+
+    @property
+    def pdf_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Process pool for PDF text extraction, started on first use; None when disabled."""
+        if settings.PDF_PARSE_WORKERS <= 1:
+            return None
+        if self._pdf_executor is None:
+            with self._init_lock:
+                if self._pdf_executor is None:
+                    # Spawn rather than fork: the parent holds model and pool threads
+                    self._pdf_executor = ProcessPoolExecutor(
+                        max_workers=settings.PDF_PARSE_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._pdf_executor
+
+    def _load_components(self) -> None:
+        self.vector_store.load()
+        self.llm
+        if self.lexical_index is not None:
+            self.lexical_index.load()
+        if self.reranker is not None:
+            self.reranker.model
+        # Run one inference so the first real query does not pay for model warm-up
+        self.embeddings.embed_query("warm up")
+
+    async def warm_up(self) -> None:
+        """Load the models and open the vector store in the background."""
+        start_time = time.time()
+        await self._run_blocking(self._load_components)
+        self.ready = True
+        logger.info("Pipeline warmed up in %.2fs", time.time() - start_time)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._pdf_executor is not None:
+            self._pdf_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking call on the pipeline's worker pool without stalling the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def _search(
+        self,
+        query_embeddings: List[List[float]],
+        collection: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        # Graph nodes reach the lazily opened vector store through this method
+        # With hybrid search, fetch extra candidates for rank fusion to choose from
+        n_results = settings.HYBRID_CANDIDATES if self.lexical_index is not None else settings.RETRIEVAL_TOP_K
+        return self.vector_store_for(collection).query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            # Stored chunk embeddings let context assembly drop near-duplicates without re-embedding
+            include=["documents", "metadatas", "distances", "embeddings"],
+            where=where
+        )
+
+    def _fusion_params(self, overrides: Optional[Dict[str, Any]] = None) -> FusionParams:
+        """Configured rank fusion settings with per-request ``overrides`` applied."""
+        params = FusionParams(
+            vector_weight=settings.HYBRID_VECTOR_WEIGHT,
+            lexical_weight=settings.HYBRID_LEXICAL_WEIGHT,
+            k=settings.HYBRID_RRF_K
+        )
+        return replace(params, **overrides) if overrides else params
+
+    def _select_results(self, state: AgentState, results: Dict[str, Any], index: int) -> None:
+        """Copy row ``index`` of a vector store query result onto the state, fused with BM25 hits when enabled."""
+        self._apply_results(state, results, index)
+        lexical_index = self.lexical_index_for(state.collection)
+        if lexical_index is None:
+            return
+        with _timed(state, "lexical_search", LEXICAL_SEARCH_TIME):
+            vector_ids = results["ids"][index] if results["ids"] else []
+            lexical_ids = [doc_id for doc_id, _ in lexical_index.search(state.query, settings.HYBRID_CANDIDATES)]
+            embeddings = state.document_embeddings or [None] * len(state.documents)
+            rows = dict(zip(vector_ids, zip(state.documents, state.metadatas, state.distances, embeddings)))
+            if state.where:
+                # The BM25 index has no metadata: hits outside the filter are dropped before
+                # fusion, so they never take one of the top-k places
+                self._fetch_lexical_hits(state, [doc_id for doc_id in lexical_ids if doc_id not in rows], rows)
+                lexical_ids = [doc_id for doc_id in lexical_ids if doc_id in rows]
+
+            params = state.fusion or self._fusion_params()
+            fused = reciprocal_rank_fusion(
+                [vector_ids, lexical_ids],
+                [params.vector_weight, params.lexical_weight],
+                params.k
+            )
+            top = [doc_id for doc_id, _ in fused[:settings.RETRIEVAL_TOP_K]]
+            missing = [doc_id for doc_id in top if doc_id not in rows]
+            if missing:
+                self._fetch_lexical_hits(state, missing, rows)
+
+            selected = [rows[doc_id] for doc_id in top if doc_id in rows]
+            state.documents = [doc for doc, _, _, _ in selected]
+            state.metadatas = [metadata for _, metadata, _, _ in selected]
+            state.distances = [distance for _, _, distance, _ in selected]
+            embeddings = [embedding for _, _, _, embedding in selected]
+            state.document_embeddings = embeddings if all(e is not None for e in embeddings) else []
+            state.context = "\n".join(state.documents)
+
+    def _fetch_lexical_hits(self, state: AgentState, ids: List[str], rows: Dict[str, Tuple]) -> None:
+        """Fetch lexical-only hits within the query's filter into ``rows``, scored
+        like the vector hits (cosine distance)."""
+        if not ids:
+            return
+        fetched = self.vector_store_for(state.collection).get(
+            ids=ids,
+            include=["documents", "metadatas", "embeddings"],
+            where=state.where
+        )
+        query = np.asarray(state.query_embedding, dtype=np.float32)
+        for doc_id, doc, metadata, embedding in zip(
+            fetched["ids"], fetched["documents"], fetched["metadatas"], fetched["embeddings"]
+        ):
+            embedding = np.asarray(embedding, dtype=np.float32)
+            similarity = float(query @ embedding) / (float(np.linalg.norm(query) * np.linalg.norm(embedding)) or 1.0)
+            rows[doc_id] = (doc, metadata, 1.0 - similarity, embedding)
+
+    def _generation_chain(self):
+        return self.llm | StrOutputParser()
+
+    async def _stream_answer(self, state: AgentState) -> AsyncIterator[str]:
+        """Build the prompt and stream answer tokens, timing each stage.
+
+        Concurrent requests for the same answer share one LLM call: a request
+        that joins an in-flight generation gets the tokens streamed so far and
+        then the rest as they arrive.
+        """
+        with _timed(state, "prompt_build", PROMPT_BUILD_TIME):
+            prompt = RAG_PROMPT.invoke(self._generation_inputs(state))
+        CONTEXT_TOKENS.observe(estimate_tokens(state.context))
+
+        start_time = time.perf_counter()
+        first_token = True
+        if settings.LLM_COALESCING_ENABLED:
+            tokens = self.llm_flights.stream(self._generation_key(state), partial(self._generate, prompt))
+        else:
+            tokens = self._generate(prompt)
+        async for token in tokens:
+            if first_token:
+                state.timings["llm_first_token"] = time.perf_counter() - start_time
+                first_token = False
+            yield token
+        state.timings["llm_total"] = time.perf_counter() - start_time
+
+    async def _generate(self, prompt: Any) -> AsyncIterator[str]:
+        """Stream one LLM generation, recording its latency and token metrics."""
+        LLM_PROMPT_TOKENS.inc(estimate_tokens(prompt.to_string()))
+        start_time = time.perf_counter()
+        tokens: List[str] = []
+        async for token in self._generation_chain().astream(prompt):
+            if not tokens:
+                LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start_time)
+            tokens.append(token)
+            yield token
+        LLM_TIME.observe(time.perf_counter() - start_time)
+        LLM_COMPLETION_TOKENS.inc(estimate_tokens("".join(tokens)))
+
+    @staticmethod
+    def _generation_key(state: AgentState) -> Tuple[str, str, str]:
+        """Requests with the same normalized question, context, history and LLM backends get the same answer."""
+        digest = hashlib.sha256(state.context.encode("utf-8"))
+        for message in state.messages:
+            digest.update(f"\0{message.type}\0{message.content}".encode("utf-8"))
+        return normalize_query(state.query), digest.hexdigest(), ",".join(_llm_backend_specs())
+
+    @staticmethod
+    def _generation_inputs(state: AgentState) -> Dict[str, Any]:
+        return {
+            "context": state.context,
+            "messages": state.messages,
+            "query": state.query
+        }
+
+    @staticmethod
+    def _apply_results(state: AgentState, results: Dict[str, Any], index: int) -> None:
+        """Copy row ``index`` of a vector store query result onto the state."""
+        state.documents = results["documents"][index] if results["documents"] and results["documents"][index] else []
+        state.metadatas = results["metadatas"][index] if results["metadatas"] and results["metadatas"][index] else []
+        state.distances = results["distances"][index] if results["distances"] and results["distances"][index] else []
+        embeddings = results.get("embeddings")
+        state.document_embeddings = list(embeddings[index]) if embeddings is not None and len(embeddings) > index else []
+        state.context = "\n".join(state.documents)
+
+    def _assemble_context(self, state: AgentState) -> None:
+        """Dedupe, optionally rerank and pack the retrieved chunks into the context token budget."""
+        assembled = assemble_context(
+            state.documents,
+            state.document_embeddings or None,
+            max_tokens=settings.CONTEXT_MAX_TOKENS,
+            max_similarity=settings.CONTEXT_DEDUP_SIMILARITY,
+            rerank=partial(self.reranker.rerank, state.query) if self.reranker is not None else None
+        )
+        state.documents = assembled.texts
+        state.metadatas = [state.metadatas[index] for index in assembled.indices]
+        state.distances = [state.distances[index] for index in assembled.indices]
+        state.context = "\n".join(state.documents)
+        state.context_tokens_saved = assembled.tokens_saved
+        CONTEXT_TOKENS_SAVED.inc(assembled.tokens_saved)
+
+    @staticmethod
+    def _format_sources(state: AgentState) -> List[Dict[str, Any]]:
+        return [
+            {
+                "document_id": str((metadata or {}).get("source", "unknown")),
+                "content": doc,
+                "relevance_score": score
+            }
+            for doc, metadata, score in zip(state.documents, state.metadatas, state.distances)
+        ]
+
+    @staticmethod
+    def _confidence(state: AgentState) -> float:
+        return 1.0 - sum(state.distances) / len(state.distances) if state.distances else 0.0
+
+    def _create_workflow(self, include_generation: bool = True) -> Graph:
         # Define the nodes
-        def retrieve_context(state: AgentState) -> AgentState:
-            logger.info(f"Retrieving context for query: {state.query}")
-            start_time = time.time()
+        async def route_query(state: AgentState) -> AgentState:
+            # Metadata filters apply to document chunks, so filtered queries always use retrieval;
+            # batch queries arrive already planned (and prefetched when they need retrieval)
+            if (
+                settings.STRUCTURED_QUERIES_ENABLED and not state.prefetched
+                and state.where is None and state.structured_query is None
+            ):
+                with _timed(state, "structured_query", STRUCTURED_QUERY_TIME):
+                    structured_store = self.structured_store_for(state.collection)
+                    state.structured_query = await self._run_blocking(structured_store.plan, state.query)
+            return state
+
+        def route_after_planning(state: AgentState) -> str:
+            return "structured" if state.structured_query is not None else "vector"
+
+        async def query_structured_data(state: AgentState) -> AgentState:
+            logger.info("Answering from structured data: %s", state.structured_query.table)
             try:
-                query_embedding = self.embeddings.embed_query(state.query)
-                results = self.collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=3
-                )
-                context = "\n".join(results["documents"][0]) if results["documents"] and results["documents"][0] else ""
-                state.context = context
-                logger.info(f"Retrieved {len(results['documents'][0]) if results['documents'] and results['documents'][0] else 0} relevant documents")
+                with _timed(state, "structured_query", STRUCTURED_QUERY_TIME):
+                    structured_store = self.structured_store_for(state.collection)
+                    result = await self._run_blocking(structured_store.execute, state.structured_query)
+                state.context = result.to_context()
+                state.documents = [state.context]
+                state.metadatas = [{"source": result.source, "route": "structured"}]
+                state.distances = [0.0]
+            except Exception as e:
+                # Fall back to vector search rather than failing the query
+                logger.warning("Structured query failed, falling back to retrieval: %s", e)
+                state.structured_query = None
+            return state
+
+        async def retrieve_context(state: AgentState) -> AgentState:
+            if state.prefetched:
+                # Batch queries arrive with retrieval already done
+                return state
+            logger.info("Retrieving context for query: %.200s", state.query)
+            try:
+                with _timed(state, "embedding", EMBEDDING_TIME):
+                    state.query_embedding = await self.query_embedder.embed_query(state.query)
+                with _timed(state, "vector_search", VECTOR_SEARCH_TIME):
+                    results = await self._run_blocking(self._search, [state.query_embedding], state.collection, state.where)
+                await self._run_blocking(self._select_results, state, results, 0)
+                logger.info("Retrieved %d relevant documents", len(state.documents))
                 return state
             except Exception as e:
-                logger.error(f"Error retrieving context: {str(e)}")
+                logger.error("Error retrieving context: %s", e)
                 ERRORS_TOTAL.inc()
                 raise
-            finally:
-                QUERY_PROCESSING_TIME.observe(time.time() - start_time)
 
-        def generate_response(state: AgentState) -> AgentState:
+        def lookup_cache(state: AgentState) -> AgentState:
+            if not state.use_cache:
+                return state
+            cached = self.answer_cache.get_semantic(state.query, state.query_embedding)
+            if cached is None:
+                CACHE_MISSES_TOTAL.labels(tier="semantic").inc()
+                return state
+            CACHE_HITS_TOTAL.labels(tier="semantic").inc()
+            logger.info("Semantic cache hit")
+            state.messages.append(AIMessage(content=cached["answer"]))
+            state.cache_hit = True
+            return state
+
+        def route_after_cache(state: AgentState) -> str:
+            return "cached" if state.cache_hit else "generate"
+
+        async def assemble_context_node(state: AgentState) -> AgentState:
+            with _timed(state, "context_assembly", CONTEXT_ASSEMBLY_TIME):
+                await self._run_blocking(self._assemble_context, state)
+            if state.context_tokens_saved:
+                logger.info("Context assembly saved ~%d tokens", state.context_tokens_saved)
+            return state
+
+        async def generate_response(state: AgentState) -> AgentState:
             logger.info("Generating response")
-            start_time = time.time()
             try:
-                prompt = ChatPromptTemplate.from_messages([
-                    ("system", "You are a helpful AI assistant. Use the following context to answer the user's question: {context}"),
-                    MessagesPlaceholder(variable_name="messages"),
-                    ("human", "{query}")
-                ])
-                
-                chain = prompt | self.llm | StrOutputParser()
-                
-                response = chain.invoke({
-                    "context": state.context,
-                    "messages": state.messages,
-                    "query": state.query
-                })
+                response = "".join([token async for token in self._stream_answer(state)])
                 
                 state.messages.append(AIMessage(content=response))
                 logger.info("Response generated successfully")
                 return state
             except Exception as e:
-                logger.error(f"Error generating response: {str(e)}")
+                logger.error("Error generating response: %s", e)
                 ERRORS_TOTAL.inc()
                 raise
-            finally:
-                QUERY_PROCESSING_TIME.observe(time.time() - start_time)
 
         # Create the graph
         workflow = Graph()
         
         # Add nodes
+        workflow.add_node("route", route_query)
+        workflow.add_node("structured", query_structured_data)
         workflow.add_node("retrieve", retrieve_context)
-        workflow.add_node("generate", generate_response)
+        workflow.add_node("cache", lookup_cache)
+        workflow.add_node("assemble", assemble_context_node)
+        if include_generation:
+            workflow.add_node("generate", generate_response)
+            workflow.add_edge("generate", END)
+        generate = "generate" if include_generation else END
         
         # Add edges
-        workflow.add_edge("retrieve", "generate")
-        workflow.add_edge("generate", END)
+        workflow.add_conditional_edges("route", route_after_planning, {"structured": "structured", "vector": "retrieve"})
+        workflow.add_conditional_edges("structured", route_after_planning, {"structured": generate, "vector": "retrieve"})
+        workflow.add_edge("retrieve", "cache")
+        workflow.add_conditional_edges("cache", route_after_cache, {"cached": END, "generate": "assemble"})
+        workflow.add_edge("assemble", generate)
         
         # Set entry point
-        workflow.set_entry_point("retrieve")
+        workflow.set_entry_point("route")
         
         return workflow.compile()
 
-    async def process_query(self, query: str) -> Dict[str, Any]:
-        logger.info(f"Processing query: {query}")
-        start_time = time.time()
+    @staticmethod
+    def _history_messages(session: Optional[Session]) -> List[Union[SystemMessage, HumanMessage, AIMessage]]:
+        if session is None:
+            return []
+        messages: List[Union[SystemMessage, HumanMessage, AIMessage]] = []
+        if session.summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation: {session.summary}"))
+        for question, answer in session.turns:
+            messages.extend([HumanMessage(content=question), AIMessage(content=answer)])
+        return messages
+
+    async def _session_history(self, session_id: Optional[str]) -> List[Union[SystemMessage, HumanMessage, AIMessage]]:
+        if not session_id:
+            return []
+        return self._history_messages(await self._run_blocking(self.sessions.get, session_id))
+
+    async def _record_turn(self, session_id: Optional[str], query: str, answer: str) -> None:
+        """Add a turn to the session and, once its history is over budget, summarize the
+        oldest turns in the background (down to half the budget, so not on every turn)."""
+        if not session_id:
+            return
+        session = await self._run_blocking(self.sessions.add_turn, session_id, query, answer)
+        overflow = session.overflow(settings.SESSION_HISTORY_TOKENS, settings.SESSION_HISTORY_TOKENS // 2)
+        if overflow:
+            task = asyncio.create_task(self._summarize_turns(session_id, session.summary, overflow))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _summarize_turns(self, session_id: str, summary: str, turns: List[Turn]) -> None:
+        transcript = "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+        try:
+            chain = SUMMARY_PROMPT | self.llm | StrOutputParser()
+            summary = await chain.ainvoke({
+                "max_words": settings.SESSION_SUMMARY_TOKENS * 3 // 4,
+                "summary": summary or "(none)",
+                "turns": transcript
+            })
+        except Exception as e:
+            # Keep the history bounded even without a summary: fall back to the earlier questions
+            logger.warning("Summarizing session %s failed: %s", session_id, e)
+            summary = " ".join([summary, "Earlier questions:"] + [question for question, _ in turns]).strip()
+        summary = truncate_to_tokens(summary.strip(), settings.SESSION_SUMMARY_TOKENS)
+        await self._run_blocking(self.sessions.compact, session_id, turns, summary)
+
+    async def process_query(
+        self,
+        query: str,
+        fusion: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        collection: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Answer a query. ``fusion`` overrides the hybrid search weights and
+        rank constant for this request; with a ``session_id`` the session's
+        history is sent with the query and the turn is recorded. ``where``
+        filters retrieval on chunk metadata and ``collection`` searches a named
+        collection instead of the default one. Answers that depend on any of
+        these bypass the answer cache.
+        """
+        trace_id = current_trace_id()
+        logger.info("Processing query: %.200s", query)
+        start_time = time.perf_counter()
         try:
             QUERIES_TOTAL.inc()
+            history = await self._session_history(session_id)
+            use_cache = not fusion and not history and not where and collection is None
             
-            # Initialize state
-            state = AgentState(
-                messages=[],
-                query=query
-            )
+            # Exact-match cache short-circuits retrieval and generation
+            cached = self.answer_cache.get(query) if use_cache else None
+            if cached is not None:
+                CACHE_HITS_TOTAL.labels(tier="exact").inc()
+                logger.info("Exact cache hit")
+                await self._record_turn(session_id, query, cached["answer"])
+                cached["timings"] = {"total": time.perf_counter() - start_time}
+                return cached
+            CACHE_MISSES_TOTAL.labels(tier="exact").inc()
+            cache_version = self.answer_cache.version
             
-            # Get query embedding and retrieve documents
-            query_embedding = self.embeddings.embed_query(query)
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=3
+            # Run the workflow: retrieval happens once, inside the graph
+            state = AgentState(
+                messages=history,
+                query=query,
+                trace_id=trace_id,
+                fusion=self._fusion_params(fusion),
+                collection=collection,
+                where=where or None,
+                use_cache=use_cache
             )
+            result = await self._run_workflow(state, cache_version)
+            await self._record_turn(session_id, query, result["answer"])
+            result["timings"]["total"] = time.perf_counter() - start_time
             
-            # Set context in state
-            state.context = "\n".join(results["documents"][0]) if results["documents"] and results["documents"][0] else ""
-            
-            # Run the workflow
-            final_state = self.workflow.invoke(state)
-            
-            # Get the last message (the response)
-            response = final_state.messages[-1].content
-            
-            # Format sources
-            sources = [
-                {
-                    "document_id": str(metadata.get("source", "unknown")),
-                    "content": doc,
-                    "relevance_score": score
-                }
-                for doc, metadata, score in zip(
-                    results["documents"][0] if results["documents"] and results["documents"][0] else [],
-                    results["metadatas"][0] if results["metadatas"] and results["metadatas"][0] else [],
-                    results["distances"][0] if results["distances"] and results["distances"][0] else []
+            logger.info("Query processed successfully in %.2fs", result["timings"]["total"])
+            return result
+        except Exception as e:
+            logger.error("Error processing query: %s", e)
+            ERRORS_TOTAL.inc()
+            raise
+        finally:
+            QUERY_PROCESSING_TIME.observe(time.perf_counter() - start_time)
+
+    async def _run_workflow(self, state: AgentState, cache_version: int) -> Dict[str, Any]:
+        final_state = await self.workflow.ainvoke(state)
+        result = {
+            "answer": final_state.messages[-1].content,
+            "sources": self._format_sources(final_state),
+            "confidence": self._confidence(final_state),
+            "context_tokens_saved": final_state.context_tokens_saved
+        }
+        if final_state.use_cache:
+            self.answer_cache.put(final_state.query, final_state.query_embedding, result, version=cache_version)
+        result["timings"] = dict(final_state.timings)
+        return result
+
+    def _prefetch(self, states: List[AgentState]) -> None:
+        """Embed every query in one call and search the vector store once for all of
+        them; the states must share their collection and metadata filter."""
+        timings: Dict[str, float] = {}
+        start_time = time.perf_counter()
+        embeddings = self.embeddings.embed_documents([state.query for state in states])
+        timings["embedding"] = time.perf_counter() - start_time
+        results = self._search(embeddings, states[0].collection, states[0].where)
+        timings["vector_search"] = time.perf_counter() - start_time - timings["embedding"]
+        EMBEDDING_TIME.observe(timings["embedding"])
+        VECTOR_SEARCH_TIME.observe(timings["vector_search"])
+
+        for index, (state, embedding) in enumerate(zip(states, embeddings)):
+            state.query_embedding = embedding
+            state.timings.update(timings)
+            self._select_results(state, results, index)
+            state.prefetched = True
+
+    async def process_queries(
+        self,
+        queries: List[str],
+        fusion: Optional[List[Optional[Dict[str, Any]]]] = None,
+        where: Optional[List[Optional[Dict[str, Any]]]] = None,
+        collections: Optional[List[Optional[str]]] = None
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Answer a batch of queries with one embedding call and one vector search
+        per collection and filter, then generate answers with bounded
+        concurrency. Each item is either a result dict or the exception that
+        failed it; one failure never fails the batch. ``fusion``, ``where`` and
+        ``collections`` hold per-query values as in ``process_query``.
+        """
+        trace_id = current_trace_id()
+        logger.info("Processing batch of %d queries", len(queries))
+        start_time = time.perf_counter()
+
+        def finish(index: int, result: Union[Dict[str, Any], Exception]) -> None:
+            # Each item's end-to-end latency runs from the start of the batch
+            elapsed = time.perf_counter() - start_time
+            QUERY_PROCESSING_TIME.observe(elapsed)
+            if isinstance(result, dict):
+                result.setdefault("timings", {})["total"] = elapsed
+            results[index] = result
+
+        QUERIES_TOTAL.inc(len(queries))
+        results: List[Union[Dict[str, Any], Exception, None]] = [None] * len(queries)
+        cache_version = self.answer_cache.version
+
+        fusion = fusion or [None] * len(queries)
+        where = where or [None] * len(queries)
+        collections = collections or [None] * len(queries)
+        states: Dict[int, AgentState] = {}
+        for index, (query, overrides, filters, collection) in enumerate(zip(queries, fusion, where, collections)):
+            use_cache = not overrides and not filters and collection is None
+            cached = self.answer_cache.get(query) if use_cache else None
+            if cached is not None:
+                CACHE_HITS_TOTAL.labels(tier="exact").inc()
+                finish(index, cached)
+            else:
+                CACHE_MISSES_TOTAL.labels(tier="exact").inc()
+                states[index] = AgentState(
+                    messages=[],
+                    query=query,
+                    trace_id=f"{trace_id}-{index}",
+                    fusion=self._fusion_params(overrides),
+                    collection=collection,
+                    where=filters or None,
+                    use_cache=use_cache
                 )
-            ]
-            
-            logger.info(f"Query processed successfully in {time.time() - start_time:.2f}s")
-            return {
-                "answer": response,
+
+        # Structured queries take their own route; the rest share retrieval
+        if settings.STRUCTURED_QUERIES_ENABLED and states:
+            plans = await self._run_blocking(lambda: [
+                self.structured_store_for(s.collection).plan(s.query) if s.where is None else None
+                for s in states.values()
+            ])
+            for state, plan in zip(states.values(), plans):
+                state.structured_query = plan
+            vector = [index for index, plan in zip(states, plans) if plan is None]
+        else:
+            vector = list(states)
+        groups: Dict[Tuple[Optional[str], str], List[int]] = {}
+        for index in vector:
+            key = (states[index].collection, json.dumps(states[index].where, sort_keys=True))
+            groups.setdefault(key, []).append(index)
+        for group in groups.values():
+            try:
+                await self._run_blocking(self._prefetch, [states[index] for index in group])
+            except Exception as e:
+                logger.error("Error retrieving context for batch: %s", e)
+                ERRORS_TOTAL.inc()
+                for index in group:
+                    finish(index, e)
+                    del states[index]
+
+        semaphore = asyncio.Semaphore(settings.BATCH_LLM_CONCURRENCY)
+
+        async def answer(index: int, state: AgentState) -> None:
+            async with semaphore:
+                try:
+                    finish(index, await self._run_workflow(state, cache_version))
+                except Exception as e:
+                    logger.error("Error processing batch item %d: %s", index, e)
+                    ERRORS_TOTAL.inc()
+                    finish(index, e)
+
+        await asyncio.gather(*(answer(index, state) for index, state in states.items()))
+        logger.info("Batch processed in %.2fs", time.perf_counter() - start_time)
+        return results
+
+    async def stream_query(
+        self,
+        query: str,
+        fusion: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        collection: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a query, yielding ``sources`` first, then answer ``token`` events
+        as the LLM streams them, then ``done`` with the confidence and timings.
+        ``fusion``, ``session_id``, ``where`` and ``collection`` are as in
+        ``process_query``.
+        """
+        trace_id = current_trace_id()
+        logger.info("Streaming query: %.200s", query)
+        start_time = time.perf_counter()
+        try:
+            QUERIES_TOTAL.inc()
+            history = await self._session_history(session_id)
+            use_cache = not fusion and not history and not where and collection is None
+
+            cached = self.answer_cache.get(query) if use_cache else None
+            if cached is not None:
+                CACHE_HITS_TOTAL.labels(tier="exact").inc()
+                yield {"event": "sources", "data": cached["sources"]}
+                QUERY_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start_time)
+                yield {"event": "token", "data": cached["answer"]}
+                await self._record_turn(session_id, query, cached["answer"])
+                timings = {"total": time.perf_counter() - start_time}
+                yield {"event": "done", "data": {
+                    "confidence": cached["confidence"],
+                    "context_tokens_saved": cached.get("context_tokens_saved", 0),
+                    "timings": timings
+                }}
+                return
+            CACHE_MISSES_TOTAL.labels(tier="exact").inc()
+            cache_version = self.answer_cache.version
+
+            state = await self.retrieval_workflow.ainvoke(AgentState(
+                messages=history,
+                query=query,
+                trace_id=trace_id,
+                fusion=self._fusion_params(fusion),
+                collection=collection,
+                where=where or None,
+                use_cache=use_cache
+            ))
+            sources = self._format_sources(state)
+            yield {"event": "sources", "data": sources}
+
+            if state.cache_hit:
+                QUERY_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start_time)
+                answer = state.messages[-1].content
+                yield {"event": "token", "data": answer}
+            else:
+                tokens = []
+                async for token in self._stream_answer(state):
+                    if not tokens:
+                        QUERY_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start_time)
+                    tokens.append(token)
+                    yield {"event": "token", "data": token}
+                answer = "".join(tokens)
+
+            result = {
+                "answer": answer,
                 "sources": sources,
-                "confidence": 1.0 - sum(results["distances"][0]) / len(results["distances"][0]) if results["distances"] and results["distances"][0] else 0.0
+                "confidence": self._confidence(state),
+                "context_tokens_saved": state.context_tokens_saved
             }
+            if state.use_cache:
+                self.answer_cache.put(query, state.query_embedding, result, version=cache_version)
+            await self._record_turn(session_id, query, answer)
+
+            timings = {**state.timings, "total": time.perf_counter() - start_time}
+            logger.info("Query streamed successfully in %.2fs", timings["total"])
+            yield {"event": "done", "data": {
+                "confidence": result["confidence"],
+                "context_tokens_saved": result["context_tokens_saved"],
+                "timings": timings
+            }}
         except Exception as e:
-            logger.error(f"Error processing query: {str(e)}")
+            logger.error("Error streaming query: %s", e)
             ERRORS_TOTAL.inc()
             raise
         finally:
-            QUERY_PROCESSING_TIME.observe(time.time() - start_time)
+            QUERY_PROCESSING_TIME.observe(time.perf_counter() - start_time)
 
-    async def ingest_document(self, file: UploadFile) -> Dict[str, Any]:
+    async def ingest_document(self, file: UploadFile, collection: Optional[str] = None) -> Dict[str, Any]:
         """
         Ingest a document into the RAG pipeline.
+
+        The upload is streamed to disk, parsed lazily and written to the vector
+        store in fixed-size batches, so memory stays bounded by the batch size.
+        Chunk IDs hash the source name and chunk text, and each document's
+        manifest records its chunk IDs: a new version is diffed against it so
+        only changed chunks are written and removed ones deleted, and an
+        identical file is skipped.
+        A named ``collection`` (one per tenant or dataset) is created on first use.
+        """
+        path, file_hash = await self.save_upload(file, collection)
+        return await self.ingest_file(path, file.filename, file_hash, collection=collection)
+
+    async def save_upload(self, file: UploadFile, collection: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Validate an upload and stream it to a pending file of its own under
+        RAW_DATA_PATH; returns its path and SHA-256.
+
+        ``ingest_file`` moves it over the document's upload once ingested, so a
+        second upload of the same name never overwrites a file still queued.
+        """
+        file_extension = os.path.splitext(file.filename)[1].lower()
+        if file_extension not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+        directory = self._pending_directory(collection)
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        path = os.path.join(directory, f"{uuid.uuid4().hex}-{file.filename}")
+        file_hash = await self._run_blocking(self._save_upload, file, path)
+        return path, file_hash
+
+    async def ingest_file(
+        self,
+        path: str,
+        source: str,
+        file_hash: Optional[str] = None,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+        collection: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Parse, embed and store a saved file under the name ``source`` in
+        ``collection`` (the default collection when None).
+
+        A new version of a document is diffed against the manifest of the
+        previous one: only new chunks are embedded, chunks whose metadata
+        changed are rewritten with their stored embedding, chunks that only
+        moved (a shifted chunk, page or row position) get a metadata update,
+        and chunks that are gone are deleted. An identical file is skipped.
+
+        ``on_progress`` receives running counts of chunks parsed, embedded and
+        stored after every batch. A pending upload from ``save_upload`` becomes
+        the document's upload once ingested, and is removed if ingestion fails.
         """
         start_time = time.time()
-        logger.info(f"Ingesting document: {file.filename}")
+        logger.info("Ingesting document: %s", source)
+        pending = self._is_pending_upload(path, collection)
 
         try:
+            file_extension = os.path.splitext(source)[1].lower()
+            if file_extension not in SUPPORTED_EXTENSIONS:
+                raise ValueError(f"Unsupported file type: {file_extension}")
+
             # Create data directories if they don't exist
-            Path(settings.RAW_DATA_PATH).mkdir(parents=True, exist_ok=True)
             Path(settings.PROCESSED_DATA_PATH).mkdir(parents=True, exist_ok=True)
+            if file_hash is None:
+                file_hash = await self._run_blocking(hash_file, path)
+            vector_store = await self._run_blocking(self.vector_store_for, collection, True)
+            lexical_index = self.lexical_index_for(collection)
+            manifests = self.manifests_for(collection)
 
-            # Save file temporarily
-            temp_path = os.path.join(settings.RAW_DATA_PATH, file.filename)
-            with open(temp_path, "wb") as f:
-                shutil.copyfileobj(file.file, f)
-
-            # Process based on file type
-            file_extension = os.path.splitext(file.filename)[1].lower()
-            documents = []
-
-            if file_extension == '.csv':
-                df = pd.read_csv(temp_path)
-                for _, row in df.iterrows():
-                    documents.append(row.to_string())
-            elif file_extension == '.pdf':
-                with open(temp_path, "rb") as f:
-                    pdf = pypdf.PdfReader(f)
-                    for page in pdf.pages:
-                        text = page.extract_text()
-                        if text.strip():
-                            documents.append(text)
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
+            chunk_tokens, chunk_overlap_tokens = {
+                '.pdf': (settings.PDF_CHUNK_TOKENS, settings.PDF_CHUNK_OVERLAP_TOKENS),
+                '.csv': (settings.CSV_CHUNK_TOKENS, 0)
+            }[file_extension]
+            # The same file chunked with other settings is a new version
+            chunking = f"{chunk_tokens}:{chunk_overlap_tokens}:{settings.CSV_ROWS_PER_CHUNK}:{settings.CSV_GROUP_PERIOD}"
+
+            # Resolving the embeddings may load the model, so the tokenizer is looked up off the event loop
+            token_spans = approximate_token_spans
+            if chunk_tokens > 0:
+                token_spans = await self._run_blocking(lambda: embedding_token_spans(self.embeddings))
+
+            async with self._document_lock(collection, source):
+                manifest, previous = await self._run_blocking(self._previous_chunks, source, collection)
+                if manifest is not None and manifest.file_hash == file_hash and manifest.chunking == chunking:
+                    logger.info("Document %s is unchanged (version %d)", source, manifest.version)
+                    if pending:
+                        await self._run_blocking(self._keep_upload, path, source, collection)
+                    return {
+                        "message": "Document unchanged",
+                        "details": {
+                            "file_type": file_extension[1:],
+                            "version": manifest.version,
+                            "num_documents": len(manifest.chunks),
+                            "chunks_added": 0,
+                            "chunks_updated": 0,
+                            "chunks_moved": 0,
+                            "chunks_deleted": 0,
+                            "chunks_unchanged": len(manifest.chunks)
+                        }
+                    }
 
-            # Generate embeddings and store in vector database
-            embeddings = self.embeddings.embed_documents(documents)
-            for i, (doc, emb) in enumerate(zip(documents, embeddings)):
-                self.collection.add(
-                    embeddings=[emb],
-                    documents=[doc],
-                    ids=[f"doc_{i}"],
-                    metadatas=[{"source": file.filename}]
+                # Parse, embed and store one batch at a time
+                # CSVs are also persisted as typed tables for structured queries
+                table_writer = None
+                if file_extension == '.csv' and settings.STRUCTURED_QUERIES_ENABLED:
+                    table_writer = self.structured_store_for(collection).table_writer(source)
+
+                documents = iter_documents(
+                    path,
+                    file_extension,
+                    csv_rows_per_chunk=settings.CSV_ROWS_PER_CHUNK,
+                    csv_group_period=settings.CSV_GROUP_PERIOD or None,
+                    csv_on_frame=table_writer,
+                    chunk_tokens=chunk_tokens,
+                    chunk_overlap_tokens=chunk_overlap_tokens,
+                    # Count tokens with the embedding model's tokenizer so chunks are never truncated
+                    token_spans=token_spans,
+                    # PDF pages are extracted in parallel and merged back in page order
+                    pdf_executor=self.pdf_executor if file_extension == '.pdf' else None,
+                    pdf_max_pending=2 * settings.PDF_PARSE_WORKERS
                 )
+                batches = batched(documents, settings.INGEST_WRITE_BATCH_SIZE)
+                progress = {"parsed": 0, "embedded": 0, "stored": 0}
+                changes = {"added": 0, "updated": 0, "moved": 0}
+                cache_hits = embedded = 0
+                # The new manifest, and how often each chunk has occurred so far
+                chunks: Dict[str, str] = {}
+                occurrences: Dict[str, int] = {}
+
+                def advance(stage: str, count: int) -> None:
+                    progress[stage] += count
+                    if on_progress is not None:
+                        on_progress(dict(progress))
+
+                while batch := await self._run_blocking(next, batches, None):
+                    rows = self._chunk_rows(batch, source, progress["parsed"], occurrences)
+                    advance("parsed", len(batch))
+                    changed, moved = self._diff_rows(rows, previous)
+                    chunks.update((row.id, row.digest) for row in rows)
+                    embeddings, hits, texts = await self._run_blocking(self._embed_changed, changed, previous, collection)
+                    cache_hits += hits
+                    embedded += texts
+                    advance("embedded", len(batch))
+                    await self._run_blocking(self._write_batch, changed, embeddings, collection)
+                    await self._run_blocking(self._move_batch, moved, collection)
+                    for row in changed:
+                        changes["updated" if row.id in previous else "added"] += 1
+                    changes["moved"] += len(moved)
+                    advance("stored", len(batch))
+                num_documents = progress["stored"]
+
+                stale = [doc_id for doc_id in previous if doc_id not in chunks]
+                await self._run_blocking(vector_store.delete, stale)
+                await self._run_blocking(vector_store.commit)
+                if lexical_index is not None:
+                    await self._run_blocking(lexical_index.delete, stale)
+                    await self._run_blocking(lexical_index.commit)
+                # Saved last: after a crash the next ingestion diffs against the old version again
+                version = await self._run_blocking(manifests.save, source, file_hash, chunking, chunks)
+                if pending:
+                    await self._run_blocking(self._keep_upload, path, source, collection)
+
+            written = changes["added"] + changes["updated"]
+            if written or changes["moved"] or stale:
+                self.answer_cache.invalidate()
 
             elapsed_time = time.time() - start_time
-            logger.info(f"Successfully ingested {len(documents)} documents from {file.filename}")
-            DOCUMENT_PROCESSING_TIME.observe(elapsed_time)
+            docs_per_second = num_documents / elapsed_time if elapsed_time > 0 else 0.0
+            logger.info(
+                "Successfully ingested %d documents from %s (version %d, %d added, %d updated, %d moved, %d deleted, %.1f docs/s)",
+                num_documents, source, version, changes["added"], changes["updated"], changes["moved"], len(stale),
+                docs_per_second
+            )
+            DOCUMENTS_INGESTED_TOTAL.inc(written)
+            DOCUMENT_INGESTION_RATE.observe(docs_per_second)
 
             return {
-                "message": f"Successfully ingested {len(documents)} documents",
+                "message": f"Successfully ingested {num_documents} documents",
                 "details": {
                     "file_type": file_extension[1:],  # Remove the leading dot
-                    "num_documents": len(documents),
-                    "processing_time": f"{elapsed_time:.2f}s"
+                    "version": version,
+                    "num_documents": num_documents,
+                    "chunks_added": changes["added"],
+                    "chunks_updated": changes["updated"],
+                    "chunks_moved": changes["moved"],
+                    "chunks_deleted": len(stale),
+                    "chunks_unchanged": num_documents - written - changes["moved"],
+                    "processing_time": f"{elapsed_time:.2f}s",
+                    "docs_per_second": round(docs_per_second, 2),
+                    "embedding_cache_hit_ratio": round(cache_hits / embedded, 4) if embedded else 0.0
                 }
             }
 
         except Exception as e:
-            logger.error(f"Error ingesting document: {str(e)}")
+            logger.error("Error ingesting document: %s", e)
             ERRORS_TOTAL.inc()
+            if pending and os.path.isfile(path):
+                await self._run_blocking(os.remove, path)
             raise
         finally:
             DOCUMENT_PROCESSING_TIME.observe(time.time() - start_time)
+
+    async def delete_document(self, source: str, collection: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Remove a document's chunks, CSV table, manifest and upload; None if it was never ingested."""
+        vector_store = self.vector_store_for(collection)
+        lexical_index = self.lexical_index_for(collection)
+        async with self._document_lock(collection, source):
+            manifest, previous = await self._run_blocking(self._previous_chunks, source, collection)
+            if manifest is None and not previous:
+                return None
+            await self._run_blocking(vector_store.delete, list(previous))
+            await self._run_blocking(vector_store.commit)
+            if lexical_index is not None:
+                await self._run_blocking(lexical_index.delete, previous)
+                await self._run_blocking(lexical_index.commit)
+            await self._run_blocking(self.structured_store_for(collection).drop, source)
+            await self._run_blocking(self.manifests_for(collection).delete, source)
+            upload = os.path.join(self._upload_directory(collection), source)
+            if os.path.isfile(upload):
+                await self._run_blocking(os.remove, upload)
+        self.answer_cache.invalidate()
+        logger.info("Deleted document %s (%d chunks)", source, len(previous))
+        return {"source": source, "chunks_deleted": len(previous)}
+
+    def _document_lock(self, collection: Optional[str], source: str) -> asyncio.Lock:
+        # Versions of one document are ingested (or deleted) one at a time
+        key = (collection or DEFAULT_COLLECTION, source)
+        lock = self._document_locks.get(key)
+        if lock is None:
+            lock = self._document_locks[key] = asyncio.Lock()
+        return lock
+
+    def _previous_chunks(self, source: str, collection: Optional[str] = None) -> Tuple[Optional[Manifest], Dict[str, str]]:
+        """The manifest of the stored version of ``source`` and its chunk digests."""
+        manifest = self.manifests_for(collection).get(source)
+        if manifest is not None:
+            return manifest, manifest.chunks
+        # Documents ingested before manifests existed: find their chunks by source
+        stored = self.vector_store_for(collection).get(ids=None, include=[], where={"source": source})
+        return None, {doc_id: "" for doc_id in stored["ids"]}
+
+    @staticmethod
+    def _chunk_rows(batch: List[Document], source: str, offset: int, occurrences: Dict[str, int]) -> List[StoredChunk]:
+        """Chunk IDs, stored metadata and metadata digests of a batch that starts at chunk ``offset``."""
+        file_type = os.path.splitext(source)[1].lower().lstrip(".")
+        rows = []
+        for i, (text, metadata) in enumerate(batch):
+            # Counted by ID rather than text, so a large file's texts are not all kept in memory
+            doc_id = chunk_id(source, text)
+            occurrence = occurrences.get(doc_id, 0)
+            occurrences[doc_id] = occurrence + 1
+            if occurrence:
+                doc_id = chunk_id(source, text, occurrence)
+            metadata = {**metadata, "source": source, "file_type": file_type, "chunk": offset + i}
+            rows.append(StoredChunk(doc_id, text, metadata, metadata_digest(metadata)))
+        return rows
+
+    @staticmethod
+    def _upload_directory(collection: Optional[str] = None) -> str:
+        if collection in (None, DEFAULT_COLLECTION):
+            return settings.RAW_DATA_PATH
+        # Uploads of different collections may share file names
+        return _collection_path(settings.RAW_DATA_PATH, collection)
+
+    def _pending_directory(self, collection: Optional[str] = None) -> str:
+        return os.path.join(self._upload_directory(collection), PENDING_UPLOADS_DIRECTORY)
+
+    def _is_pending_upload(self, path: str, collection: Optional[str] = None) -> bool:
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self._pending_directory(collection))
+
+    def _keep_upload(self, path: str, source: str, collection: Optional[str] = None) -> None:
+        # Called under the document lock, so the upload always matches the stored version
+        os.replace(path, os.path.join(self._upload_directory(collection), source))
+
+    @staticmethod
+    def _save_upload(file: UploadFile, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "wb") as f:
+            for block in iter(lambda: file.file.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+                f.write(block)
+        return digest.hexdigest()
+
+    def _embed_batch(self, batch: List[Document]) -> Tuple[List[List[float]], int]:
+        """Embeddings for a batch and how many came from the embedding cache."""
+        texts = [text for text, _ in batch]
+        if self.embedding_cache is None:
+            embeddings = []
+            for chunk in batched(texts, settings.INGEST_EMBED_BATCH_SIZE):
+                embeddings.extend(self.embeddings.embed_documents(chunk))
+            return embeddings, 0
+
+        cached = self.embedding_cache.get_many(texts)
+        # Embed each distinct uncached text once
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        computed: Dict[str, List[float]] = {}
+        for chunk in batched(missing, settings.INGEST_EMBED_BATCH_SIZE):
+            vectors = self.embeddings.embed_documents(chunk)
+            self.embedding_cache.put_many(chunk, vectors)
+            computed.update(zip(chunk, vectors))
+        embeddings = [vector if vector is not None else computed[text] for text, vector in zip(texts, cached)]
+        return embeddings, sum(vector is not None for vector in cached)
+
+    def _embed_changed(
+        self,
+        rows: List[StoredChunk],
+        previous: Dict[str, str],
+        collection: Optional[str] = None
+    ) -> Tuple[List[List[float]], int, int]:
+        """Embeddings for changed chunks: chunks with only new metadata reuse their
+        stored vector, new chunks are embedded. Also returns the embedding cache
+        hits and the number of texts embedded."""
+        embeddings: Dict[str, List[float]] = {}
+        moved = [row.id for row in rows if row.id in previous]
+        if moved:
+            stored = self.vector_store_for(collection).get(ids=moved, include=["embeddings"])
+            embeddings.update(zip(stored["ids"], stored["embeddings"]))
+        new = [row for row in rows if row.id not in embeddings]
+        vectors, hits = self._embed_batch([(row.text, row.metadata) for row in new]) if new else ([], 0)
+        embeddings.update(zip((row.id for row in new), vectors))
+        return [embeddings[row.id] for row in rows], hits, len(new)
+
+    @staticmethod
+    def _diff_rows(rows: List[StoredChunk], previous: Dict[str, str]) -> Tuple[List[StoredChunk], List[StoredChunk]]:
+        """Rows to write (new, or with changed metadata) and rows that only moved within the document."""
+        changed, moved = [], []
+        for row in rows:
+            digest = previous.get(row.id)
+            if digest == row.digest:
+                continue
+            if digest and content_digest(digest) == content_digest(row.digest):
+                moved.append(row)
+            else:
+                changed.append(row)
+        return changed, moved
+
+    def _move_batch(self, rows: List[StoredChunk], collection: Optional[str] = None) -> None:
+        if rows:
+            self.vector_store_for(collection).update_metadata([row.id for row in rows], [row.metadata for row in rows])
+
+    def _write_batch(
+        self,
+        rows: List[StoredChunk],
+        embeddings: List[List[float]],
+        collection: Optional[str] = None
+    ) -> None:
+        if not rows:
+            return
+        ids = [row.id for row in rows]
+        texts = [row.text for row in rows]
+        self.vector_store_for(collection, create=True).upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=[row.metadata for row in rows]
+        )
+        lexical_index = self.lexical_index_for(collection)
+        if lexical_index is not None:
+            lexical_index.add(ids, texts)
@@ -0,0 +1,214 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.services.tokens import estimate_tokens
+
+# Metrics
+SESSIONS_ACTIVE = Gauge('rag_sessions_active', 'Conversation sessions held by the session store')
+SESSION_BYTES = Histogram(
+    'rag_session_bytes',
+    'Size of a session history (summary and turns) after each turn',
+    buckets=(256, 1024, 4096, 16384, 65536, 262144)
+)
+SESSION_TURNS_SUMMARIZED_TOTAL = Counter('rag_session_turns_summarized_total', 'Turns rolled into a session summary')
+SESSION_TURNS_DROPPED_TOTAL = Counter('rag_session_turns_dropped_total', 'Turns dropped to keep a session under its memory cap')
+SESSIONS_EVICTED_TOTAL = Counter('rag_sessions_evicted_total', 'Sessions removed from the store', ['reason'])
+
+# A turn is one question and the answer to it
+Turn = Tuple[str, str]
+
+
+@dataclass
+class Session:
+    session_id: str
+    summary: str = ""
+    turns: List[Turn] = field(default_factory=list)
+    updated_at: float = 0.0
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.summary.encode("utf-8")) + sum(
+            len(question.encode("utf-8")) + len(answer.encode("utf-8")) for question, answer in self.turns
+        )
+
+    def overflow(self, max_tokens: int, target_tokens: Optional[int] = None) -> List[Turn]:
+        """Oldest turns to roll into the summary once the turns exceed ``max_tokens``,
+        leaving at most ``target_tokens`` (default ``max_tokens``); the latest turn
+        is always kept. A target below the maximum summarizes every few turns
+        rather than on every turn."""
+        tokens = [estimate_tokens(question) + estimate_tokens(answer) for question, answer in self.turns]
+        total, count = sum(tokens), 0
+        if total <= max_tokens:
+            return []
+        target = max_tokens if target_tokens is None else target_tokens
+        while count < len(self.turns) - 1 and total > target:
+            total -= tokens[count]
+            count += 1
+        return self.turns[:count]
+
+    def _add_turn(self, question: str, answer: str, max_bytes: int) -> None:
+        self.turns.append((question, answer))
+        self.updated_at = time.time()
+        while len(self.turns) > 1 and self.size_bytes > max_bytes:
+            self.turns.pop(0)
+            SESSION_TURNS_DROPPED_TOTAL.inc()
+        SESSION_BYTES.observe(self.size_bytes)
+
+    def _compact(self, turns: List[Turn], summary: str) -> bool:
+        if self.turns[:len(turns)] != turns:
+            # Another compaction already rolled these turns up
+            return False
+        del self.turns[:len(turns)]
+        self.summary = summary
+        SESSION_TURNS_SUMMARIZED_TOTAL.inc(len(turns))
+        return True
+
+
+class SessionStore:
+    """In-process LRU of conversation sessions, each expiring ``ttl_seconds`` after its last turn.
+
+    ``max_bytes`` caps the text a session may hold; the oldest turns are
+    dropped past it, independently of the (token-based) summarization.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, ttl_seconds: float = 3600.0, max_bytes: int = 65536):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session.updated_at + self.ttl_seconds <= time.time():
+                self._evict(session_id, "expired")
+                return None
+            self._sessions.move_to_end(session_id)
+            return Session(session.session_id, session.summary, list(session.turns), session.updated_at)
+
+    def add_turn(self, session_id: str, question: str, answer: str) -> Session:
+        """Append a turn and return a copy of the updated session."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and session.updated_at + self.ttl_seconds <= time.time():
+                self._evict(session_id, "expired")
+                session = None
+            session = session or Session(session_id)
+            session._add_turn(question, answer, self.max_bytes)
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._evict(next(iter(self._sessions)), "capacity")
+            SESSIONS_ACTIVE.set(len(self._sessions))
+            return Session(session.session_id, session.summary, list(session.turns), session.updated_at)
+
+    def compact(self, session_id: str, turns: List[Turn], summary: str) -> bool:
+        """Replace the leading ``turns`` of a session with ``summary``."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session is not None and session._compact(turns, summary)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._evict(session_id, "deleted")
+            return True
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        del self._sessions[session_id]
+        SESSIONS_EVICTED_TOTAL.labels(reason=reason).inc()
+        SESSIONS_ACTIVE.set(len(self._sessions))
+
+
+class SqliteSessionStore(SessionStore):
+    """Session store in a local SQLite file, so sessions survive restarts and
+    are shared by the workers of one pod."""
+
+    def __init__(self, db_path: str, max_sessions: int = 10_000, ttl_seconds: float = 3600.0, max_bytes: int = 65536):
+        super().__init__(max_sessions, ttl_seconds, max_bytes)
+        self.db_path = db_path
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, summary TEXT NOT NULL, turns TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _load(self, conn: sqlite3.Connection, session_id: str) -> Optional[Session]:
+        row = conn.execute(
+            "SELECT summary, turns, updated_at FROM sessions WHERE id = ? AND updated_at > ?",
+            (session_id, time.time() - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        return Session(session_id, row[0], [tuple(turn) for turn in json.loads(row[1])], row[2])
+
+    def _store(self, conn: sqlite3.Connection, session: Session) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, summary, turns, updated_at) VALUES (?, ?, ?, ?)",
+            (session.session_id, session.summary, json.dumps(session.turns), session.updated_at)
+        )
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock, self._connect() as conn:
+            return self._load(conn, session_id)
+
+    def add_turn(self, session_id: str, question: str, answer: str) -> Session:
+        with self._lock, self._connect() as conn:
+            session = self._load(conn, session_id) or Session(session_id)
+            session._add_turn(question, answer, self.max_bytes)
+            self._store(conn, session)
+            expired = conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (time.time() - self.ttl_seconds,)).rowcount
+            over = conn.execute(
+                "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            ).rowcount
+            SESSIONS_EVICTED_TOTAL.labels(reason="expired").inc(max(expired, 0))
+            SESSIONS_EVICTED_TOTAL.labels(reason="capacity").inc(max(over, 0))
+            SESSIONS_ACTIVE.set(conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0])
+            return session
+
+    def compact(self, session_id: str, turns: List[Turn], summary: str) -> bool:
+        with self._lock, self._connect() as conn:
+            session = self._load(conn, session_id)
+            if session is None or not session._compact(turns, summary):
+                return False
+            self._store(conn, session)
+            return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock, self._connect() as conn:
+            deleted = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+            if deleted:
+                SESSIONS_EVICTED_TOTAL.labels(reason="deleted").inc()
+            return deleted
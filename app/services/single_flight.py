@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-flight stream: the tokens produced so far, fanned out to every subscriber."""
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, token: str) -> None:
+        self.tokens.append(token)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Replay the tokens produced so far, then yield new ones as they arrive."""
+        index = 0
+        while True:
+            while index < len(self.tokens):
+                yield self.tokens[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Share one in-flight token stream among concurrent callers with the same key.
+
+    The first caller for a key starts ``produce()`` in a task; callers that
+    arrive while it is running subscribe to the same stream, get the tokens
+    produced so far and then the rest as they arrive, and receive its error if
+    it fails. The key is forgotten once the stream ends, so later callers start
+    a new one. If every subscriber stops listening early (a client
+    disconnects), the producer is cancelled. ``on_shared`` is called for each
+    caller that joined an existing stream instead of starting one.
+    """
+
+    def __init__(self, on_shared: Optional[Callable[[], None]] = None):
+        self.on_shared = on_shared
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def stream(self, key: Hashable, produce: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, produce))
+            self._tasks.add(flight.task)
+            flight.task.add_done_callback(self._tasks.discard)
+        elif self.on_shared is not None:
+            self.on_shared()
+
+        flight.subscribers += 1
+        try:
+            async for token in flight.follow():
+                yield token
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    async def _run(self, key: Hashable, flight: _Flight, produce: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for token in produce():
+                flight.publish(token)
+            flight.finish()
+        except asyncio.CancelledError as e:
+            flight.finish(e)
+            raise
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            self._forget(key, flight)
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        # Callers arriving from now on start a new stream
+        if self._flights.get(key) is flight:
+            del self._flights[key]
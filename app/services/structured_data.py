@@ -0,0 +1,265 @@
+import calendar
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.services.ingestion import detect_date_column
+
+# Aggregation keywords mapped to SQL functions, longest phrases first
+AGGREGATIONS = [
+    ("how many", "COUNT"), ("number of", "COUNT"), ("count", "COUNT"),
+    ("average", "AVG"), ("mean", "AVG"), ("avg", "AVG"),
+    ("total", "SUM"), ("sum", "SUM"),
+    ("highest", "MAX"), ("maximum", "MAX"), ("max", "MAX"), ("peak", "MAX"),
+    ("lowest", "MIN"), ("minimum", "MIN"), ("min", "MIN"),
+]
+COLUMN_SYNONYMS = {"closing": "close", "opening": "open", "volumes": "volume"}
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_QUARTER = re.compile(r"\bq([1-4])\s*(?:of\s*)?(\d{4})\b")
+_MONTH_YEAR = re.compile(r"\b(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?\s+(\d{4})\b")
+_YEAR = re.compile(r"\b(19\d{2}|20\d{2})\b")
+_IDENTIFIER = re.compile(r"[^0-9a-zA-Z_]+")
+
+MAX_RESULT_ROWS = 20
+
+
+@dataclass
+class TableInfo:
+    name: str
+    source: str
+    columns: Dict[str, str]
+    date_column: Optional[str] = None
+
+
+@dataclass
+class StructuredQuery:
+    table: str
+    source: str
+    aggregation: Optional[str]
+    columns: List[str]
+    date_column: Optional[str] = None
+    date_range: Optional[Tuple[date, date]] = None
+
+
+@dataclass
+class StructuredResult:
+    source: str
+    sql: str
+    columns: List[str]
+    rows: List[Tuple[Any, ...]] = field(default_factory=list)
+
+    def to_context(self) -> str:
+        """Render the result as a compact CSV-style table for the prompt."""
+        lines = [f"Computed from {self.source} with: {self.sql}", ", ".join(self.columns)]
+        lines.extend(", ".join(_format_value(value) for value in row) for row in self.rows)
+        return "\n".join(lines)
+
+
+def table_name_for(source: str) -> str:
+    return "t_" + _IDENTIFIER.sub("_", Path(source).stem).strip("_").lower()
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _where(conditions: List[str]) -> str:
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def _parse_date_range(query: str) -> Optional[Tuple[date, date]]:
+    """Extract an inclusive date range from ISO dates, quarters, months or years in the query."""
+    dates = [date(int(y), int(m), int(d)) for y, m, d in _ISO_DATE.findall(query)]
+    if dates:
+        return min(dates), max(dates)
+
+    if match := _QUARTER.search(query):
+        quarter, year = int(match.group(1)), int(match.group(2))
+        start = date(year, 3 * quarter - 2, 1)
+        end_month = 3 * quarter
+        return start, date(year, end_month, calendar.monthrange(year, end_month)[1])
+
+    if match := _MONTH_YEAR.search(query):
+        month, year = MONTHS[match.group(1)], int(match.group(2))
+        return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+    years = [int(y) for y in _YEAR.findall(query)]
+    if years:
+        return date(min(years), 1, 1), date(max(years), 12, 31)
+    return None
+
+
+def _match_columns(query: str, columns: List[str]) -> List[str]:
+    """Columns mentioned in the query, preferring longer names ("adj close" over "close")."""
+    words = " ".join(COLUMN_SYNONYMS.get(word, word) for word in re.findall(r"[a-z0-9_]+", query))
+    matched: List[str] = []
+    for column in sorted(columns, key=len, reverse=True):
+        name = " ".join(re.findall(r"[a-z0-9]+", column.lower()))
+        if name and re.search(rf"\b{re.escape(name)}\b", words):
+            words = re.sub(rf"\b{re.escape(name)}\b", " ", words)
+            matched.append(column)
+    return matched
+
+
+class StructuredStore:
+    """Typed tables for ingested CSVs plus a small aggregate/filter executor.
+
+    Each CSV is stored as one SQLite table. ``plan`` turns analytical questions
+    ("average closing price in Q3 2023") into a parameterised query over those
+    tables, and ``execute`` returns a compact result table for the prompt.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._tables: Dict[str, TableInfo] = {}
+        self._loaded_mtime: Optional[float] = None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS _catalog "
+                "(table_name TEXT PRIMARY KEY, source TEXT NOT NULL, date_column TEXT)"
+            )
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def table_writer(self, source: str) -> Callable[[pd.DataFrame], None]:
+        """Return a callback that (re)creates the table for ``source`` and appends frames to it."""
+        table = table_name_for(source)
+        state = {"first": True, "date_column": None}
+
+        def append(frame: pd.DataFrame) -> None:
+            frame = frame.copy()
+            if state["first"]:
+                state["date_column"] = detect_date_column(frame.columns)
+            date_column = state["date_column"]
+            if date_column is not None:
+                frame[date_column] = pd.to_datetime(frame[date_column], errors="coerce").dt.strftime("%Y-%m-%d %H:%M:%S")
+
+            with self._lock, self._connect() as conn:
+                if state["first"]:
+                    conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+                    conn.execute(
+                        "INSERT OR REPLACE INTO _catalog (table_name, source, date_column) VALUES (?, ?, ?)",
+                        (table, source, date_column)
+                    )
+                frame.to_sql(table, conn, if_exists="append", index=False)
+                if state["first"] and date_column is not None:
+                    conn.execute(f"CREATE INDEX {_quote(table + '_date')} ON {_quote(table)} ({_quote(date_column)})")
+            state["first"] = False
+
+        return append
+
+    def drop(self, source: str) -> bool:
+        """Remove the table of ``source``; returns whether there was one."""
+        table = table_name_for(source)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            return conn.execute("DELETE FROM _catalog WHERE table_name = ?", (table,)).rowcount > 0
+
+    def tables(self) -> Dict[str, TableInfo]:
+        """Table catalog, reloaded whenever the database file changes."""
+        try:
+            mtime = os.path.getmtime(self.db_path)
+        except OSError:
+            return {}
+        with self._lock:
+            if mtime != self._loaded_mtime:
+                with self._connect() as conn:
+                    tables = {}
+                    for name, source, date_column in conn.execute("SELECT table_name, source, date_column FROM _catalog"):
+                        columns = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({_quote(name)})")}
+                        if columns:
+                            tables[name] = TableInfo(name, source, columns, date_column)
+                self._tables, self._loaded_mtime = tables, mtime
+            return dict(self._tables)
+
+    def plan(self, query: str) -> Optional[StructuredQuery]:
+        """Build a structured query for analytical questions, or None to fall back to vector search."""
+        tables = self.tables()
+        if not tables:
+            return None
+
+        text = query.lower()
+        aggregation = next((fn for phrase, fn in AGGREGATIONS if re.search(rf"\b{phrase}\b", text)), None)
+        date_range = _parse_date_range(text)
+
+        # Pick the table whose columns the query mentions most
+        best: Optional[Tuple[TableInfo, List[str]]] = None
+        for info in tables.values():
+            value_columns = [c for c in info.columns if c != info.date_column]
+            columns = _match_columns(text, value_columns)
+            if best is None or len(columns) > len(best[1]):
+                best = (info, columns)
+        info, columns = best
+
+        if aggregation is None:
+            # Plain lookups need a column and a date filter to stay selective
+            if not columns or date_range is None or info.date_column is None:
+                return None
+        elif not columns and (aggregation != "COUNT" or date_range is None):
+            # Row counts are only meaningful over an explicit period
+            return None
+
+        return StructuredQuery(
+            table=info.name,
+            source=info.source,
+            aggregation=aggregation,
+            columns=columns,
+            date_column=info.date_column,
+            date_range=date_range if info.date_column is not None else None
+        )
+
+    def execute(self, plan: StructuredQuery) -> StructuredResult:
+        table = _quote(plan.table)
+        conditions, params = [], []
+        if plan.date_range is not None:
+            start, end = plan.date_range
+            conditions.append(f"{_quote(plan.date_column)} >= ? AND {_quote(plan.date_column)} < ?")
+            params = [start.isoformat(), (end + timedelta(days=1)).isoformat()]
+
+        if plan.aggregation in ("MAX", "MIN") and plan.date_column is not None:
+            # Return the row holding the extreme value, not just the value
+            column = _quote(plan.columns[0])
+            conditions.append(f"{column} IS NOT NULL")
+            order = "DESC" if plan.aggregation == "MAX" else "ASC"
+            sql = f"SELECT {_quote(plan.date_column)}, {column} FROM {table}{_where(conditions)} ORDER BY {column} {order} LIMIT 1"
+        elif plan.aggregation is not None:
+            selects = [f"{plan.aggregation}({_quote(c)}) AS {_quote(plan.aggregation.lower() + '_' + c)}" for c in plan.columns]
+            sql = f"SELECT {', '.join(selects + ['COUNT(*) AS rows'])} FROM {table}{_where(conditions)}"
+        else:
+            selects = [_quote(plan.date_column)] + [_quote(c) for c in plan.columns]
+            sql = f"SELECT {', '.join(selects)} FROM {table}{_where(conditions)} ORDER BY {_quote(plan.date_column)} LIMIT {MAX_RESULT_ROWS}"
+
+        with self._connect() as conn:
+            cursor = conn.execute(sql, params)
+            rows = cursor.fetchmany(MAX_RESULT_ROWS)
+            columns = [description[0] for description in cursor.description]
+
+        rendered_sql = sql
+        for param in params:
+            rendered_sql = rendered_sql.replace("?", f"'{param}'", 1)
+        return StructuredResult(source=plan.source, sql=rendered_sql, columns=columns, rows=rows)
@@ -0,0 +1,38 @@
+import re
+from typing import Any, Callable, List, Tuple
+
+# Character offsets of each token in a text
+TokenSpans = Callable[[str], List[Tuple[int, int]]]
+
+# Word pieces of up to five characters, or single punctuation marks: close to
+# sub-word tokenizers on English prose, and conservative on numbers
+_APPROXIMATE_TOKEN = re.compile(r"\w{1,5}|[^\w\s]")
+
+
+def approximate_token_spans(text: str) -> List[Tuple[int, int]]:
+    return [match.span() for match in _APPROXIMATE_TOKEN.finditer(text)]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, good enough for metrics and budgeting without a tokenizer."""
+    return sum(1 for _ in _APPROXIMATE_TOKEN.finditer(text)) if text else 0
+
+
+def tokenizer_token_spans(tokenizer: Any) -> TokenSpans:
+    """Token spans from a Hugging Face fast tokenizer's offset mapping."""
+    def spans(text: str) -> List[Tuple[int, int]]:
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return [(start, end) for start, end in encoding["offset_mapping"] if end > start]
+    return spans
+
+
+def embedding_token_spans(embeddings: Any) -> TokenSpans:
+    """Token spans from the embedding model's own tokenizer, or the approximation."""
+    try:
+        from transformers import PreTrainedTokenizerFast
+    except ImportError:
+        return approximate_token_spans
+    tokenizer = getattr(getattr(embeddings, "_client", None), "tokenizer", None)
+    if isinstance(tokenizer, PreTrainedTokenizerFast):
+        return tokenizer_token_spans(tokenizer)
+    return approximate_token_spans
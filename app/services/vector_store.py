@@ -0,0 +1,610 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import warnings
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_COLLECTION = "documents"
+DEFAULT_INCLUDE = ("documents", "metadatas", "distances")
+# Comparison operators of Chroma ``where`` filters and their SQL equivalents
+WHERE_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+# Rows scored per matrix multiply, bounding the float32 copy of the float16 matrix
+BLOCK_ROWS = 65536
+# SQLite host parameters per statement
+SQL_BATCH = 500
+# Dead rows (replaced or deleted chunks) tolerated before the matrix is rewritten
+COMPACT_MIN_DEAD_ROWS = 1024
+IVF_MIN_POINTS_PER_LIST = 39
+IVF_SAMPLE_PER_LIST = 256
+IVF_TRAIN_ITERATIONS = 10
+# Candidates kept per result from reduced-precision scoring, then rescored in float32
+RESCORE_FACTOR = 2
+
+
+class CollectionNotFound(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"Collection {name} not found")
+        self.name = name
+
+
+class VectorStore(ABC):
+    """Chunk embeddings with their text and metadata, searched by cosine distance.
+
+    Results follow Chroma's layout: ``query`` returns ``ids`` and each
+    included field as one list per query embedding, ``get`` returns flat
+    lists, and fields not in ``include`` are None. ``where`` filters on chunk
+    metadata use Chroma's syntax, e.g.
+    ``{"$and": [{"file_type": "csv"}, {"day_end": {"$gte": 20200101}}]}``.
+    """
+
+    def load(self) -> None:
+        """Open the store now rather than on first use."""
+
+    def commit(self) -> None:
+        """Called after a run of upserts and deletes, e.g. to rebuild derived indexes."""
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int,
+        include: Sequence[str] = DEFAULT_INCLUDE,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Nearest chunks to each query embedding, closest first."""
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[Sequence[str]],
+        include: Sequence[str] = ("documents", "metadatas"),
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Stored chunks by ID, or every chunk matching ``where`` when ``ids``
+        is None; unknown (or filtered out) IDs are left out."""
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]]
+    ) -> None:
+        """Add chunks, replacing any stored under the same IDs."""
+
+    @abstractmethod
+    def update_metadata(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Replace the metadata of stored chunks, keeping their embeddings and text."""
+
+    @abstractmethod
+    def delete(self, ids: Sequence[str]) -> None:
+        """Remove chunks by ID."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored chunks."""
+
+
+class ChromaVectorStore(VectorStore):
+    """A Chroma collection (created with ``hnsw:space`` cosine)."""
+
+    def __init__(self, collection: Any):
+        self.collection = collection
+
+    def query(self, query_embeddings, n_results, include=DEFAULT_INCLUDE, where=None):
+        filters = {"where": where} if where else {}
+        return self.collection.query(
+            query_embeddings=query_embeddings, n_results=n_results, include=list(include), **filters
+        )
+
+    def get(self, ids, include=("documents", "metadatas"), where=None):
+        filters = {"where": where} if where else {}
+        return self.collection.get(ids=list(ids) if ids is not None else None, include=list(include), **filters)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        if ids:
+            self.collection.update(ids=list(ids), metadatas=list(metadatas))
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def count(self):
+        return self.collection.count()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _batches(items: Sequence[Any], size: int = SQL_BATCH) -> Iterator[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def where_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Translate a Chroma ``where`` filter into an SQL condition on a JSON ``metadata`` column."""
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_sql(condition) for condition in value]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+        path = f'$."{key}"'
+        for operator, operand in (value.items() if isinstance(value, dict) else [("$eq", value)]):
+            if operator in ("$in", "$nin"):
+                negate = "NOT " if operator == "$nin" else ""
+                clauses.append(f"json_extract(metadata, ?) {negate}IN ({','.join('?' * len(operand))})")
+                params.extend([path, *operand])
+            elif operator in WHERE_COMPARISONS:
+                clauses.append(f"json_extract(metadata, ?) {WHERE_COMPARISONS[operator]} ?")
+                params.extend([path, operand])
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+    return " AND ".join(clauses) or "1", params
+
+
+@functools.lru_cache(maxsize=None)
+def _torch() -> Any:
+    """torch when installed (sentence-transformers brings it), imported on first search."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+
+def _similarities(vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """``queries @ vectors.T`` as float32.
+
+    NumPy has no float16 kernels: it would first copy the block to float32,
+    which takes several times longer than the product. torch multiplies
+    float16 directly, at float16 precision, so callers rescore the best
+    candidates with ``_rescore``.
+    """
+    torch = _torch() if vectors.dtype == np.float16 else None
+    if torch is None:
+        return queries @ np.asarray(vectors, dtype=np.float32).T
+    with warnings.catch_warnings():
+        # The memory map is read-only and never written through the tensor
+        warnings.simplefilter("ignore")
+        block = torch.from_numpy(vectors)
+    return (torch.from_numpy(queries.astype(np.float16)) @ block.T).float().numpy()
+
+
+def _rescore(matrix: np.ndarray, queries: np.ndarray, scores: np.ndarray, rows: np.ndarray, k: int):
+    """Exact float32 scores of each query's candidate ``rows``, keeping the best ``k``."""
+    vectors = np.asarray(matrix[rows.ravel()], dtype=np.float32).reshape(*rows.shape, -1)
+    exact = np.einsum("qd,qcd->qc", queries, vectors)
+    exact[~np.isfinite(scores)] = -np.inf
+    return _top_k(exact, rows, k)
+
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The ``k`` best ``scores`` (and their ``rows``) of each query, best first."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        rows = np.take_along_axis(rows, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+
+@dataclass
+class _InvertedLists:
+    """IVF partition of the first ``assigned`` rows: each row belongs to its nearest centroid."""
+    centroids: np.ndarray
+    assignments: np.ndarray
+    trained_on: int
+
+    def __post_init__(self) -> None:
+        self.order = np.argsort(self.assignments, kind="stable").astype(np.int64)
+        self.offsets = np.searchsorted(self.assignments[self.order], np.arange(len(self.centroids) + 1))
+
+    @property
+    def assigned(self) -> int:
+        return len(self.assignments)
+
+    def rows(self, lists: Iterable[int]) -> np.ndarray:
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+
+
+class NumpyVectorStore(VectorStore):
+    """In-process vector index for mostly read-only corpora.
+
+    Embeddings are L2-normalized and appended to ``vectors_<generation>.bin``,
+    a ``float16`` (or ``float32``) matrix read through a memory map; chunk
+    IDs, texts and metadata live in ``chunks.db`` (SQLite) keyed by matrix
+    row. A row only counts once it is in SQLite, so an interrupted append is
+    ignored. Replaced and deleted chunks leave dead rows until ``commit``
+    rewrites the matrix as the next generation.
+
+    Search is exact by default: cosine similarity against every row, in
+    blocks. With ``ivf_lists`` > 0 (and enough rows) ``commit`` clusters the
+    rows with spherical k-means and queries only scan the ``ivf_probes``
+    nearest clusters, plus rows added since the last commit.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float16", ivf_lists: int = 0, ivf_probes: int = 8):
+        self.directory = Path(directory)
+        self.dtype = np.dtype(dtype)
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._dimensions: Optional[int] = None
+        self._generation = 0
+        self._rows = 0
+        self._live = np.zeros(0, dtype=bool)
+        self._vectors: Optional[np.memmap] = None
+        self._ivf: Optional[_InvertedLists] = None
+
+    def _vectors_file(self, generation: int) -> Path:
+        return self.directory / f"vectors_{generation}.bin"
+
+    def _ivf_file(self, generation: int) -> Path:
+        return self.directory / f"ivf_{generation}.npz"
+
+    @property
+    def _row_bytes(self) -> int:
+        return self._dimensions * self.dtype.itemsize
+
+    def load(self) -> None:
+        with self._lock:
+            self._load()
+
+    def _load(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+        self.directory.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.directory / "chunks.db"), check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks "
+            "(id TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE, document TEXT, metadata TEXT)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        if meta.get("dtype", self.dtype.name) != self.dtype.name:
+            raise ValueError(f"Vector store in {self.directory} stores {meta['dtype']}, not {self.dtype.name}")
+        self._dimensions = int(meta["dimensions"]) if "dimensions" in meta else None
+        self._generation = int(meta.get("generation", 0))
+
+        # Files of other generations were left by an interrupted compaction
+        keep = {self._vectors_file(self._generation), self._ivf_file(self._generation)}
+        for path in [*self.directory.glob("vectors_*.bin"), *self.directory.glob("ivf_*.npz")]:
+            if path not in keep:
+                path.unlink()
+
+        if self._dimensions is not None and self._vectors_file(self._generation).exists():
+            size = self._vectors_file(self._generation).stat().st_size
+            self._rows = size // self._row_bytes
+            if size != self._rows * self._row_bytes:
+                # Drop the tail of an interrupted append
+                with open(self._vectors_file(self._generation), "r+b") as f:
+                    f.truncate(self._rows * self._row_bytes)
+        self._live = np.zeros(self._rows, dtype=bool)
+        live_rows = np.fromiter((row for row, in conn.execute("SELECT row FROM chunks")), dtype=np.int64)
+        self._live[live_rows[live_rows < self._rows]] = True
+
+        ivf_path = self._ivf_file(self._generation)
+        if self.ivf_lists > 0 and ivf_path.exists():
+            with np.load(ivf_path) as data:
+                if len(data["centroids"]) == self.ivf_lists and len(data["assignments"]) <= self._rows:
+                    self._ivf = _InvertedLists(data["centroids"], data["assignments"], int(data["trained_on"]))
+        self._conn = conn
+        return conn
+
+    def _matrix(self) -> Optional[np.memmap]:
+        if not self._rows:
+            return None
+        if self._vectors is None or len(self._vectors) != self._rows:
+            self._vectors = np.memmap(
+                self._vectors_file(self._generation), dtype=self.dtype, mode="r", shape=(self._rows, self._dimensions)
+            )
+        return self._vectors
+
+    def _rows_for_ids(
+        self,
+        conn: sqlite3.Connection,
+        ids: Optional[Sequence[str]],
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, int]:
+        condition, params = where_sql(where) if where else ("1", [])
+        if ids is None:
+            return dict(conn.execute(f"SELECT id, row FROM chunks WHERE {condition} ORDER BY row", params))
+        found: Dict[str, int] = {}
+        for batch in _batches(list(ids)):
+            placeholders = ",".join("?" * len(batch))
+            found.update(conn.execute(
+                f"SELECT id, row FROM chunks WHERE id IN ({placeholders}) AND {condition}", [*batch, *params]
+            ))
+        return found
+
+    def count(self) -> int:
+        with self._lock:
+            self._load()
+            return int(self._live.sum())
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not len(ids):
+            return
+        # Later copies of an ID within the batch win
+        positions = sorted({doc_id: position for position, doc_id in enumerate(ids)}.values())
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32)[positions]).astype(self.dtype)
+        with self._lock:
+            conn = self._load()
+            if self._dimensions is None:
+                self._dimensions = vectors.shape[1]
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                        ("dimensions", str(self._dimensions)),
+                        ("dtype", self.dtype.name),
+                        ("generation", str(self._generation))
+                    ])
+            elif vectors.shape[1] != self._dimensions:
+                raise ValueError(f"Expected {self._dimensions}-dimensional embeddings, got {vectors.shape[1]}")
+
+            # Vectors first, SQLite second: a row is only ever referenced once its vector is complete
+            start = self._rows
+            with open(self._vectors_file(self._generation), "ab") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            replaced = self._rows_for_ids(conn, [ids[position] for position in positions])
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (ids[position], start + offset, documents[position], json.dumps(metadatas[position] or {}))
+                        for offset, position in enumerate(positions)
+                    ]
+                )
+            live = np.zeros(start + len(positions), dtype=bool)
+            live[:start] = self._live
+            live[start:] = True
+            live[list(replaced.values())] = False
+            self._live, self._rows = live, len(live)
+
+    def update_metadata(self, ids, metadatas):
+        if not len(ids):
+            return
+        with self._lock:
+            conn = self._load()
+            with conn:
+                conn.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE id = ?",
+                    [(json.dumps(metadata or {}), doc_id) for doc_id, metadata in zip(ids, metadatas)]
+                )
+
+    def delete(self, ids):
+        if not len(ids):
+            return
+        with self._lock:
+            conn = self._load()
+            rows = self._rows_for_ids(conn, ids)
+            with conn:
+                conn.executemany("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in rows])
+            live = self._live.copy()
+            live[list(rows.values())] = False
+            self._live = live
+
+    def commit(self) -> None:
+        with self._lock:
+            self._load()
+            dead = self._rows - int(self._live.sum())
+            if dead >= COMPACT_MIN_DEAD_ROWS and dead > self._rows // 2:
+                self._compact()
+            self._update_ivf()
+
+    def _compact(self) -> None:
+        """Rewrite the live rows as the next generation of the matrix."""
+        matrix = self._matrix()
+        live_rows = np.flatnonzero(self._live)
+        generation = self._generation + 1
+        with open(self._vectors_file(generation), "wb") as f:
+            for batch in _batches(live_rows, BLOCK_ROWS):
+                f.write(np.ascontiguousarray(matrix[batch]).tobytes())
+        with self._conn:
+            # Move rows out of the way first so the UNIQUE constraint never sees two chunks on one row
+            self._conn.execute("UPDATE chunks SET row = -1 - row")
+            self._conn.executemany(
+                "UPDATE chunks SET row = ? WHERE row = ?",
+                [(new, -1 - int(old)) for new, old in enumerate(live_rows)]
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (str(generation),))
+
+        old_files = [self._vectors_file(self._generation), self._ivf_file(self._generation)]
+        self._generation, self._rows, self._vectors, self._ivf = generation, len(live_rows), None, None
+        self._live = np.ones(self._rows, dtype=bool)
+        for path in old_files:
+            if path.exists():
+                path.unlink()
+
+    def _assign(self, matrix: np.ndarray, centroids: np.ndarray, start: int, stop: int) -> np.ndarray:
+        assignments = np.empty(stop - start, dtype=np.int32)
+        for offset in range(start, stop, BLOCK_ROWS // 4):
+            block = np.asarray(matrix[offset:min(offset + BLOCK_ROWS // 4, stop)], dtype=np.float32)
+            assignments[offset - start:offset - start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def _train(self, matrix: np.ndarray) -> np.ndarray:
+        """Spherical k-means over a sample of the live rows."""
+        rng = np.random.default_rng(0)
+        live_rows = np.flatnonzero(self._live)
+        sample = np.sort(rng.choice(live_rows, size=min(len(live_rows), self.ivf_lists * IVF_SAMPLE_PER_LIST), replace=False))
+        data = np.asarray(matrix[sample], dtype=np.float32)
+        centroids = data[rng.choice(len(data), size=self.ivf_lists, replace=False)]
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            assignments = self._assign(data, centroids, 0, len(data))
+            order = np.argsort(assignments, kind="stable")
+            sizes = np.bincount(assignments, minlength=self.ivf_lists)
+            filled = np.flatnonzero(sizes)
+            sums = np.add.reduceat(data[order], np.concatenate(([0], np.cumsum(sizes[filled])[:-1])), axis=0)
+            centroids[filled] = _normalize(sums)
+            # Restart empty clusters from random sample points
+            empty = np.flatnonzero(sizes == 0)
+            centroids[empty] = data[rng.choice(len(data), size=len(empty), replace=False)]
+        return centroids
+
+    def _update_ivf(self) -> None:
+        """Retrain once the matrix has doubled since training; otherwise assign new rows."""
+        live = int(self._live.sum())
+        if self.ivf_lists <= 0 or live < self.ivf_lists * IVF_MIN_POINTS_PER_LIST:
+            self._ivf = None
+            return
+        matrix = self._matrix()
+        if self._ivf is None or self._rows >= 2 * self._ivf.trained_on:
+            centroids = self._train(matrix)
+            ivf = _InvertedLists(centroids, self._assign(matrix, centroids, 0, self._rows), self._rows)
+        elif self._ivf.assigned < self._rows:
+            new = self._assign(matrix, self._ivf.centroids, self._ivf.assigned, self._rows)
+            ivf = _InvertedLists(self._ivf.centroids, np.concatenate([self._ivf.assignments, new]), self._ivf.trained_on)
+        else:
+            return
+        tmp_path = self.directory / "ivf.tmp.npz"
+        np.savez(tmp_path, centroids=ivf.centroids, assignments=ivf.assignments, trained_on=ivf.trained_on)
+        os.replace(tmp_path, self._ivf_file(self._generation))
+        self._ivf = ivf
+
+    def _search_exact(self, matrix: np.ndarray, live: np.ndarray, queries: np.ndarray, k: int):
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(live), BLOCK_ROWS):
+            block = matrix[start:start + BLOCK_ROWS]
+            scores = _similarities(block, queries)
+            scores[:, ~live[start:start + len(block)]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            best_scores, best_rows = _top_k(
+                np.concatenate([best_scores, scores], axis=1),
+                np.concatenate([best_rows, rows], axis=1),
+                RESCORE_FACTOR * k
+            )
+        return _rescore(matrix, queries, best_scores, best_rows, k)
+
+    def _search_ivf(self, matrix: np.ndarray, live: np.ndarray, ivf: _InvertedLists, queries: np.ndarray, k: int):
+        probes = min(self.ivf_probes, len(ivf.centroids))
+        nearest = np.argpartition(-(queries @ ivf.centroids.T), probes - 1, axis=1)[:, :probes]
+        # Rows added since the last commit are not in any list yet; scan them all
+        tail = np.arange(ivf.assigned, len(live))
+        candidates = RESCORE_FACTOR * k
+        best_scores = np.full((len(queries), candidates), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), candidates), dtype=np.int64)
+        for index, (query, lists) in enumerate(zip(queries, nearest)):
+            rows = np.sort(np.concatenate([ivf.rows(lists), tail]))
+            rows = rows[live[rows]]
+            if not len(rows):
+                continue
+            scores = _similarities(matrix[rows], query[None, :])
+            top_scores, top_rows = _top_k(scores, rows[None, :], candidates)
+            best_scores[index, :top_scores.shape[1]] = top_scores[0]
+            best_rows[index, :top_rows.shape[1]] = top_rows[0]
+        return _rescore(matrix, queries, best_scores, best_rows, k)
+
+    def _search_rows(self, matrix: np.ndarray, rows: np.ndarray, queries: np.ndarray, k: int):
+        """Exact search over ``rows`` only, e.g. those matching a metadata filter."""
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for batch in _batches(rows, BLOCK_ROWS):
+            scores = _similarities(matrix[batch], queries)
+            best_scores, best_rows = _top_k(
+                np.concatenate([best_scores, scores], axis=1),
+                np.concatenate([best_rows, np.broadcast_to(batch, scores.shape)], axis=1),
+                RESCORE_FACTOR * k
+            )
+        return _rescore(matrix, queries, best_scores, best_rows, k)
+
+    def _fetch_rows(self, conn: sqlite3.Connection, rows: Iterable[int]) -> Dict[int, Tuple[str, str, str]]:
+        found: Dict[int, Tuple[str, str, str]] = {}
+        unique = sorted(set(rows))
+        for batch in _batches(unique):
+            placeholders = ",".join("?" * len(batch))
+            for row, doc_id, document, metadata in conn.execute(
+                f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({placeholders})", batch
+            ):
+                found[row] = (doc_id, document, metadata)
+        return found
+
+    def query(self, query_embeddings, n_results, include=DEFAULT_INCLUDE, where=None):
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        results: Dict[str, Any] = {"ids": [[] for _ in queries]}
+        for field in ("documents", "metadatas", "distances", "embeddings"):
+            results[field] = [[] for _ in queries] if field in include else None
+
+        while True:
+            with self._lock:
+                conn = self._load()
+                matrix, live, ivf, generation = self._matrix(), self._live, self._ivf, self._generation
+                if where and matrix is not None:
+                    # Filtered searches only score the matching rows
+                    condition, params = where_sql(where)
+                    matching = np.fromiter(
+                        (row for row, in conn.execute(f"SELECT row FROM chunks WHERE {condition}", params)),
+                        dtype=np.int64
+                    )
+                    matching = np.sort(matching[matching < len(live)])
+            if matrix is None or n_results <= 0 or (where and not len(matching)):
+                return results
+            # Score outside the lock: matrix products release the GIL, so searches overlap
+            if where:
+                scores, rows = self._search_rows(matrix, matching, queries, min(n_results, len(matching)))
+            elif ivf is not None:
+                scores, rows = self._search_ivf(matrix, live, ivf, queries, min(n_results, len(live)))
+            else:
+                scores, rows = self._search_exact(matrix, live, queries, min(n_results, len(live)))
+            with self._lock:
+                if self._generation != generation:
+                    # Rows were renumbered by a compaction meanwhile
+                    continue
+                stored = self._fetch_rows(self._conn, rows[np.isfinite(scores)].tolist())
+                break
+
+        for index, (query_scores, query_rows) in enumerate(zip(scores, rows)):
+            for score, row in zip(query_scores.tolist(), query_rows.tolist()):
+                if row not in stored or not np.isfinite(score):
+                    continue
+                doc_id, document, metadata = stored[row]
+                results["ids"][index].append(doc_id)
+                if results["documents"] is not None:
+                    results["documents"][index].append(document)
+                if results["metadatas"] is not None:
+                    results["metadatas"][index].append(json.loads(metadata))
+                if results["distances"] is not None:
+                    results["distances"][index].append(1.0 - score)
+                if results["embeddings"] is not None:
+                    results["embeddings"][index].append(np.asarray(matrix[row], dtype=np.float32).tolist())
+        return results
+
+    def get(self, ids, include=("documents", "metadatas"), where=None):
+        results: Dict[str, Any] = {"ids": []}
+        for field in ("documents", "metadatas", "embeddings"):
+            results[field] = [] if field in include else None
+        with self._lock:
+            conn = self._load()
+            rows = self._rows_for_ids(conn, ids, where)
+            # Listing IDs alone (e.g. every chunk of a source) never reads the text
+            stored = self._fetch_rows(conn, rows.values()) if {"documents", "metadatas"} & set(include) else {}
+            matrix = self._matrix()
+        for doc_id in ids if ids is not None else list(rows):
+            if doc_id not in rows:
+                continue
+            row = rows[doc_id]
+            results["ids"].append(doc_id)
+            if results["documents"] is not None:
+                results["documents"].append(stored[row][1])
+            if results["metadatas"] is not None:
+                results["metadatas"].append(json.loads(stored[row][2]))
+            if results["embeddings"] is not None:
+                results["embeddings"].append(np.asarray(matrix[row], dtype=np.float32).tolist())
+        return results
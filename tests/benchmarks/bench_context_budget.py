@@ -0,0 +1,109 @@
+"""
+Benchmark context assembly: prompt size and latency with and without dedupe + token budget.
+
+examples/NVIDIAAn.pdf is chunked and indexed twice (the same press release
+uploaded under two names, a common source of duplicate context). For each
+question the top-k chunks are retrieved; the baseline joins them all into the
+prompt, the assembled context drops near-duplicates and packs the rest into
+the token budget. A hit means the expected fact is still in the context.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_context_budget --embedder lexical   # offline
+    python -m tests.benchmarks.bench_context_budget --rerank cross-encoder/ms-marco-MiniLM-L-6-v2
+    python -m tests.benchmarks.bench_context_budget --llm                # also time Groq (needs GROQ_API_KEY)
+"""
+import argparse
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.context_budget import CrossEncoderReranker, assemble_context
+from app.services.ingestion import iter_pdf_documents
+from app.services.rag_pipeline import RAG_PROMPT
+from app.services.tokens import estimate_tokens
+from tests.benchmarks.bench_pdf_chunking import EXAMPLE_PDF, QUESTIONS, lexical_embedder, model_embedder
+
+
+def render_prompt(question: str, documents: List[str]):
+    return RAG_PROMPT.invoke({"context": "\n".join(documents), "messages": [], "query": question})
+
+
+def measure(
+    name: str,
+    question_contexts: List[List[str]],
+    llm: Optional[Callable] = None,
+    assembly_ms: Optional[List[float]] = None
+) -> float:
+    prompts = [render_prompt(question, documents) for (question, _), documents in zip(QUESTIONS, question_contexts)]
+    tokens = [estimate_tokens(prompt.to_string()) for prompt in prompts]
+    hits = sum(any(fact in text for text in documents) for (_, fact), documents in zip(QUESTIONS, question_contexts))
+
+    llm_seconds = []
+    if llm is not None:
+        for prompt in prompts:
+            start_time = time.perf_counter()
+            llm(prompt)
+            llm_seconds.append(time.perf_counter() - start_time)
+
+    assembly = f"{np.median(assembly_ms):.2f}" if assembly_ms else "-"
+    latency = f"{np.median(llm_seconds):.2f}" if llm_seconds else "-"
+    print(
+        f"{name:<12} {np.mean(tokens):>14.0f} {max(tokens):>12} {hits / len(QUESTIONS):>7.2f} "
+        f"{assembly:>14} {latency:>14}"
+    )
+    return float(np.mean(tokens))
+
+
+def main(embedder: str, k: int, budget: int, similarity: float, rerank_model: str, use_llm: bool) -> None:
+    embed = lexical_embedder() if embedder == "lexical" else model_embedder()
+    chunks = [text for text, _ in iter_pdf_documents(str(EXAMPLE_PDF), settings.PDF_CHUNK_TOKENS, settings.PDF_CHUNK_OVERLAP_TOKENS)]
+    corpus = chunks + chunks  # the same document ingested under two names
+    vectors = embed(corpus)
+    queries = embed([question for question, _ in QUESTIONS])
+    reranker = CrossEncoderReranker(rerank_model) if rerank_model else None
+
+    llm = None
+    if use_llm:
+        from langchain_groq import ChatGroq
+        llm = ChatGroq(groq_api_key=settings.GROQ_API_KEY, model_name=settings.GROQ_MODEL).invoke
+
+    baseline, assembled, assembly_ms = [], [], []
+    for (question, _), query in zip(QUESTIONS, queries):
+        top = np.argsort(-(vectors @ query), kind="stable")[:k]
+        documents = [corpus[i] for i in top]
+        baseline.append(documents)
+
+        start_time = time.perf_counter()
+        result = assemble_context(
+            documents,
+            vectors[top],
+            max_tokens=budget,
+            max_similarity=similarity,
+            rerank=(lambda texts, q=question: reranker.rerank(q, texts)) if reranker is not None else None
+        )
+        assembly_ms.append(1000 * (time.perf_counter() - start_time))
+        assembled.append(result.texts)
+
+    print(
+        f"\nContext assembly benchmark: {EXAMPLE_PDF.name} x2, {len(QUESTIONS)} questions, top-{k}, "
+        f"{embedder} embedder, budget {budget} tokens, dedupe >= {similarity}"
+        f"{', rerank ' + rerank_model if rerank_model else ''}\n"
+    )
+    print(f"{'context':<12} {'prompt tokens':>14} {'max tokens':>12} {'hit':>7} {'assembly ms':>14} {'LLM p50 s':>14}")
+    before = measure("all top-k", baseline, llm)
+    after = measure("assembled", assembled, llm, assembly_ms)
+    print(f"\nprompt tokens: {before:.0f} -> {after:.0f} ({100 * (1 - after / before):.0f}% fewer)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark context dedupe, rerank and token budget")
+    parser.add_argument("--embedder", choices=("model", "lexical"), default="model")
+    parser.add_argument("--k", type=int, default=8, help="Chunks retrieved per question")
+    parser.add_argument("--budget", type=int, default=settings.CONTEXT_MAX_TOKENS, help="Context token budget")
+    parser.add_argument("--similarity", type=float, default=settings.CONTEXT_DEDUP_SIMILARITY)
+    parser.add_argument("--rerank", default="", help="Cross-encoder model to rerank with")
+    parser.add_argument("--llm", action="store_true", help="Also time the Groq LLM on both prompts")
+    args = parser.parse_args()
+    main(args.embedder, args.k, args.budget, args.similarity, args.rerank, args.llm)
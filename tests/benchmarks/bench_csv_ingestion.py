@@ -0,0 +1,61 @@
+"""
+Benchmark CSV-to-document conversion: legacy iterrows/to_string vs the columnar path.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_csv_ingestion --scale 100
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pandas as pd
+
+from app.services.ingestion import iter_csv_documents
+
+EXAMPLE_CSV = Path(__file__).resolve().parents[2] / "examples" / "nvda_stock_data.csv"
+
+
+def legacy_documents(path: str) -> Iterator[str]:
+    df = pd.read_csv(path)
+    for _, row in df.iterrows():
+        yield row.to_string()
+
+
+def scaled_csv(scale: int, directory: str) -> str:
+    df = pd.read_csv(EXAMPLE_CSV)
+    path = os.path.join(directory, f"nvda_x{scale}.csv")
+    pd.concat([df] * scale, ignore_index=True).to_csv(path, index=False)
+    return path
+
+
+def measure(name: str, rows: int, produce: Callable[[], Iterator]) -> float:
+    start_time = time.perf_counter()
+    num_documents = sum(1 for _ in produce())
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<28} {rows / elapsed:>12,.0f} rows/s  {num_documents:>9,} docs  {elapsed:>7.2f}s")
+    return elapsed
+
+
+def main(scale: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = scaled_csv(scale, directory)
+        rows = sum(1 for _ in open(path)) - 1
+        print(f"\nCSV conversion benchmark: {rows:,} rows ({scale}x {EXAMPLE_CSV.name})\n")
+
+        legacy = measure("legacy iterrows/to_string", rows, lambda: legacy_documents(path))
+        columnar = measure("columnar, 1 row/chunk", rows, lambda: iter_csv_documents(path))
+        measure("columnar, 20 rows/chunk", rows, lambda: iter_csv_documents(path, rows_per_chunk=20))
+        measure("columnar, 1 chunk/week", rows, lambda: iter_csv_documents(path, period="week"))
+        measure("columnar, 1 chunk/month", rows, lambda: iter_csv_documents(path, period="month"))
+
+        print(f"\nSpeedup (1 row/chunk): {legacy / columnar:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CSV document conversion")
+    parser.add_argument("--scale", type=int, default=100, help="How many times to repeat the example CSV")
+    args = parser.parse_args()
+    main(args.scale)
@@ -0,0 +1,501 @@
+"""
+Load benchmark: open-loop traffic against the API with a fake LLM and embedder.
+
+A child process serves the real app (routes, graph, vector store, BM25,
+ingestion queue) with FakeChatModel and FakeEmbeddings from
+tests/benchmarks/fakes.py, after ingesting the files in examples/. No
+network access or API key is needed, so runs are reproducible in CI.
+
+Requests arrive on a fixed schedule, whether or not earlier ones finished
+(open loop), in one of three modes: ``constant`` (evenly spaced),
+``poisson`` (exponential gaps) or ``ramp`` (rate rising linearly from
+``--rate`` to ``--ramp-to``). Latency is measured from each request's
+scheduled arrival, so a backed-up server is not hidden by a stalled
+generator. Each arrival is a query, a streamed query or a document upload,
+mixed by ``--stream-ratio`` and ``--ingest-ratio``; questions are drawn
+from examples/ (only the first ``--questions`` of them, to model a burst of
+popular questions). Latencies go into HDR-style histograms (1% precision) and
+per-stage timings come from the API's ``include_timings``.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_load --mode poisson --rate 20 --duration 30
+    python -m tests.benchmarks.bench_load --mode ramp --rate 5 --ramp-to 60 --duration 60 --stream-ratio 0.3 --ingest-ratio 0.02
+    python -m tests.benchmarks.bench_load --output after.json --compare before.json
+    python -m tests.benchmarks.bench_load --mode constant --rate 20 --questions 3 --no-answer-cache --no-llm-coalescing
+    python -m tests.benchmarks.bench_load --server-logging queue --compare logging-off.json
+    python -m tests.benchmarks.bench_load --url http://localhost:8000   # a running server, real models
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+from tests.benchmarks.bench_pdf_chunking import QUESTIONS
+from tests.benchmarks.bench_startup import free_port, wait_for
+
+EXAMPLES_DIR = Path(__file__).resolve().parents[2] / "examples"
+EXAMPLE_FILES = ("NVIDIAAn.pdf", "nvda_stock_data.csv")
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """Latency counts bucketed like HdrHistogram: values are kept to
+    ``significant_digits`` digits of microseconds, so every percentile is
+    within 10^(1 - digits) relative error (1% by default) at a fixed,
+    small memory cost however many values are recorded."""
+
+    def __init__(self, significant_digits: int = 3):
+        self.significant_digits = significant_digits
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _step(self, micros: int) -> int:
+        return 10 ** max(len(str(micros)) - self.significant_digits, 0)
+
+    def record(self, seconds: float) -> None:
+        micros = max(int(seconds * 1e6), 0)
+        bucket = micros - micros % self._step(micros)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percentile: float) -> float:
+        """Latency in seconds at or below which ``percentile`` percent of values fall."""
+        if not self.count:
+            return 0.0
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                # The highest value the bucket stands for, as HdrHistogram reports
+                return min((bucket + self._step(bucket) - 1) / 1e6, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        summary = {
+            "count": self.count,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "min_ms": 1000 * self.min if self.count else 0.0,
+            "max_ms": 1000 * self.max
+        }
+        for percentile in PERCENTILES:
+            summary[f"p{percentile:g}_ms"] = 1000 * self.percentile(percentile)
+        return summary
+
+
+def arrival_times(mode: str, rate: float, duration: float, ramp_to: Optional[float] = None, seed: int = 0) -> np.ndarray:
+    """Seconds from the start at which requests arrive, regardless of responses."""
+    if mode == "constant":
+        return np.arange(0.0, duration, 1.0 / rate)
+    if mode == "poisson":
+        rng = np.random.default_rng(seed)
+        times = np.cumsum(rng.exponential(1.0 / rate, size=int(rate * duration * 1.5) + 16))
+        return times[times < duration]
+    if mode == "ramp":
+        # The rate rises linearly, so the i-th arrival solves slope / 2 * t^2 + rate * t = i
+        slope = ((ramp_to if ramp_to is not None else rate) - rate) / duration
+        total = rate * duration + slope * duration ** 2 / 2
+        arrivals = np.arange(total)
+        if slope == 0:
+            return arrivals / rate
+        return (np.sqrt(rate ** 2 + 2 * slope * arrivals) - rate) / slope
+    raise ValueError(f"Unknown arrival mode: {mode}")
+
+
+def load_questions(seed: int = 0, per_kind: int = 20) -> List[str]:
+    """Questions about the example files: the PDF benchmark's questions, the
+    sample queries, and price lookups and aggregations over the example CSV."""
+    questions = [question for question, _ in QUESTIONS]
+    samples = (EXAMPLES_DIR / "sample_queries.md").read_text()
+    questions += re.findall(r'"text":\s*"([^"]+)"', samples)
+
+    with open(EXAMPLES_DIR / "nvda_stock_data.csv", newline="") as f:
+        dates = [row["Date"] for row in csv.DictReader(f)]
+    rng = np.random.default_rng(seed)
+    for date in rng.choice(dates, size=per_kind, replace=False):
+        questions.append(f"What was NVIDIA's closing price on {date}?")
+    months = sorted({date[:7] for date in dates})
+    for month in rng.choice(months, size=min(per_kind, len(months)), replace=False):
+        name = datetime.strptime(month, "%Y-%m").strftime("%B %Y")
+        questions.append(f"What was the average closing price in {name}?")
+    return list(dict.fromkeys(questions))
+
+
+@dataclass
+class Results:
+    latencies: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    stages: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    errors: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    job_ids: List[str] = field(default_factory=list)
+    dropped: int = 0
+    dispatch_lag: float = 0.0
+    elapsed: float = 0.0
+
+    def record(self, kind: str, seconds: float) -> None:
+        self.latencies.setdefault(kind, LatencyHistogram()).record(seconds)
+
+    def record_stages(self, timings: Dict[str, float]) -> None:
+        for stage, seconds in timings.items():
+            self.stages.setdefault(stage, LatencyHistogram()).record(seconds)
+
+    def fail(self, kind: str, reason: str) -> None:
+        errors = self.errors.setdefault(kind, {})
+        errors[reason] = errors.get(reason, 0) + 1
+
+
+async def send_query(client: httpx.AsyncClient, results: Results, question: str, scheduled: float) -> None:
+    response = await client.post("/api/query", json={"text": question, "include_timings": True})
+    if response.status_code != 200:
+        results.fail("query", str(response.status_code))
+        return
+    results.record("query", time.perf_counter() - scheduled)
+    results.record_stages(response.json().get("timings") or {})
+
+
+async def send_stream(client: httpx.AsyncClient, results: Results, question: str, scheduled: float) -> None:
+    async with client.stream("POST", "/api/query/stream", json={"text": question, "include_timings": True}) as response:
+        if response.status_code != 200:
+            results.fail("stream", str(response.status_code))
+            return
+        event, first_token = None, None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - scheduled
+            elif line.startswith("data: ") and event == "error":
+                results.fail("stream", "error event")
+                return
+            elif line.startswith("data: ") and event == "done":
+                results.record_stages(json.loads(line[len("data: "):]).get("timings") or {})
+    results.record("stream", time.perf_counter() - scheduled)
+    if first_token is not None:
+        results.record("stream_first_token", first_token)
+
+
+async def send_upload(client: httpx.AsyncClient, results: Results, name: str, content: bytes, scheduled: float) -> None:
+    response = await client.post("/api/ingest/document", files={"file": (name, content)})
+    if response.status_code != 202:
+        results.fail("ingest", str(response.status_code))
+        return
+    results.record("ingest", time.perf_counter() - scheduled)
+    results.job_ids.append(response.json()["details"]["job_id"])
+
+
+async def run_load(
+    base_url: str,
+    arrivals: np.ndarray,
+    questions: List[str],
+    stream_ratio: float,
+    ingest_ratio: float,
+    max_in_flight: int,
+    timeout: float,
+    seed: int = 0
+) -> Results:
+    """Send one request per arrival; arrivals beyond ``max_in_flight`` outstanding requests are dropped."""
+    results = Results()
+    rng = np.random.default_rng(seed)
+    kinds = rng.choice(["ingest", "stream", "query"], size=len(arrivals), p=[ingest_ratio, stream_ratio, 1 - ingest_ratio - stream_ratio])
+    uploads = [(name, (EXAMPLES_DIR / name).read_bytes()) for name in EXAMPLE_FILES]
+    tasks = set()
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+
+    async def send(index: int, kind: str, scheduled: float) -> None:
+        try:
+            if kind == "ingest":
+                name, content = uploads[index % len(uploads)]
+                # A distinct name per upload, as separate documents would have
+                await send_upload(client, results, f"bench-{index}-{name}", content, scheduled)
+            elif kind == "stream":
+                await send_stream(client, results, questions[rng.integers(len(questions))], scheduled)
+            else:
+                await send_query(client, results, questions[rng.integers(len(questions))], scheduled)
+        except httpx.HTTPError as e:
+            results.fail(kind, type(e).__name__)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start_time = time.perf_counter()
+        for index, (offset, kind) in enumerate(zip(arrivals, kinds)):
+            scheduled = start_time + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            results.dispatch_lag = max(results.dispatch_lag, time.perf_counter() - scheduled)
+            if len(tasks) >= max_in_flight:
+                results.dropped += 1
+                continue
+            task = asyncio.create_task(send(index, str(kind), scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        results.elapsed = time.perf_counter() - start_time
+    return results
+
+
+def drain_jobs(base_url: str, job_ids: List[str], results: Results, timeout: float) -> None:
+    """Wait for queued ingestion jobs and record each one's time from upload to completion."""
+    deadline = time.perf_counter() + timeout
+    with httpx.Client(base_url=base_url, timeout=10.0) as client:
+        for job_id in job_ids:
+            while True:
+                job = client.get(f"/api/ingest/jobs/{job_id}").json()
+                if job["status"] in ("completed", "failed") or time.perf_counter() > deadline:
+                    break
+                time.sleep(0.1)
+            if job["status"] != "completed":
+                results.fail("ingest_job", job["status"])
+                continue
+            created, finished = (datetime.fromisoformat(job[key]) for key in ("created_at", "finished_at"))
+            results.record("ingest_job", (finished - created).total_seconds())
+
+
+def llm_calls(base_url: str) -> Dict[str, float]:
+    """LLM generations the server made, saved by coalescing and hedged, from its metrics (summed over labels)."""
+    with httpx.Client(base_url=base_url, timeout=10.0) as client:
+        families = text_string_to_metric_families(client.get("/metrics").text)
+        samples: Dict[str, float] = {}
+        for sample in (sample for family in families for sample in family.samples):
+            samples[sample.name] = samples.get(sample.name, 0.0) + sample.value
+    return {
+        "calls": samples.get("rag_llm_seconds_count", 0.0),
+        "coalesced": samples.get("rag_llm_calls_coalesced_total", 0.0),
+        "hedged": samples.get("rag_llm_hedged_requests_total", 0.0)
+    }
+
+
+def serve(
+    port: int,
+    directory: str,
+    llm: Dict[str, float],
+    embedder: Dict[str, float],
+    answer_cache: bool,
+    llm_coalescing: bool,
+    hedge_percentile: float,
+    server_logging: str
+) -> None:
+    """Run the app with fake models on a fresh data directory holding the example files.
+
+    ``server_logging`` is ``off``, ``sync`` (text written on the request path)
+    or ``queue`` (JSON written by the listener thread). Logs go to files in
+    ``directory``, standing in for the container's log files.
+    """
+    import sys
+
+    import uvicorn
+
+    from app.api import routes
+    from app.core.config import settings
+    from app.core.logging_config import setup_logging
+    from app.main import app
+    from app.services.llm_gateway import LLMBackend, LLMGateway
+    from app.services.rag_pipeline import RAGPipeline
+    from tests.benchmarks.fakes import FakeChatModel, FakeEmbeddings
+
+    if server_logging == "off":
+        logging.disable(logging.INFO)
+    else:
+        sys.stdout = open(os.path.join(directory, "stdout.log"), "w")
+        settings.LOG_FILE = os.path.join(directory, "app.log")
+        settings.LOG_ASYNC = server_logging == "queue"
+        settings.LOG_FORMAT = "json" if server_logging == "queue" else "text"
+        setup_logging()
+    settings.VECTORDB_PATH = os.path.join(directory, "vectordb")
+    settings.RAW_DATA_PATH = os.path.join(directory, "raw")
+    settings.PROCESSED_DATA_PATH = os.path.join(directory, "processed")
+    settings.INGEST_JOBS_DB = os.path.join(directory, "ingest_jobs.db")
+    if not answer_cache:
+        settings.ANSWER_CACHE_MAX_ENTRIES = 0
+    settings.LLM_COALESCING_ENABLED = llm_coalescing
+    settings.LLM_HEDGE_PERCENTILE = hedge_percentile
+
+    pipeline = RAGPipeline()
+    # The fake model stands in for Groq behind the same gateway (limits, deadline, hedging)
+    pipeline._llm = LLMGateway(
+        backends=[LLMBackend(
+            "fake", FakeChatModel(**llm), max_concurrency=settings.LLM_MAX_CONCURRENCY, timeout_seconds=settings.LLM_TIMEOUT_SECONDS
+        )],
+        hedge_percentile=settings.LLM_HEDGE_PERCENTILE,
+        hedge_min_delay_ms=settings.LLM_HEDGE_MIN_DELAY_MS
+    )
+    pipeline._embeddings = FakeEmbeddings(**embedder)
+
+    async def ingest_examples() -> None:
+        os.makedirs(settings.RAW_DATA_PATH, exist_ok=True)
+        for name in EXAMPLE_FILES:
+            path = shutil.copy(EXAMPLES_DIR / name, settings.RAW_DATA_PATH)
+            await pipeline.ingest_file(path, name)
+
+    asyncio.run(ingest_examples())
+    routes._rag_pipeline = pipeline
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def summarize(results: Results, config: Dict[str, Any], offered: int, llm: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    requests = {}
+    for kind in sorted(set(results.latencies) | set(results.errors)):
+        histogram = results.latencies.get(kind, LatencyHistogram())
+        requests[kind] = {
+            "ok": histogram.count,
+            "errors": results.errors.get(kind, {}),
+            "throughput_per_s": histogram.count / results.elapsed if results.elapsed and kind != "ingest_job" else None,
+            "latency": histogram.summary()
+        }
+    return {
+        "config": config,
+        "offered": offered,
+        "offered_rate_per_s": offered / config["duration"],
+        "elapsed_s": results.elapsed,
+        "dropped": results.dropped,
+        "dispatch_lag_max_ms": 1000 * results.dispatch_lag,
+        "requests": requests,
+        "stages": {stage: histogram.summary() for stage, histogram in sorted(results.stages.items())},
+        "llm": llm
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    config = report["config"]
+    print(
+        f"\nLoad benchmark: {config['mode']} arrivals, {report['offered']} requests over {config['duration']}s "
+        f"({report['offered_rate_per_s']:.1f}/s offered), {report['dropped']} dropped, "
+        f"dispatch lag max {report['dispatch_lag_max_ms']:.1f} ms\n"
+    )
+    columns = "".join(f"{f'p{p:g} ms':>10}" for p in PERCENTILES)
+    print(f"{'request':<20} {'ok':>6} {'errors':>7} {'per s':>7}{columns}{'max ms':>10}")
+    for kind, stats in report["requests"].items():
+        latency = stats["latency"]
+        throughput = f"{stats['throughput_per_s']:.1f}" if stats["throughput_per_s"] is not None else "-"
+        values = "".join(f"{latency[f'p{p:g}_ms']:>10.1f}" for p in PERCENTILES)
+        print(f"{kind:<20} {stats['ok']:>6} {sum(stats['errors'].values()):>7} {throughput:>7}{values}{latency['max_ms']:>10.1f}")
+    if report["stages"]:
+        print(f"\n{'stage':<20} {'count':>6} {'mean ms':>9}{columns}")
+        for stage, latency in report["stages"].items():
+            values = "".join(f"{latency[f'p{p:g}_ms']:>10.1f}" for p in PERCENTILES)
+            print(f"{stage:<20} {latency['count']:>6} {latency['mean_ms']:>9.1f}{values}")
+    if report.get("llm"):
+        llm = report["llm"]
+        print(f"\nLLM calls: {llm['calls']:.0f} made, {llm['coalesced']:.0f} saved by coalescing, {llm.get('hedged', 0):.0f} hedged")
+
+
+def print_comparison(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    def change(before: Optional[float], after: Optional[float]) -> str:
+        if not before or after is None:
+            return "-"
+        return f"{before:.1f} -> {after:.1f} ({100 * (after / before - 1):+.0f}%)"
+
+    print(f"\n{'request':<20} {'p50 ms':>26} {'p99 ms':>26} {'per s':>24}")
+    for kind, stats in report["requests"].items():
+        before = baseline["requests"].get(kind)
+        if before is None:
+            continue
+        print(
+            f"{kind:<20} {change(before['latency']['p50_ms'], stats['latency']['p50_ms']):>26} "
+            f"{change(before['latency']['p99_ms'], stats['latency']['p99_ms']):>26} "
+            f"{change(before['throughput_per_s'], stats['throughput_per_s']):>24}"
+        )
+
+
+def main(args: argparse.Namespace) -> None:
+    arrivals = arrival_times(args.mode, args.rate, args.duration, args.ramp_to, args.seed)
+    questions = load_questions(args.seed)[:args.questions or None]
+    llm = {
+        "first_token_ms": args.llm_first_token_ms,
+        "tokens_per_second": args.llm_tokens_per_second,
+        "answer_tokens": args.llm_answer_tokens,
+        "slow_ratio": args.llm_slow_ratio,
+        "slow_ms": args.llm_slow_ms
+    }
+    embedder = {"call_ms": args.embed_call_ms, "text_ms": args.embed_text_ms}
+    config = {
+        key: getattr(args, key)
+        for key in ("mode", "rate", "ramp_to", "duration", "stream_ratio", "ingest_ratio", "max_in_flight", "seed", "questions", "answer_cache", "llm_coalescing", "hedge_percentile", "server_logging", "url")
+    }
+    if not args.url:
+        config.update(llm=llm, embedder=embedder)
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = None
+        base_url = args.url
+        if not base_url:
+            port = free_port()
+            server = multiprocessing.get_context("spawn").Process(
+                target=serve, args=(port, directory, llm, embedder, args.answer_cache, args.llm_coalescing, args.hedge_percentile, args.server_logging)
+            )
+            server.start()
+            base_url = f"http://127.0.0.1:{port}"
+        try:
+            with httpx.Client(base_url=base_url, timeout=1.0) as client:
+                wait_for(client, "/ready", time.perf_counter(), args.startup_timeout)
+            results = asyncio.run(run_load(
+                base_url, arrivals, questions, args.stream_ratio, args.ingest_ratio, args.max_in_flight, args.timeout, args.seed
+            ))
+            drain_jobs(base_url, results.job_ids, results, args.timeout)
+            calls = llm_calls(base_url)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.join()
+
+    report = summarize(results, config, len(arrivals), calls)
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop load benchmark of the API with a fake LLM and embedder")
+    parser.add_argument("--mode", choices=("constant", "poisson", "ramp"), default="poisson", help="Arrival process")
+    parser.add_argument("--rate", type=float, default=10.0, help="Arrivals per second (the starting rate when ramping)")
+    parser.add_argument("--ramp-to", type=float, default=None, help="Arrival rate at the end of a ramp")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals")
+    parser.add_argument("--stream-ratio", type=float, default=0.0, help="Share of arrivals sent to /query/stream")
+    parser.add_argument("--ingest-ratio", type=float, default=0.0, help="Share of arrivals that upload an example file")
+    parser.add_argument("--max-in-flight", type=int, default=512, help="Outstanding requests before arrivals are dropped")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--questions", type=int, default=0, help="Only ask this many distinct questions (0 for all)")
+    parser.add_argument("--no-answer-cache", dest="answer_cache", action="store_false", help="Disable the answer cache on the server")
+    parser.add_argument("--no-llm-coalescing", dest="llm_coalescing", action="store_false", help="Give every request its own LLM call")
+    parser.add_argument("--llm-first-token-ms", type=float, default=150.0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=300.0)
+    parser.add_argument("--llm-answer-tokens", type=int, default=80)
+    parser.add_argument("--llm-slow-ratio", type=float, default=0.0, help="Share of LLM calls with a slow first token")
+    parser.add_argument("--llm-slow-ms", type=float, default=2000.0, help="Extra time to first token of slow LLM calls")
+    parser.add_argument("--hedge-percentile", type=float, default=95.0, help="LLM hedge delay percentile on the server (0 disables)")
+    parser.add_argument("--embed-call-ms", type=float, default=5.0, help="Fake embedding time per model call")
+    parser.add_argument("--embed-text-ms", type=float, default=1.0, help="Fake embedding time per text")
+    parser.add_argument(
+        "--server-logging", choices=("off", "sync", "queue"), default="off",
+        help="Server INFO logs: off, written on the request path, or queued to a background thread"
+    )
+    parser.add_argument("--url", default="", help="Benchmark a running server instead of a local one with fake models")
+    parser.add_argument("--startup-timeout", type=float, default=300.0, help="Seconds to wait for the server to be ready")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare against")
+    main(parser.parse_args())
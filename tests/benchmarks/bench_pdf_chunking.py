@@ -0,0 +1,110 @@
+"""
+Benchmark retrieval quality and prompt size: page-level PDF documents vs token-aware chunks.
+
+Questions about examples/NVIDIAAn.pdf are answered by retrieving the top-k
+documents; a hit means the expected fact is in a retrieved document *and*
+within the embedding model's input window (text past it is never embedded).
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_pdf_chunking
+    python -m tests.benchmarks.bench_pdf_chunking --embedder lexical   # offline, no model download
+"""
+import argparse
+import hashlib
+import re
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from app.services.ingestion import iter_pdf_documents
+from app.services.tokens import approximate_token_spans, estimate_tokens
+
+EXAMPLE_PDF = Path(__file__).resolve().parents[2] / "examples" / "NVIDIAAn.pdf"
+MODEL_MAX_TOKENS = 256
+
+QUESTIONS = [
+    ("Which superchip is at the heart of DGX Spark?", "GB10"),
+    ("How much AI compute does DGX Spark deliver?", "1,000 trillion"),
+    ("How much bandwidth does NVLink-C2C deliver compared to PCIe?", "5x the bandwidth"),
+    ("How much coherent memory does DGX Station have?", "784GB"),
+    ("What networking speed does the ConnectX-8 SuperNIC support?", "800Gb/s"),
+    ("Which manufacturing partners will offer DGX Station?", "BOXX"),
+    ("Where can DGX Spark systems be reserved?", "Reservations for DGX Spark"),
+    ("Until when does the GTC show run?", "March 21"),
+    ("What was DGX Spark formerly called?", "Project DIGITS"),
+    ("Who is the media contact for the announcement?", "Pearlina Boc"),
+]
+
+Embed = Callable[[List[str]], np.ndarray]
+
+
+def lexical_embedder(dimensions: int = 2048) -> Embed:
+    """Hashed bag-of-words vectors, truncated like the model's input window."""
+    def embed(texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            spans = approximate_token_spans(text)[:MODEL_MAX_TOKENS]
+            window = text[:spans[-1][1]] if spans else ""
+            for word in re.findall(r"\w+", window.lower()):
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % dimensions] += 1.0
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+    return embed
+
+
+def model_embedder() -> Embed:
+    from langchain_huggingface import HuggingFaceEmbeddings
+    model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    return lambda texts: np.asarray(model.embed_documents(texts), dtype=np.float32)
+
+
+def embedded_window(text: str) -> str:
+    spans = approximate_token_spans(text)[:MODEL_MAX_TOKENS]
+    return text[:spans[-1][1]] if spans else ""
+
+
+def evaluate(name: str, documents: List[str], embed: Embed, k: int) -> Tuple[float, float]:
+    vectors = embed(documents)
+    questions = embed([question for question, _ in QUESTIONS])
+    hits_at_1 = hits_at_k = reciprocal_rank = 0.0
+    context_tokens = []
+    for (question, fact), query in zip(QUESTIONS, questions):
+        ranking = np.argsort(-(vectors @ query))
+        context_tokens.append(sum(estimate_tokens(documents[i]) for i in ranking[:k]))
+        ranks = [rank for rank, i in enumerate(ranking, start=1) if fact in embedded_window(documents[i])]
+        if ranks:
+            hits_at_1 += ranks[0] == 1
+            hits_at_k += ranks[0] <= k
+            reciprocal_rank += 1.0 / ranks[0]
+
+    total_tokens = sum(estimate_tokens(text) for text in documents)
+    truncated = sum(max(0, estimate_tokens(text) - MODEL_MAX_TOKENS) for text in documents)
+    n = len(QUESTIONS)
+    print(
+        f"{name:<26} {len(documents):>6} {100 * truncated / total_tokens:>10.1f}% "
+        f"{hits_at_1 / n:>7.2f} {hits_at_k / n:>7.2f} {reciprocal_rank / n:>7.2f} {np.mean(context_tokens):>12.0f}"
+    )
+    return hits_at_k / n, float(np.mean(context_tokens))
+
+
+def main(embedder: str, k: int, chunk_tokens: int, overlap_tokens: int) -> None:
+    embed = lexical_embedder() if embedder == "lexical" else model_embedder()
+    path = str(EXAMPLE_PDF)
+    pages = [text for text, _ in iter_pdf_documents(path)]
+    chunks = [text for text, _ in iter_pdf_documents(path, chunk_tokens, overlap_tokens)]
+
+    print(f"\nPDF chunking benchmark: {EXAMPLE_PDF.name}, {len(QUESTIONS)} questions, top-{k}, {embedder} embedder\n")
+    print(f"{'strategy':<26} {'docs':>6} {'truncated':>11} {'hit@1':>7} {'hit@' + str(k):>7} {'MRR':>7} {'ctx tokens':>12}")
+    page_hits, page_tokens = evaluate("page-level", pages, embed, k)
+    chunk_hits, chunk_tokens_used = evaluate(f"{chunk_tokens} tokens, {overlap_tokens} overlap", chunks, embed, k)
+    print(f"\nhit@{k}: {page_hits:.2f} -> {chunk_hits:.2f}; prompt context: {page_tokens:.0f} -> {chunk_tokens_used:.0f} tokens")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PDF chunking strategies")
+    parser.add_argument("--embedder", choices=("model", "lexical"), default="model")
+    parser.add_argument("--k", type=int, default=3, help="Documents retrieved per question")
+    parser.add_argument("--chunk-tokens", type=int, default=200)
+    parser.add_argument("--overlap-tokens", type=int, default=40)
+    args = parser.parse_args()
+    main(args.embedder, args.k, args.chunk_tokens, args.overlap_tokens)
@@ -0,0 +1,77 @@
+"""
+Benchmark PDF text extraction: inline vs a process pool, across worker counts.
+
+A synthetic multi-hundred-page PDF is built by repeating the pages of
+examples/NVIDIAAn.pdf. Speedup is bounded by the cores available.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_pdf_parsing --pages 300
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import pypdf
+
+from app.services.ingestion import iter_pdf_pages
+
+EXAMPLE_PDF = Path(__file__).resolve().parents[2] / "examples" / "NVIDIAAn.pdf"
+
+
+def synthetic_pdf(num_pages: int, directory: str) -> str:
+    reader = pypdf.PdfReader(str(EXAMPLE_PDF))
+    writer = pypdf.PdfWriter()
+    for index in range(num_pages):
+        writer.add_page(reader.pages[index % len(reader.pages)])
+    path = os.path.join(directory, f"synthetic_{num_pages}.pdf")
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def measure(path: str, workers: Optional[int]) -> float:
+    if workers is None:
+        start_time = time.perf_counter()
+        sum(len(text) for _, text in iter_pdf_pages(path))
+        return time.perf_counter() - start_time
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # Start the workers first: the pipeline keeps its pool alive across uploads
+        list(executor.map(abs, range(workers)))
+        start_time = time.perf_counter()
+        sum(len(text) for _, text in iter_pdf_pages(path, executor, max_pending=2 * workers))
+        return time.perf_counter() - start_time
+
+
+def worker_counts(max_workers: int) -> List[int]:
+    counts, workers = [], 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    return counts + [max_workers]
+
+
+def main(num_pages: int, max_workers: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = synthetic_pdf(num_pages, directory)
+        print(f"\nPDF extraction benchmark: {num_pages} pages, {os.cpu_count()} CPUs\n")
+        print(f"{'mode':<16} {'pages/s':>10} {'seconds':>9} {'speedup':>9}")
+
+        inline = measure(path, None)
+        print(f"{'inline':<16} {num_pages / inline:>10.1f} {inline:>9.2f} {1.0:>8.2f}x")
+        for workers in worker_counts(max_workers):
+            elapsed = measure(path, workers)
+            print(f"{f'{workers} processes':<16} {num_pages / elapsed:>10.1f} {elapsed:>9.2f} {inline / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel PDF text extraction")
+    parser.add_argument("--pages", type=int, default=300, help="Pages in the synthetic PDF")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    main(args.pages, args.max_workers)
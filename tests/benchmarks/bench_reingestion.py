@@ -0,0 +1,80 @@
+"""
+Benchmark re-ingestion of a refreshed CSV: time and chunks written per version.
+
+The example CSV is scaled up, ingested, and then refreshed the way a daily
+export is: new rows appended and a few recent rows corrected. Each version
+is re-ingested into the same store. Only the changed chunks should be
+embedded and written, and the store should hold exactly the chunks of the
+latest version. FakeEmbeddings stands in for the model (``--embed-text-ms``
+per chunk), so the run is offline.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_reingestion --scale 10 --versions 5
+    python -m tests.benchmarks.bench_reingestion --backend chroma
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+from app.core.config import settings
+from app.services.rag_pipeline import RAGPipeline
+from tests.benchmarks.bench_csv_ingestion import EXAMPLE_CSV
+from tests.benchmarks.fakes import FakeEmbeddings
+
+
+def scaled_rows(scale: int) -> List[str]:
+    """Example CSV rows repeated ``scale`` times, each copy's dates moved on by a century."""
+    header, *rows = EXAMPLE_CSV.read_text().splitlines()
+    copies = [row.replace(row[:4], str(int(row[:4]) + 100 * copy), 1) for copy in range(scale) for row in rows]
+    return [header, *copies]
+
+
+def main(scale: int, versions: int, appended: int, corrected: int, backend: str, embed_text_ms: float) -> None:
+    header, *rows = scaled_rows(scale)
+    initial = len(rows) - versions * appended
+    with tempfile.TemporaryDirectory() as directory, \
+            patch.object(settings, "VECTOR_STORE", backend), \
+            patch.object(settings, "VECTORDB_PATH", os.path.join(directory, "vectordb")), \
+            patch.object(settings, "RAW_DATA_PATH", directory), \
+            patch.object(settings, "PROCESSED_DATA_PATH", os.path.join(directory, "processed")), \
+            patch.object(settings, "EMBEDDING_CACHE_ENABLED", False):
+        pipeline = RAGPipeline()
+        pipeline._embeddings = FakeEmbeddings(call_ms=0.0, text_ms=embed_text_ms)
+        path = Path(directory) / "prices.csv"
+
+        print(f"\nRe-ingestion benchmark: {initial} rows, then {versions} refreshes of +{appended} rows and {corrected} corrections, {backend}\n")
+        print(f"{'version':>7} {'rows':>8} {'seconds':>8} {'added':>7} {'updated':>8} {'moved':>8} {'deleted':>8} {'unchanged':>10} {'stored':>8}")
+        current = rows[:initial]
+        for version in range(versions + 1):
+            if version:
+                current = current + rows[len(current):len(current) + appended]
+                # Corrections to the latest rows, as revised figures arrive
+                for index in range(len(current) - appended - corrected, len(current) - appended):
+                    current[index] += "0"
+            path.write_text("\n".join([header, *current]) + "\n")
+            start_time = time.perf_counter()
+            details = asyncio.run(pipeline.ingest_file(str(path), path.name))["details"]
+            seconds = time.perf_counter() - start_time
+            print(
+                f"{details['version']:>7} {len(current):>8} {seconds:>8.2f} {details['chunks_added']:>7} "
+                f"{details['chunks_updated']:>8} {details['chunks_moved']:>8} {details['chunks_deleted']:>8} {details['chunks_unchanged']:>10} "
+                f"{pipeline.vector_store.count():>8}"
+            )
+        pipeline.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark incremental re-ingestion of a refreshed CSV")
+    parser.add_argument("--scale", type=int, default=10, help="Copies of the example CSV's rows")
+    parser.add_argument("--versions", type=int, default=5, help="Refreshed versions to re-ingest")
+    parser.add_argument("--appended", type=int, default=20, help="Rows appended per version")
+    parser.add_argument("--corrected", type=int, default=5, help="Existing rows changed per version")
+    parser.add_argument("--backend", choices=("chroma", "numpy"), default="numpy")
+    parser.add_argument("--embed-text-ms", type=float, default=2.0, help="Fake embedding time per chunk")
+    args = parser.parse_args()
+    main(args.scale, args.versions, args.appended, args.corrected, args.backend, args.embed_text_ms)
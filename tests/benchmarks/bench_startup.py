@@ -0,0 +1,84 @@
+"""
+Benchmark API cold start: import time, time until /health answers and time until /ready.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_startup --runs 3
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_time() -> float:
+    code = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def wait_for(client: httpx.Client, url: str, start_time: float, timeout: float) -> float:
+    while time.perf_counter() - start_time < timeout:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter() - start_time
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def server_startup(timeout: float) -> Dict[str, float]:
+    port = free_port()
+    start_time = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=os.environ.copy()
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            health = wait_for(client, "/health", start_time, timeout)
+            ready = wait_for(client, "/ready", start_time, timeout)
+        return {"health": health, "ready": ready}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(name: str, values: List[float]) -> None:
+    print(f"{name:<24} median {statistics.median(values):6.2f}s  min {min(values):6.2f}s  max {max(values):6.2f}s")
+
+
+def main(runs: int, timeout: float) -> None:
+    imports, health, ready = [], [], []
+    for _ in range(runs):
+        imports.append(import_time())
+        timings = server_startup(timeout)
+        health.append(timings["health"])
+        ready.append(timings["ready"])
+
+    print(f"\nStartup benchmark ({runs} runs)\n")
+    summarize("import app.main", imports)
+    summarize("process start -> /health", health)
+    summarize("process start -> /ready", ready)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API startup time")
+    parser.add_argument("--runs", type=int, default=3, help="Number of cold starts to measure")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for each endpoint")
+    args = parser.parse_args()
+    main(args.runs, args.timeout)
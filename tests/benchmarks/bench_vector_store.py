@@ -0,0 +1,139 @@
+"""
+Benchmark vector store backends: build time, query throughput, p99 latency, memory and recall.
+
+Synthetic clustered 384-dimensional embeddings (the size all-MiniLM-L6-v2
+produces) are written to each backend in a child process. A fresh child
+then opens the persisted index and runs single-query searches, so RSS is
+that of a serving process rather than of the build (RSS is reported above
+the process baseline, with torch already imported as it is in the API).
+Recall@k is measured against brute-force search over the same vectors.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_vector_store --sizes 10000 100000
+    python -m tests.benchmarks.bench_vector_store --sizes 1000000 --backends numpy numpy-ivf
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from app.services.vector_store import ChromaVectorStore, NumpyVectorStore, VectorStore
+
+DIMENSIONS = 384
+CLUSTERS = 1000
+CHUNK_ROWS = 5000  # below Chroma's maximum batch size
+
+
+def vector_chunks(num_vectors: int, stream: int = 0) -> Iterator[np.ndarray]:
+    """Normalized vectors drawn around fixed cluster centres, generated chunk by chunk;
+    each ``stream`` is a different sample (the corpus is 0, queries 1)."""
+    centres = np.random.default_rng(0).normal(size=(CLUSTERS, DIMENSIONS)).astype(np.float32)
+    for start in range(0, num_vectors, CHUNK_ROWS):
+        rng = np.random.default_rng((stream, start))
+        size = min(CHUNK_ROWS, num_vectors - start)
+        vectors = centres[rng.integers(CLUSTERS, size=size)] + 0.5 * rng.normal(size=(size, DIMENSIONS)).astype(np.float32)
+        yield vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def open_store(backend: str, directory: str, size: int, ivf_lists: int, ivf_probes: int) -> VectorStore:
+    if backend == "chroma":
+        from chromadb import PersistentClient
+        client = PersistentClient(path=directory)
+        return ChromaVectorStore(client.get_or_create_collection(name="documents", metadata={"hnsw:space": "cosine"}))
+    lists = (ivf_lists or max(16, int(2 * np.sqrt(size)))) if backend == "numpy-ivf" else 0
+    return NumpyVectorStore(directory, dtype="float16", ivf_lists=lists, ivf_probes=ivf_probes)
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def build(backend: str, directory: str, size: int, queries: np.ndarray, k: int, ivf_lists: int, ivf_probes: int) -> Tuple[float, np.ndarray]:
+    """Fill the store; returns the build time and the brute-force top-k rows of each query."""
+    store = open_store(backend, directory, size, ivf_lists, ivf_probes)
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), k), dtype=np.int64)
+    start_time = time.perf_counter()
+    offset = 0
+    for vectors in vector_chunks(size):
+        ids = [str(offset + i) for i in range(len(vectors))]
+        store.upsert(ids, vectors.tolist(), ids, [{"source": "bench"}] * len(vectors))
+        scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(np.arange(offset, offset + len(vectors)), (len(queries), len(vectors)))], axis=1)
+        top = np.argsort(-scores, axis=1)[:, :k]
+        best_scores, best_rows = np.take_along_axis(scores, top, axis=1), np.take_along_axis(rows, top, axis=1)
+        offset += len(vectors)
+    store.commit()
+    return time.perf_counter() - start_time, best_rows
+
+
+def serve(backend: str, directory: str, size: int, queries: np.ndarray, truth: np.ndarray, k: int, ivf_lists: int, ivf_probes: int) -> Dict[str, Any]:
+    # The API process already holds torch for the embedding model; count only the index
+    try:
+        import torch
+    except ImportError:
+        pass
+    baseline_rss = rss_mb()
+    start_time = time.perf_counter()
+    store = open_store(backend, directory, size, ivf_lists, ivf_probes)
+    store.load()
+    store.query(queries[:1].tolist(), n_results=k)
+    open_seconds = time.perf_counter() - start_time
+
+    latencies: List[float] = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start_time = time.perf_counter()
+        result = store.query([query.tolist()], n_results=k, include=["distances"])
+        latencies.append(time.perf_counter() - start_time)
+        hits += len(set(map(int, result["ids"][0])) & set(expected.tolist()))
+    return {
+        "open_s": open_seconds,
+        "qps": len(latencies) / sum(latencies),
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p99_ms": 1000 * float(np.percentile(latencies, 99)),
+        "rss_mb": rss_mb() - baseline_rss,
+        "recall": hits / truth.size
+    }
+
+
+def main(sizes: List[int], backends: List[str], num_queries: int, k: int, ivf_lists: int, ivf_probes: int) -> None:
+    queries = next(vector_chunks(num_queries, stream=1))
+    spawn = multiprocessing.get_context("spawn")
+    print(f"\nVector store benchmark: {DIMENSIONS}-d vectors, {num_queries} single queries, top-{k}\n")
+    print(f"{'backend':<10} {'vectors':>9} {'build s':>9} {'open s':>8} {'QPS':>9} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'recall':>7}")
+    for size in sizes:
+        for backend in backends:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "index")
+                args = (backend, path, size)
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                    build_seconds, truth = executor.submit(build, *args, queries, k, ivf_lists, ivf_probes).result()
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                    stats = executor.submit(serve, *args, queries, truth, k, ivf_lists, ivf_probes).result()
+            print(
+                f"{backend:<10} {size:>9} {build_seconds:>9.1f} {stats['open_s']:>8.2f} {stats['qps']:>9.0f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['rss_mb']:>8.0f} {stats['recall']:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Chroma against the NumPy vector store")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", choices=("chroma", "numpy", "numpy-ivf"), default=["chroma", "numpy", "numpy-ivf"])
+    parser.add_argument("--queries", type=int, default=200, help="Single-query searches per run")
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="IVF clusters (0: 2 * sqrt(vectors))")
+    parser.add_argument("--ivf-probes", type=int, default=16, help="Clusters searched per query")
+    args = parser.parse_args()
+    main(args.sizes, args.backends, args.queries, args.k, args.ivf_lists, args.ivf_probes)
@@ -0,0 +1,117 @@
+"""
+Deterministic stand-ins for the Groq chat model and the embedding model, so
+benchmarks run offline with a controlled LLM latency.
+"""
+import asyncio
+import hashlib
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+WORDS = re.compile(r"\w+")
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers with ``answer_tokens`` words picked from the prompt (the same
+    prompt always gets the same answer), after ``first_token_ms`` and then at
+    ``tokens_per_second``, streamed ``chunk_tokens`` words at a time. A
+    ``slow_ratio`` share of calls waits ``slow_ms`` longer for the first token,
+    like a provider's latency tail."""
+
+    first_token_ms: float = 150.0
+    tokens_per_second: float = 300.0
+    answer_tokens: int = 80
+    chunk_tokens: int = 4
+    slow_ratio: float = 0.0
+    slow_ms: float = 0.0
+    _rng: random.Random = PrivateAttr(default_factory=lambda: random.Random(0))
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _chunks(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        words = WORDS.findall(prompt) or ["answer"]
+        rng = np.random.default_rng(_seed(prompt))
+        answer = [words[i] for i in rng.integers(len(words), size=self.answer_tokens)]
+        return [
+            " ".join(answer[start:start + self.chunk_tokens]) + " "
+            for start in range(0, len(answer), self.chunk_tokens)
+        ]
+
+    def _delays(self, chunks: List[str]) -> Iterator[float]:
+        slow = self.slow_ms if self._rng.random() < self.slow_ratio else 0.0
+        yield (self.first_token_ms + slow) / 1000.0
+        for _ in chunks[1:]:
+            yield self.chunk_tokens / self.tokens_per_second
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        chunks = self._chunks(messages)
+        time.sleep(sum(self._delays(chunks)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(chunks).strip()))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        chunks = self._chunks(messages)
+        await asyncio.sleep(sum(self._delays(chunks)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(chunks).strip()))])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        chunks = self._chunks(messages)
+        for chunk, delay in zip(chunks, self._delays(chunks)):
+            await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors with the model's dimensions; each call
+    sleeps ``call_ms`` plus ``text_ms`` per text to stand in for inference."""
+
+    def __init__(self, dimensions: int = 384, call_ms: float = 5.0, text_ms: float = 1.0):
+        self.dimensions = dimensions
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in WORDS.findall(text.lower()):
+            vector[_seed(word) % self.dimensions] += 1.0
+        return (vector / max(float(np.linalg.norm(vector)), 1e-9)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000.0)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -1,9 +1,9 @@
-import os
 import pytest
 from fastapi.testclient import TestClient
-import tempfile
 from dotenv import load_dotenv
 
+from app.api import routes
+from app.core.config import settings
 from app.main import app
 
 # Load environment variables from .env file
@@ -14,29 +14,13 @@ def client():
     return TestClient(app)
 
 @pytest.fixture(autouse=True)
-def mock_env_vars():
-    # Create temporary directories for testing
-    temp_vectordb = tempfile.mkdtemp()
-    temp_raw_data = tempfile.mkdtemp()
-    temp_processed_data = tempfile.mkdtemp()
+def mock_env_vars(tmp_path, monkeypatch):
+    # Settings are read once at import, so point the data paths at a temporary directory directly
+    monkeypatch.setattr(settings, "VECTORDB_PATH", str(tmp_path / "vectordb"))
+    monkeypatch.setattr(settings, "RAW_DATA_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr(settings, "PROCESSED_DATA_PATH", str(tmp_path / "processed"))
+    monkeypatch.setattr(settings, "INGEST_JOBS_DB", str(tmp_path / "ingest_jobs.db"))
 
-    # Store original environment variables
-    original_env = {
-        'VECTORDB_PATH': os.getenv('VECTORDB_PATH'),
-        'RAW_DATA_PATH': os.getenv('RAW_DATA_PATH'),
-        'PROCESSED_DATA_PATH': os.getenv('PROCESSED_DATA_PATH')
-    }
-
-    # Set temporary paths for testing
-    os.environ['VECTORDB_PATH'] = temp_vectordb
-    os.environ['RAW_DATA_PATH'] = temp_raw_data
-    os.environ['PROCESSED_DATA_PATH'] = temp_processed_data
-
-    yield
-    
-    # Clean up temporary directories
-    for path in [temp_vectordb, temp_raw_data, temp_processed_data]:
-        try:
-            os.rmdir(path)
-        except:
-            pass
+    # Shared instances created by the routes would keep the previous test's paths
+    monkeypatch.setattr(routes, "_rag_pipeline", None)
+    monkeypatch.setattr(routes, "_ingestion_jobs", None)
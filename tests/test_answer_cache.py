@@ -0,0 +1,70 @@
+import time
+
+from app.services.answer_cache import AnswerCache, key_tokens, normalize_query
+
+ANSWER = {"answer": "42", "sources": [], "confidence": 0.9}
+
+
+def test_normalize_query():
+    """Test that case, whitespace and trailing punctuation are ignored"""
+    assert normalize_query("  What was NVIDIA's   stock price?? ") == "what was nvidia's stock price"
+
+
+def test_exact_hit_and_invalidation():
+    """Test exact-tier hits and that invalidation drops every entry"""
+    evictions = []
+    cache = AnswerCache(on_evict=evictions.append)
+    cache.put("What is RAG?", None, ANSWER)
+
+    assert cache.get("what is rag") == ANSWER
+
+    cache.invalidate()
+    assert cache.get("What is RAG?") is None
+    assert evictions == ["invalidated"]
+
+
+def test_put_from_stale_version_is_dropped():
+    """Test that answers computed before an invalidation are not cached"""
+    cache = AnswerCache()
+    version = cache.version
+    cache.invalidate()
+    cache.put("What is RAG?", None, ANSWER, version=version)
+
+    assert len(cache) == 0
+
+
+def test_semantic_hit_within_distance():
+    """Test that a nearby query embedding returns the cached answer"""
+    cache = AnswerCache(semantic_distance=0.05)
+    cache.put("What was NVIDIA's stock price?", [1.0, 0.0, 0.0], ANSWER)
+
+    assert cache.get_semantic("What was NVIDIA's share price", [0.99, 0.05, 0.0]) == ANSWER
+    assert cache.get_semantic("What was NVIDIA's stock price?", [0.0, 1.0, 0.0]) is None
+
+
+def test_semantic_miss_when_dates_differ():
+    """Test that queries differing only in a date never share an answer, however close their embeddings"""
+    cache = AnswerCache(semantic_distance=0.05)
+    cache.put("What was the closing price on 2020-01-03?", [1.0, 0.0, 0.0], ANSWER)
+
+    assert cache.get_semantic("What was the closing price on 2020-01-06?", [1.0, 0.0, 0.0]) is None
+    assert cache.get_semantic("Closing price on 2020-01-03", [0.99, 0.05, 0.0]) == ANSWER
+    assert key_tokens("Revenue of NVDA in Q3 2023: $1,200.5M?") == {"nvda", "q3", "2023", "$1200.5m"}
+
+
+def test_lru_and_ttl_eviction():
+    """Test capacity-based LRU eviction and TTL expiry"""
+    evictions = []
+    cache = AnswerCache(max_entries=2, ttl_seconds=0.05, on_evict=evictions.append)
+    cache.put("a", None, ANSWER)
+    cache.put("b", None, ANSWER)
+    cache.get("a")
+    cache.put("c", None, ANSWER)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == ANSWER
+    assert evictions == ["capacity"]
+
+    time.sleep(0.06)
+    assert cache.get("c") is None
+    assert "expired" in evictions
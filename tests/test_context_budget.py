@@ -0,0 +1,48 @@
+from app.services.context_budget import assemble_context, dedupe_indices, pack_to_budget
+from app.services.tokens import estimate_tokens
+
+
+def test_dedupe_drops_near_duplicates_of_better_chunks():
+    """Test that a chunk nearly identical to a higher-ranked one is dropped"""
+    embeddings = [[1.0, 0.0], [0.99, 0.05], [0.0, 1.0]]
+
+    assert dedupe_indices(embeddings, 0.95) == [0, 2]
+    assert dedupe_indices(embeddings, 0.9999) == [0, 1, 2]
+
+
+def test_pack_skips_chunks_that_do_not_fit_and_truncates_an_oversized_first():
+    """Test that packing keeps the best chunks within budget and never returns an empty context"""
+    small, large = "alpha beta gamma", " ".join(["word"] * 50)
+
+    assert pack_to_budget([small, large, small], 10) == [small, "", small]
+    truncated = pack_to_budget([large], 10)[0]
+    assert estimate_tokens(truncated) == 10
+    assert large.startswith(truncated)
+
+
+def test_assemble_reports_tokens_saved_and_applies_rerank():
+    """Test that assembly dedupes, reorders with the reranker and reports the tokens it saved"""
+    documents = ["first chunk about revenue", "first chunk about revenue!", "second chunk on margins"]
+    embeddings = [[1.0, 0.0], [1.0, 0.01], [0.0, 1.0]]
+
+    assembled = assemble_context(
+        documents,
+        embeddings,
+        max_tokens=100,
+        max_similarity=0.95,
+        rerank=lambda texts: list(reversed(range(len(texts))))
+    )
+
+    assert assembled.indices == [2, 0]
+    assert assembled.duplicates == [1]
+    assert assembled.texts == [documents[2], documents[0]]
+    assert assembled.tokens_saved == estimate_tokens("\n".join(documents)) - estimate_tokens("\n".join(assembled.texts))
+    assert assembled.tokens_saved > 0
+
+
+def test_assemble_without_embeddings_only_packs():
+    """Test that chunks without embeddings are kept and only the budget applies"""
+    assembled = assemble_context(["a b c", "d e f"], None, max_tokens=3, max_similarity=0.5)
+
+    assert assembled.indices == [0]
+    assert assembled.duplicates == []
@@ -0,0 +1,56 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+def _mock_embeddings():
+    embeddings = MagicMock()
+    embeddings.embed_documents.side_effect = lambda texts: [[float(len(t))] for t in texts]
+    return embeddings
+
+
+def test_concurrent_queries_share_one_batch():
+    """Test that concurrent queries are embedded with a single embed_documents call"""
+    embeddings = _mock_embeddings()
+    batcher = EmbeddingBatcher(embeddings.embed_documents, max_batch_size=32, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed_query("q" * i) for i in range(1, 6)))
+
+    vectors = asyncio.run(run())
+
+    assert embeddings.embed_documents.call_count == 1
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+
+
+def test_batches_split_at_max_batch_size():
+    """Test that a full batch is flushed without waiting for the timer"""
+    embeddings = _mock_embeddings()
+    batcher = EmbeddingBatcher(embeddings.embed_documents, max_batch_size=2, max_wait_ms=1000)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.embed_query(f"query {i}") for i in range(4))),
+            timeout=0.5
+        )
+
+    asyncio.run(run())
+
+    assert embeddings.embed_documents.call_count == 2
+
+
+def test_batch_errors_reach_every_caller():
+    """Test that an embedding failure is raised to all callers in the batch"""
+    embeddings = MagicMock()
+    embeddings.embed_documents.side_effect = RuntimeError("model unavailable")
+    batcher = EmbeddingBatcher(embeddings.embed_documents)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.embed_query("a"), batcher.embed_query("b"), return_exceptions=True
+        )
+
+    errors = asyncio.run(run())
+
+    assert all(isinstance(e, RuntimeError) for e in errors)
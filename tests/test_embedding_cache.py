@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from app.services.embedding_cache import KEY_SIZE, EmbeddingCache
+
+
+def test_cache_returns_stored_vectors_and_misses(tmp_path):
+    """Test that cached texts return their vectors and unknown texts return None"""
+    cache = EmbeddingCache(str(tmp_path), "model-a", dtype="float32")
+    cache.put_many(["alpha", "beta"], [[1.0, 2.0], [3.0, 4.0]])
+
+    assert cache.get_many(["beta", "gamma", "alpha"]) == [[3.0, 4.0], None, [1.0, 2.0]]
+    assert len(cache) == 2
+
+
+def test_cache_persists_across_instances_and_keys_on_model(tmp_path):
+    """Test that vectors survive a restart and are not shared between models"""
+    EmbeddingCache(str(tmp_path), "model-a").put_many(["alpha", "alpha"], [[0.5, 0.25], [0.5, 0.25]])
+
+    reopened = EmbeddingCache(str(tmp_path), "model-a")
+    assert len(reopened) == 1
+    assert reopened.get_many(["alpha"]) == [[0.5, 0.25]]
+    assert EmbeddingCache(str(tmp_path), "model-b").get_many(["alpha"]) == [None]
+
+
+def test_float16_storage_is_compact(tmp_path):
+    """Test that float16 storage uses two bytes per dimension within float16 precision"""
+    vector = np.linspace(-1, 1, 384).tolist()
+    cache = EmbeddingCache(str(tmp_path), "model-a", dtype="float16")
+    cache.put_many(["alpha"], [vector])
+
+    assert (tmp_path / "vectors.bin").stat().st_size == 384 * 2
+    assert np.allclose(cache.get_many(["alpha"])[0], vector, atol=1e-3)
+    with pytest.raises(ValueError):
+        len(EmbeddingCache(str(tmp_path), "model-a", dtype="float32"))
+
+
+def test_interrupted_append_is_discarded(tmp_path):
+    """Test that a vector written without its key is dropped and later rows stay aligned"""
+    cache = EmbeddingCache(str(tmp_path), "model-a", dtype="float32")
+    cache.put_many(["alpha"], [[1.0, 1.0]])
+    with open(tmp_path / "vectors.bin", "ab") as f:
+        f.write(np.array([9.0, 9.0], dtype=np.float32).tobytes())
+    with open(tmp_path / "keys.bin", "ab") as f:
+        f.write(b"\0" * (KEY_SIZE // 2))
+
+    reopened = EmbeddingCache(str(tmp_path), "model-a", dtype="float32")
+    reopened.put_many(["beta"], [[2.0, 2.0]])
+    assert reopened.get_many(["alpha", "beta"]) == [[1.0, 1.0], [2.0, 2.0]]
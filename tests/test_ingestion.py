@@ -0,0 +1,116 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.services.ingestion import (
+    batched,
+    chunk_id,
+    hash_file,
+    iter_csv_documents,
+    iter_documents,
+    iter_pdf_documents,
+    iter_pdf_pages,
+    split_text
+)
+from app.services.tokens import estimate_tokens
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+
+
+def test_batched_preserves_order():
+    """Test that batched yields fixed-size lists with a short tail"""
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_chunk_ids_are_stable_per_chunk():
+    """Test that chunk IDs derive from the document and chunk text, not position or upload order"""
+    file_hash = hash_file(str(EXAMPLES_DIR / "nvda_stock_data.csv"))
+
+    assert file_hash == hash_file(str(EXAMPLES_DIR / "nvda_stock_data.csv"))
+    assert chunk_id("a.csv", "row") == chunk_id("a.csv", "row", 0)
+    assert len({chunk_id("a.csv", "row"), chunk_id("a.csv", "row", 1), chunk_id("b.csv", "row"), chunk_id("a.csv", "row 2")}) == 4
+
+
+def test_iter_documents_streams_csv_rows():
+    """Test that CSV rows are parsed lazily into documents"""
+    documents = iter_documents(str(EXAMPLES_DIR / "nvda_stock_data.csv"), ".csv")
+    text, metadata = next(documents)
+
+    assert "Close" in text
+    assert sum(1 for _ in documents) == 1091
+
+
+def test_csv_grouping_is_independent_of_read_chunks():
+    """Test that row groups carried across read chunks match a single-chunk read"""
+    path = str(EXAMPLES_DIR / "nvda_stock_data.csv")
+
+    assert list(iter_csv_documents(path, rows_per_chunk=5, chunksize=7)) == list(iter_csv_documents(path, rows_per_chunk=5))
+    assert list(iter_csv_documents(path, period="week", chunksize=3)) == list(iter_csv_documents(path, period="week"))
+
+
+
+def test_csv_period_groups_are_capped():
+    """Test that a wide period is cut into documents of at most max_group_rows rows, however the file is read"""
+    path = str(EXAMPLES_DIR / "nvda_stock_data.csv")
+    documents = list(iter_csv_documents(path, period="year", max_group_rows=100, chunksize=30))
+
+    assert documents == list(iter_csv_documents(path, period="year", max_group_rows=100))
+    assert max(metadata["rows"] for _, metadata in documents) == 100
+    assert sum(metadata["rows"] for _, metadata in documents) == 1092
+    assert documents[1][1]["row_start"] == 100
+
+def test_csv_monthly_grouping_records_date_range():
+    """Test that period grouping emits one document per month with its date range"""
+    documents = list(iter_csv_documents(str(EXAMPLES_DIR / "nvda_stock_data.csv"), period="month"))
+    text, metadata = documents[0]
+
+    assert len(documents) == 53
+    assert metadata == {
+        "row_start": 0, "rows": 21, "date_start": "2020-01-02", "date_end": "2020-01-31",
+        "day_start": 20200102, "day_end": 20200131
+    }
+    assert text.count("\n") == 20
+
+
+def test_split_text_respects_token_limit_and_overlap():
+    """Test that chunks stay within the token limit, overlap, and end on sentence boundaries"""
+    text = " ".join(f"Sentence number {i} talks about topic {i}." for i in range(100))
+    spans = list(split_text(text, chunk_tokens=50, overlap_tokens=10))
+
+    assert all(estimate_tokens(text[start:end]) <= 50 for start, end in spans)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert all(next_start < end for (_, end), (next_start, _) in zip(spans, spans[1:]))
+    assert all(text[end - 1] == "." for _, end in spans)
+
+
+def test_pdf_chunks_carry_page_and_offsets():
+    """Test that PDF pages are split into bounded chunks that map back to the page text"""
+    path = str(EXAMPLES_DIR / "NVIDIAAn.pdf")
+    pages = {metadata["page"]: text for text, metadata in iter_pdf_documents(path)}
+    chunks = list(iter_pdf_documents(path, chunk_tokens=200, overlap_tokens=40))
+
+    assert len(chunks) > len(pages)
+    for text, metadata in chunks:
+        assert estimate_tokens(text) <= 200
+        assert pages[metadata["page"]][metadata["char_start"]:metadata["char_end"]] == text
+    assert "784GB" in "".join(text for text, _ in chunks)
+
+
+def test_csv_groups_split_to_token_limit():
+    """Test that oversized row groups are cut into runs of whole rows"""
+    path = str(EXAMPLES_DIR / "nvda_stock_data.csv")
+    documents = list(iter_csv_documents(path, period="month", max_tokens=250))
+
+    assert len(documents) > 53
+    assert all(estimate_tokens(text) <= 250 or metadata["rows"] == 1 for text, metadata in documents)
+    assert sum(metadata["rows"] for _, metadata in documents) == 1092
+    assert documents[1][1]["row_start"] == documents[0][1]["rows"]
+
+
+def test_parallel_pdf_extraction_keeps_page_order():
+    """Test that page ranges parsed in worker processes are merged back in page order"""
+    path = str(EXAMPLES_DIR / "NVIDIAAn.pdf")
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        pages = list(iter_pdf_pages(path, executor, max_pending=2, pages_per_task=1))
+
+    assert pages == list(iter_pdf_pages(path))
+    assert [number for number, _ in pages] == [1, 2]
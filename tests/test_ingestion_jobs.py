@@ -0,0 +1,168 @@
+import asyncio
+import io
+from unittest.mock import patch
+
+import pytest
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+
+from app.api.routes import get_ingestion_jobs
+from app.core.config import settings
+from app.main import app
+from app.services.ingestion_jobs import IngestionJobs, IngestionQueueFull, JobStore
+
+
+class FakePipeline:
+    """Stands in for RAGPipeline: saves uploads and 'ingests' them in three batches."""
+
+    def __init__(self, directory, fail=False, gate=None):
+        self.directory = directory
+        self.fail = fail
+        self.gate = gate
+
+    async def save_upload(self, file, collection=None):
+        path = self.directory / file.filename
+        path.write_bytes(file.file.read())
+        return str(path), "hash"
+
+    async def ingest_file(self, path, source, file_hash=None, on_progress=None, collection=None):
+        if self.gate is not None:
+            await self.gate.wait()
+        for batch in range(1, 4):
+            on_progress({"parsed": batch * 10, "embedded": batch * 10, "stored": batch * 10})
+            await asyncio.sleep(0)
+        if self.fail:
+            raise ValueError("embedding failed")
+        return {"message": "Successfully ingested 30 documents"}
+
+
+def _upload(name="notes.pdf"):
+    return UploadFile(file=io.BytesIO(b"%PDF"), filename=name)
+
+
+async def _wait_for(jobs, job_id, status):
+    for _ in range(100):
+        job = await jobs.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+def test_job_reports_progress_and_result(tmp_path):
+    """Test that a submitted job returns at once and records progress until completion"""
+    async def run():
+        jobs = IngestionJobs(FakePipeline(tmp_path), JobStore(str(tmp_path / "jobs.db")))
+        queued = await jobs.submit(_upload())
+        done = await _wait_for(jobs, queued["job_id"], "completed")
+        await jobs.stop()
+        return queued, done
+
+    queued, done = asyncio.run(run())
+    assert queued["status"] == "queued"
+    assert "path" not in queued
+    assert done["progress"] == {"parsed": 30, "embedded": 30, "stored": 30}
+    assert done["result"]["message"] == "Successfully ingested 30 documents"
+    assert done["error"] is None
+
+
+def test_failed_job_records_error(tmp_path):
+    """Test that an ingestion error marks the job failed with the message"""
+    async def run():
+        jobs = IngestionJobs(FakePipeline(tmp_path, fail=True), JobStore(str(tmp_path / "jobs.db")))
+        job = await jobs.submit(_upload())
+        failed = await _wait_for(jobs, job["job_id"], "failed")
+        await jobs.stop()
+        return failed
+
+    failed = asyncio.run(run())
+    assert failed["error"] == "embedding failed"
+    assert failed["progress"]["stored"] == 30
+
+
+def test_full_queue_rejects_uploads(tmp_path):
+    """Test that uploads beyond the queue bound are refused"""
+    async def run():
+        gate = asyncio.Event()
+        jobs = IngestionJobs(FakePipeline(tmp_path, gate=gate), JobStore(str(tmp_path / "jobs.db")), max_queued=1)
+        await jobs.submit(_upload("a.pdf"))  # picked up by the worker
+        await asyncio.sleep(0)
+        await jobs.submit(_upload("b.pdf"))  # waits in the queue
+        with pytest.raises(IngestionQueueFull):
+            await jobs.submit(_upload("c.pdf"))
+        gate.set()
+        await jobs.stop()
+
+    asyncio.run(run())
+
+
+
+def test_concurrent_uploads_cannot_overfill_the_queue(tmp_path):
+    """Test that uploads saved at the same time count against the queue bound"""
+    async def run():
+        gate = asyncio.Event()
+        jobs = IngestionJobs(FakePipeline(tmp_path, gate=gate), JobStore(str(tmp_path / "jobs.db")), max_queued=2)
+        results = await asyncio.gather(
+            *(jobs.submit(_upload(f"{name}.pdf")) for name in "abcd"), return_exceptions=True
+        )
+        gate.set()
+        await jobs.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert sum(isinstance(result, IngestionQueueFull) for result in results) == 2
+
+
+def test_worker_survives_job_store_errors(tmp_path):
+    """Test that a job whose status cannot be recorded does not stop later jobs"""
+    class FlakyStore(JobStore):
+        def update(self, job_id, **fields):
+            if fields.get("status") == "running" and not hasattr(self, "failed"):
+                self.failed = True
+                raise OSError("disk full")
+            super().update(job_id, **fields)
+
+    async def run():
+        jobs = IngestionJobs(FakePipeline(tmp_path), FlakyStore(str(tmp_path / "jobs.db")))
+        await jobs.submit(_upload("a.pdf"))
+        second = await jobs.submit(_upload("b.pdf"))
+        done = await _wait_for(jobs, second["job_id"], "completed")
+        await jobs.stop()
+        return done
+
+    assert asyncio.run(run())["progress"]["stored"] == 30
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    """Test that a job left running by a previous process is picked up again on start"""
+    store = JobStore(str(tmp_path / "jobs.db"))
+    (tmp_path / "report.csv").write_text("a,b\n1,2\n")
+    job_id = store.create("report.csv", str(tmp_path / "report.csv"), "hash")
+    store.update(job_id, status="running", stored=5)
+    missing_id = store.create("gone.csv", str(tmp_path / "gone.csv"), "hash")
+
+    async def run():
+        jobs = IngestionJobs(FakePipeline(tmp_path), store)
+        await jobs.start()
+        done = await _wait_for(jobs, job_id, "completed")
+        await jobs.stop()
+        return done
+
+    assert asyncio.run(run())["progress"]["stored"] == 30
+    assert store.get(missing_id)["status"] == "failed"
+
+
+def test_ingest_endpoint_returns_job_and_status(tmp_path):
+    """Test that the upload endpoint answers 202 with a job that the status endpoint reports"""
+    jobs = IngestionJobs(FakePipeline(tmp_path), JobStore(str(tmp_path / "jobs.db")))
+    with patch.dict(app.dependency_overrides, {get_ingestion_jobs: lambda: jobs}), \
+            patch("app.main.get_ingestion_jobs", return_value=jobs), \
+            patch.object(settings, "WARMUP_ON_STARTUP", False), \
+            TestClient(app) as client:
+        response = client.post("/api/ingest/document", files={"file": ("notes.pdf", b"%PDF", "application/pdf")})
+        assert response.status_code == 202
+        job_id = response.json()["details"]["job_id"]
+
+        status = client.get(f"/api/ingest/jobs/{job_id}")
+        assert status.status_code == 200
+        assert status.json()["job_id"] == job_id
+        assert client.get("/api/ingest/jobs/unknown").status_code == 404
@@ -0,0 +1,102 @@
+import threading
+from unittest.mock import patch
+
+from app.services import lexical_index
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+ROWS = {
+    "r1": "Date: 2020-01-02, Open: 5.97, Close: 5.99, Volume: 237536000",
+    "r2": "Date: 2020-01-03, Open: 5.88, Close: 5.87, Volume: 205384000",
+    "r3": "Date: 2020-01-06, Open: 5.81, Close: 5.90, Volume: 262636000",
+    "p1": "NVIDIA announced record revenue for the data center segment.",
+}
+
+
+def _index(directory):
+    index = LexicalIndex(str(directory))
+    index.add(list(ROWS), list(ROWS.values()))
+    index.commit()
+    return index
+
+
+def test_tokenize_keeps_dates_and_figures_whole():
+    """Test that dates, decimals and tickers are single terms"""
+    assert tokenize("NVDA closed at 5.87 on 2020-01-03.") == ["nvda", "closed", "at", "5.87", "on", "2020-01-03"]
+
+
+def test_search_ranks_exact_terms_first(tmp_path):
+    """Test that BM25 ranks the chunk with the exact date and figure first"""
+    index = _index(tmp_path)
+
+    assert index.search("close on 2020-01-03")[0][0] == "r2"
+    assert index.search("data center revenue")[0][0] == "p1"
+    assert index.search("unrelated words") == []
+
+
+def test_index_persists_and_updates_incrementally(tmp_path):
+    """Test that a reopened index sees committed segments, re-added IDs replace old text and deletes apply"""
+    _index(tmp_path)
+
+    index = LexicalIndex(str(tmp_path))
+    assert len(index) == 4
+    index.add(["r2"], ["Date: 2020-01-03, note: halted"])
+    index.delete(["p1"])
+    index.commit()
+
+    reopened = LexicalIndex(str(tmp_path))
+    assert len(reopened) == 3
+    assert [doc_id for doc_id, _ in reopened.search("halted")] == ["r2"]
+    assert reopened.search("5.88") == []
+    assert reopened.search("revenue") == []
+
+
+def test_segments_are_merged(tmp_path):
+    """Test that segments beyond the limit are merged without losing live documents"""
+    with patch.object(lexical_index, "MAX_SEGMENTS", 2):
+        index = LexicalIndex(str(tmp_path))
+        for doc_id, text in ROWS.items():
+            index.add([doc_id], [text])
+            index.commit()
+        index.add(["r1"], ["Date: 2020-01-02, note: merged"])
+        index.commit()
+
+    reopened = LexicalIndex(str(tmp_path))
+    assert len(list(tmp_path.glob("seg_*"))) <= 2
+    assert len(reopened) == 4
+    assert reopened.search("merged")[0][0] == "r1"
+    assert reopened.search("2020-01-06")[0][0] == "r3"
+
+
+
+def test_searches_see_a_consistent_snapshot_during_commits(tmp_path):
+    """Test that searches running while segments are replaced and merged keep returning the live copies"""
+    errors = []
+    with patch.object(lexical_index, "MAX_SEGMENTS", 2):
+        index = _index(tmp_path)
+
+        def search():
+            for _ in range(200):
+                try:
+                    hits = dict(index.search("2020-01-03 revenue"))
+                    assert set(hits) == {"r2", "p1"}
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=search) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for round_ in range(20):
+            index.add(["p1"], [f"{ROWS['p1']} Update {round_}."])
+            index.commit()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+
+def test_reciprocal_rank_fusion_weights():
+    """Test that fusion favours IDs ranked by both retrievers and respects weights"""
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], [1.0, 1.0], k=60)
+    assert fused[0][0] == "c"
+
+    vector_only = reciprocal_rank_fusion([["a", "b"], ["d"]], [1.0, 0.0], k=60)
+    assert [doc_id for doc_id, _ in vector_only] == ["a", "b"]
@@ -0,0 +1,105 @@
+import asyncio
+from typing import Any, AsyncIterator, List, Optional, Union
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.services.llm_gateway import CircuitBreaker, ExtractiveChatModel, LLMBackend, LLMGateway, LLMUnavailable
+
+MESSAGES = [SystemMessage(content="Use the following context: NVDA closed at 495.22."), HumanMessage(content="Price?")]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Answers ``answer`` after the next delay in ``delays``; an exception in its place is raised instead."""
+
+    answer: str = "scripted answer"
+    delays: List[Union[float, Exception]] = []
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        delay = self.delays[self.calls] if self.calls < len(self.delays) else 0.0
+        self.calls += 1
+        if isinstance(delay, Exception):
+            raise delay
+        await asyncio.sleep(delay)
+        for word in self.answer.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+def _answer(gateway: LLMGateway) -> str:
+    return asyncio.run(gateway.ainvoke(MESSAGES)).content.strip()
+
+
+def test_failed_backend_falls_back_to_the_next():
+    """Test that an error or a missed deadline before the first token moves the request to the next backend"""
+    failing = ScriptedChatModel(delays=[RuntimeError("429 Too Many Requests")])
+    slow = ScriptedChatModel(delays=[1.0])
+    gateway = LLMGateway(backends=[
+        LLMBackend("failing", failing),
+        LLMBackend("slow", slow, timeout_seconds=0.05),
+        LLMBackend("local", ExtractiveChatModel())
+    ])
+
+    answer = _answer(gateway)
+
+    assert answer.endswith("NVDA closed at 495.22.")
+    assert failing.calls == slow.calls == 1
+
+
+def test_every_backend_failing_raises_unavailable():
+    """Test that the gateway raises LLMUnavailable with each backend's error"""
+    gateway = LLMGateway(backends=[LLMBackend("failing", ScriptedChatModel(delays=[RuntimeError("rate limited")]))])
+
+    with pytest.raises(LLMUnavailable, match="failing: rate limited"):
+        _answer(gateway)
+
+
+def test_slow_first_token_is_hedged():
+    """Test that a request with no token after the p95 delay is hedged and the faster answer wins"""
+    primary = ScriptedChatModel(answer="primary", delays=[1.0])
+    secondary = ScriptedChatModel(answer="secondary")
+    backend = LLMBackend("primary", primary)
+    backend.first_token_times.extend([0.01] * 20)
+    gateway = LLMGateway(backends=[backend, LLMBackend("secondary", secondary)], hedge_min_delay_ms=20)
+
+    answer = _answer(gateway)
+
+    assert answer == "secondary"
+    assert primary.calls == secondary.calls == 1
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """Test that the breaker opens after consecutive failures and closes after a successful trial"""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow()  # the one trial request
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_open_circuit_skips_backend():
+    """Test that a backend whose breaker is open is not called"""
+    primary = ScriptedChatModel(answer="primary")
+    backend = LLMBackend("primary", primary, breaker=CircuitBreaker(failure_threshold=1))
+    backend.breaker.record_failure()
+    gateway = LLMGateway(backends=[backend, LLMBackend("fallback", ScriptedChatModel(answer="fallback"))])
+
+    assert _answer(gateway) == "fallback"
+    assert primary.calls == 0
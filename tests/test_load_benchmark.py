@@ -0,0 +1,50 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from tests.benchmarks.bench_load import LatencyHistogram, arrival_times, load_questions
+from tests.benchmarks.fakes import FakeChatModel, FakeEmbeddings
+
+
+def test_latency_histogram_percentiles_within_one_percent():
+    """Test that HDR-style buckets keep percentiles within 1% of the exact values"""
+    values = np.random.default_rng(0).lognormal(mean=-2.0, sigma=1.0, size=20_000)
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(float(value))
+
+    for percentile in (50, 90, 99, 99.9):
+        exact = float(np.percentile(values, percentile, method="inverted_cdf"))
+        assert histogram.percentile(percentile) == pytest.approx(exact, rel=0.01)
+    assert histogram.percentile(100) == histogram.max == values.max()
+    assert len(histogram.counts) < len(values) / 4
+
+
+def test_arrival_schedules():
+    """Test that each arrival mode offers the requested load over the run"""
+    constant = arrival_times("constant", rate=10, duration=5)
+    poisson = arrival_times("poisson", rate=200, duration=10, seed=1)
+    ramp = arrival_times("ramp", rate=10, duration=10, ramp_to=30)
+
+    assert len(constant) == 50 and np.allclose(np.diff(constant), 0.1)
+    assert len(poisson) == pytest.approx(2000, rel=0.05) and poisson.max() < 10
+    assert len(ramp) == 200 and ramp.max() < 10
+    # The rate climbs by 2/s every second: about 11 arrivals in the first second, 29 in the last
+    assert np.sum(ramp < 1) == pytest.approx(11, abs=1)
+    assert np.sum(ramp >= 9) == pytest.approx(29, abs=1)
+
+
+def test_fakes_are_deterministic():
+    """Test that the fake LLM streams the same answer for the same prompt and the fake embedder is normalized"""
+    model = FakeChatModel(first_token_ms=0, tokens_per_second=1e6, answer_tokens=10, chunk_tokens=3)
+
+    async def stream():
+        return [chunk.content async for chunk in model.astream("NVIDIA revenue grew in Q3")]
+
+    chunks = asyncio.run(stream())
+    assert len(chunks) == 4
+    assert "".join(chunks).strip() == model.invoke("NVIDIA revenue grew in Q3").content
+    vector = FakeEmbeddings(call_ms=0, text_ms=0).embed_query("closing price")
+    assert len(vector) == 384 and np.linalg.norm(vector) == pytest.approx(1.0)
+    assert len(load_questions()) > 40
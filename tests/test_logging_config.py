@@ -0,0 +1,66 @@
+import json
+import logging
+import re
+import sys
+from unittest.mock import patch
+
+from app.core.config import settings
+from app.core.logging_config import JsonFormatter, TraceSamplingFilter, setup_logging, stop_logging
+from app.core.tracing import trace_id_var
+
+
+def _record(level=logging.INFO, trace_id="", exc_info=None):
+    record = logging.LogRecord("app.services.rag_pipeline", level, __file__, 1, "Processing query: %s", ("q",), exc_info)
+    record.trace_id = trace_id
+    return record
+
+
+def test_json_records_match_the_fluentd_parser():
+    """Test that records are single-line JSON with a UTC timestamp in fluentd's time_format"""
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = _record(logging.ERROR, trace_id="abc123", exc_info=sys.exc_info())
+
+    line = JsonFormatter().format(record)
+    entry = json.loads(line)
+
+    assert "\n" not in line
+    assert re.fullmatch(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{6}Z", entry["timestamp"])
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "app.services.rag_pipeline"
+    assert entry["message"] == "Processing query: q"
+    assert entry["trace_id"] == "abc123"
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_sampling_keeps_whole_requests_and_every_warning():
+    """Test that INFO records are sampled per trace ID while warnings and untraced records are kept"""
+    sample = TraceSamplingFilter(0.25)
+    kept = [trace_id for trace_id in (f"trace-{i}" for i in range(2000)) if sample.filter(_record(trace_id=trace_id))]
+
+    assert 400 < len(kept) < 600
+    assert all(sample.filter(_record(trace_id=trace_id)) for trace_id in kept)
+    assert not TraceSamplingFilter(0.0).filter(_record(trace_id="trace-1"))
+    assert TraceSamplingFilter(0.0).filter(_record(logging.WARNING, trace_id="trace-1"))
+    assert TraceSamplingFilter(0.0).filter(_record())
+
+
+def test_queued_records_are_written_with_trace_ids(tmp_path):
+    """Test that records go through the queue to the log file, tagged with the request's trace ID"""
+    log_file = tmp_path / "app.log"
+    try:
+        with patch.object(settings, "LOG_FILE", str(log_file)), patch.object(settings, "LOG_ASYNC", True):
+            setup_logging()
+            token = trace_id_var.set("trace-42")
+            try:
+                logging.getLogger("app.services.test").info("Retrieved %d relevant documents", 3)
+            finally:
+                trace_id_var.reset(token)
+            stop_logging()
+
+        entry = json.loads(log_file.read_text().splitlines()[-1])
+        assert entry["message"] == "Retrieved 3 relevant documents"
+        assert entry["trace_id"] == "trace-42"
+    finally:
+        setup_logging()
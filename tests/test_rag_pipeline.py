@@ -1,10 +1,27 @@
+import asyncio
+import io
+import json
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 import tempfile
 import os
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
-from app.services.rag_pipeline import RAGPipeline
+from fastapi import UploadFile
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from prometheus_client import REGISTRY
+from app.api.routes import get_rag_pipeline
+from app.models.query import QueryRequest
+from app.core.config import settings
+from app.services.rag_pipeline import AgentState, RAGPipeline
+from app.services.structured_data import StructuredStore
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
 
 client = TestClient(app)
 
@@ -14,30 +31,495 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
 
-@patch('app.services.rag_pipeline.ChatGroq')
-@patch('app.services.rag_pipeline.HuggingFaceEmbeddings')
-def test_query_endpoint_with_context(mock_embeddings, mock_chat):
+@pytest.fixture
+def models():
+    """Offline fakes for the embedder, the Groq model and the Chroma client the pipeline loads"""
+    with patch('app.services.rag_pipeline.PersistentClient') as mock_client, \
+            patch('app.services.rag_pipeline.ChatGroq') as mock_chat, \
+            patch('app.services.rag_pipeline.HuggingFaceEmbeddings') as mock_embeddings:
+        mock_embeddings_instance = MagicMock()
+        mock_embeddings.return_value = mock_embeddings_instance
+        mock_embeddings_instance.embed_query.return_value = [0.1] * 384
+        mock_embeddings_instance.embed_documents.side_effect = lambda texts: [[0.1] * 384 for _ in texts]
+        mock_chat.return_value = FakeListChatModel(responses=["Test response"])
+
+        mock_collection = MagicMock()
+        mock_client.return_value.get_or_create_collection.return_value = mock_collection
+        mock_collection.query.return_value = {
+            "ids": [["a_0", "b_0"]],
+            "documents": [["doc a", "doc b"]],
+            "metadatas": [[{"source": "a.csv"}, {"source": "b.pdf"}]],
+            "distances": [[0.2, 0.4]]
+        }
+        yield SimpleNamespace(
+            embeddings_class=mock_embeddings,
+            embeddings=mock_embeddings_instance,
+            chat=mock_chat,
+            client=mock_client,
+            collection=mock_collection
+        )
+
+@pytest.fixture
+def pipeline(request, models, monkeypatch):
+    """A RAGPipeline over the offline models; parametrize indirectly with settings to build it with"""
+    for name, value in getattr(request, "param", {}).items():
+        monkeypatch.setattr(settings, name, value)
+    return RAGPipeline()
+
+@pytest.fixture
+def api(pipeline):
+    """The test client, with the API served by ``pipeline``"""
+    with patch.dict(app.dependency_overrides, {get_rag_pipeline: lambda: pipeline}):
+        yield client
+
+NUMPY_STORE = {"VECTOR_STORE": "numpy", "STRUCTURED_QUERIES_ENABLED": False}
+
+def test_pipeline_loads_components_lazily(models, pipeline):
+    """Test that constructing the pipeline loads no model until it is used or warmed up"""
+    models.embeddings_class.assert_not_called()
+    models.chat.assert_not_called()
+    models.client.assert_not_called()
+    assert not pipeline.ready
+
+    asyncio.run(pipeline.warm_up())
+
+    assert pipeline.ready
+    models.embeddings_class.assert_called_once()
+    models.chat.assert_called_once()
+    models.client.assert_called_once()
+
+def test_ready_endpoint_follows_warm_up(models, pipeline):
+    """Test that /ready reports warming up until the startup warm-up finishes"""
+    model_loaded = threading.Event()
+    models.embeddings.embed_query.side_effect = lambda text: model_loaded.wait(5) and [0.1] * 384
+
+    with patch.dict(app.dependency_overrides, {get_rag_pipeline: lambda: pipeline}), \
+            patch('app.main.get_rag_pipeline', return_value=pipeline), \
+            TestClient(app) as lifespan_client:
+        warming_up = lifespan_client.get("/ready")
+        assert lifespan_client.get("/health").status_code == 200
+
+        model_loaded.set()
+        for _ in range(100):
+            if pipeline.ready:
+                break
+            time.sleep(0.01)
+        ready = lifespan_client.get("/ready")
+
+    assert warming_up.status_code == 503
+    assert warming_up.json() == {"status": "warming_up"}
+    assert ready.status_code == 200
+    assert ready.json() == {"status": "ready"}
+
+def test_query_endpoint_with_context(api):
     """Test query endpoint with context retrieval"""
-    # Mock embeddings
-    mock_embeddings_instance = MagicMock()
-    mock_embeddings.return_value = mock_embeddings_instance
-    mock_embeddings_instance.embed_query.return_value = [0.1] * 384  # MiniLM embedding size
-    mock_embeddings_instance.embed_documents.return_value = [[0.1] * 384]  # Mock document embeddings
-    
-    # Mock chat completion
-    mock_chat_instance = MagicMock()
-    mock_chat.return_value = mock_chat_instance
-    mock_chat_instance.invoke.return_value = "Test response based on context"
-    
     # Test query with context
     query_data = {"text": "What is RAG?"}
-    response = client.post("/api/query", json=query_data)
-    
+    response = api.post("/api/query", json=query_data)
+
     assert response.status_code == 200
     assert "answer" in response.json()
     assert "sources" in response.json()
     assert "confidence" in response.json()
 
+def test_query_retrieves_once(models, pipeline):
+    """Test that a query embeds and searches the vector store exactly once"""
+    result = asyncio.run(pipeline.process_query("What is RAG?"))
+
+    assert models.embeddings.embed_documents.call_count == 1
+    assert models.collection.query.call_count == 1
+    assert result["answer"] == "Test response"
+    assert [s["document_id"] for s in result["sources"]] == ["a.csv", "b.pdf"]
+    assert result["confidence"] == pytest.approx(0.7)
+
+def test_query_reports_stage_timings_and_trace_id(api):
+    """Test that per-stage timings are returned on request and the trace ID is echoed"""
+    response = api.post(
+        "/api/query",
+        json={"text": "What is RAG?", "include_timings": True},
+        headers={"X-Request-ID": "trace-123"}
+    )
+    plain = api.post("/api/query", json={"text": "Something else"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"] == "trace-123"
+    timings = response.json()["timings"]
+    for stage in ("embedding", "vector_search", "prompt_build", "llm_first_token", "llm_total", "total"):
+        assert timings[stage] >= 0
+    assert timings["total"] >= timings["llm_total"]
+    assert plain.json()["timings"] is None
+    assert plain.headers["X-Request-ID"]
+
+def test_repeated_query_served_from_cache(models, pipeline):
+    """Test that a repeated query skips retrieval and the LLM until the collection changes"""
+    first = asyncio.run(pipeline.process_query("What is RAG?"))
+    second = asyncio.run(pipeline.process_query("what is rag"))
+
+    assert {**second, "timings": None} == {**first, "timings": None}
+    assert models.collection.query.call_count == 1
+
+    pipeline.answer_cache.invalidate()
+    asyncio.run(pipeline.process_query("What is RAG?"))
+    assert models.collection.query.call_count == 2
+
+def test_concurrent_queries_overlap(models, pipeline):
+    """Test that blocking vector search runs off the event loop so queries overlap"""
+    results = models.collection.query.return_value
+
+    def slow_query(**kwargs):
+        time.sleep(0.2)
+        return results
+    models.collection.query.side_effect = slow_query
+
+    async def run_queries():
+        return await asyncio.gather(*(pipeline.process_query(f"query {i}") for i in range(4)))
+
+    start_time = time.perf_counter()
+    results = asyncio.run(run_queries())
+    elapsed = time.perf_counter() - start_time
+
+    assert len(results) == 4
+    assert elapsed < 0.6  # serial execution would take at least 0.8s
+
+def test_concurrent_identical_queries_share_one_llm_call(models, pipeline):
+    """Test that identical in-flight queries, regular and streamed, are answered by one LLM call"""
+    models.chat.return_value = FakeListChatModel(responses=["Test response"], sleep=0.01)
+    generate = pipeline._generate
+    calls = []
+    pipeline._generate = lambda prompt: calls.append(prompt) or generate(prompt)
+
+    async def stream(query):
+        return "".join([event["data"] async for event in pipeline.stream_query(query) if event["event"] == "token"])
+
+    async def run_queries():
+        queries = [pipeline.process_query(query) for query in ("What is RAG?", "what is RAG", " What is  RAG? ")]
+        return await asyncio.gather(*queries, stream("What is RAG?"))
+
+    coalesced = REGISTRY.get_sample_value("rag_llm_calls_coalesced_total")
+    *results, streamed = asyncio.run(run_queries())
+
+    assert len(calls) == 1
+    assert REGISTRY.get_sample_value("rag_llm_calls_coalesced_total") - coalesced == 3
+    assert [result["answer"] for result in results] == ["Test response"] * 3
+    assert streamed == "Test response"
+
+    # Once the call has finished, a new query makes a new one
+    with patch.object(settings, "ANSWER_CACHE_MAX_ENTRIES", 0):
+        asyncio.run(pipeline.process_query("What is RAG?", fusion={"k": 10}))
+    assert len(calls) == 2
+
+@pytest.mark.parametrize("pipeline, status, expected", [
+    ({"LLM_BACKENDS": "groq:llama3-70b-8192,local"}, 200, "doc a doc b"),
+    ({"LLM_BACKENDS": "groq:llama3-70b-8192"}, 503, "All LLM backends failed")
+], indirect=["pipeline"])
+def test_llm_failures_fall_back_or_return_503(models, api, status, expected):
+    """Test that a failing Groq model falls back to the local stand-in, and is a 503 without one"""
+    models.chat.return_value = FakeListChatModel(responses=["unused"], error_on_chunk_number=0)
+    response = api.post("/api/query", json={"text": "What is RAG?"})
+
+    assert response.status_code == status
+    assert expected in response.text
+
+def test_generation_key_follows_llm_backends():
+    """Test that shared generations are keyed on the configured backend chain, not only GROQ_MODEL"""
+    state = AgentState(messages=[], query="What is RAG?", context="doc a")
+    keys = {}
+    for backends in ("", "groq:", "groq:llama3-70b-8192, local", "local"):
+        with patch.object(settings, "LLM_BACKENDS", backends), patch.object(settings, "GROQ_MODEL", "llama3-70b-8192"):
+            keys[backends] = RAGPipeline._generation_key(state)
+
+    assert keys[""] == keys["groq:"]
+    assert len({keys[""], keys["groq:llama3-70b-8192, local"], keys["local"]}) == 3
+
+def test_ingestion_upserts_in_batches_and_skips_unchanged_files(models, pipeline):
+    """Test that ingestion writes large batches and re-ingesting the same file writes nothing"""
+    def ingest():
+        with open(EXAMPLES_DIR / "nvda_stock_data.csv", "rb") as f:
+            return asyncio.run(pipeline.ingest_document(UploadFile(file=f, filename="nvda_stock_data.csv")))
+
+    with patch.object(settings, "INGEST_WRITE_BATCH_SIZE", 500):
+        result = ingest()
+        first_ids = [call.kwargs["ids"] for call in models.collection.upsert.call_args_list]
+        embed_calls = models.embeddings.embed_documents.call_count
+        second = ingest()
+
+    assert result["details"]["num_documents"] == 1092
+    assert result["details"]["chunks_added"] == 1092
+    assert result["details"]["version"] == 1
+    assert result["details"]["docs_per_second"] > 0
+    assert result["details"]["embedding_cache_hit_ratio"] == 0.0
+    assert [len(ids) for ids in first_ids] == [500, 500, 92]
+    assert second["message"] == "Document unchanged"
+    assert second["details"]["chunks_unchanged"] == 1092
+    assert models.collection.upsert.call_count == len(first_ids)
+    assert models.embeddings.embed_documents.call_count == embed_calls
+
+@pytest.mark.parametrize("pipeline", [{"VECTOR_STORE": "numpy"}], indirect=True)
+def test_reingestion_writes_only_changes_and_documents_can_be_deleted(models, pipeline, api):
+    """Test that a new version embeds only new chunks, moves shifted ones, deletes stale ones, and DELETE removes it all"""
+    rows = (EXAMPLES_DIR / "nvda_stock_data.csv").read_text().splitlines()
+    header, body = rows[0], rows[1:201]
+    path = Path(settings.RAW_DATA_PATH) / "prices.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    embedded = []
+    models.embeddings.embed_documents.side_effect = lambda texts: embedded.extend(texts) or [[0.1] * 384 for _ in texts]
+    path.write_text("\n".join([header, *body]) + "\n")
+    first = asyncio.run(pipeline.ingest_file(str(path), "prices.csv"))
+    embedded.clear()
+
+    # Next version: one row edited, one removed (shifting the rest), two appended
+    edited = body[10].replace(body[10].split(",")[4], "1.0", 1)
+    path.write_text("\n".join([header, *body[:10], edited, *body[11:50], *body[51:], *rows[201:203]]) + "\n")
+    second = asyncio.run(pipeline.ingest_file(str(path), "prices.csv"))
+    stored = pipeline.vector_store.get(ids=None, include=["documents", "metadatas"], where={"source": "prices.csv"})
+    shifted = next(meta for text, meta in zip(stored["documents"], stored["metadatas"]) if body[51].split(",")[0] in text)
+
+    deleted = api.delete("/api/documents/prices.csv")
+    missing = api.delete("/api/documents/prices.csv")
+
+    assert first["details"]["chunks_added"] == 200
+    assert second["details"]["version"] == 2
+    assert second["details"]["chunks_added"] == 3
+    assert second["details"]["chunks_deleted"] == 2
+    assert second["details"]["chunks_updated"] == 0
+    assert second["details"]["chunks_moved"] == 149 and shifted["chunk"] == 50
+    assert second["details"]["chunks_unchanged"] == 49
+    assert len(embedded) == 3 and embedded[0].startswith("Date: " + body[10].split(",")[0])
+    assert len(stored["ids"]) == 201 and not any(body[50].split(",")[0] in text for text in stored["documents"])
+    assert deleted.status_code == 200 and deleted.json()["details"]["chunks_deleted"] == 201
+    assert missing.status_code == 404
+    assert pipeline.vector_store.count() == 0 and pipeline.lexical_index.search("2020", 10) == []
+    assert not path.exists()
+
+@pytest.mark.parametrize("pipeline", [NUMPY_STORE], indirect=True)
+def test_reupload_while_ingesting_keeps_each_version(models, pipeline):
+    """Test that re-uploading a file name while its previous upload is being ingested does not overwrite it"""
+    rows = (EXAMPLES_DIR / "nvda_stock_data.csv").read_text().splitlines()
+    versions = ["\n".join(rows[:11]) + "\n", "\n".join([rows[0], *rows[11:16]]) + "\n"]
+
+    def upload(text):
+        return pipeline.save_upload(UploadFile(file=io.BytesIO(text.encode()), filename="prices.csv"))
+
+    async def ingest_while_reuploading():
+        first_path, first_hash = await upload(versions[0])
+        first = asyncio.create_task(pipeline.ingest_file(first_path, "prices.csv", first_hash))
+        await asyncio.sleep(0)
+        second_path, second_hash = await upload(versions[1])
+        second = pipeline.ingest_file(second_path, "prices.csv", second_hash)
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(ingest_while_reuploading())
+    directory = Path(settings.RAW_DATA_PATH)
+
+    assert first["details"]["chunks_added"] == 10
+    assert second["details"]["chunks_added"] == 5 and second["details"]["chunks_deleted"] == 10
+    assert (directory / "prices.csv").read_text() == versions[1]
+    assert list((directory / ".pending").iterdir()) == []
+    assert len(pipeline._document_locks) == 0
+
+def test_context_assembly_drops_duplicates_and_reports_tokens_saved(models, api):
+    """Test that near-duplicate chunks are left out of the prompt and the saving is reported"""
+    models.collection.query.return_value = {
+        "ids": [["a_0", "a_1", "b_0"]],
+        "documents": [["NVIDIA revenue grew in Q3", "NVIDIA revenue grew in Q3.", "Margins were stable"]],
+        "metadatas": [[{"source": "a.pdf"}, {"source": "a-copy.pdf"}, {"source": "b.pdf"}]],
+        "distances": [[0.1, 0.1, 0.3]],
+        "embeddings": [[[1.0, 0.0], [1.0, 0.001], [0.0, 1.0]]]
+    }
+
+    with patch.object(settings, "STRUCTURED_QUERIES_ENABLED", False):
+        response = api.post("/api/query", json={"text": "How did revenue develop?", "include_timings": True})
+
+    body = response.json()
+    assert [source["document_id"] for source in body["sources"]] == ["a.pdf", "b.pdf"]
+    assert body["context_tokens_saved"] > 0
+    assert "context_assembly" in body["timings"]
+    assert models.collection.query.call_args.kwargs["include"][-1] == "embeddings"
+
+def test_hybrid_search_fuses_lexical_hits(models, pipeline):
+    """Test that a BM25-only hit is fused into the sources, and per-request weights can exclude it"""
+    pipeline.lexical_index.add(["c_0"], ["Date: 2020-01-03, Close: 5.87"])
+    pipeline.lexical_index.commit()
+    models.collection.get.return_value = {
+        "ids": ["c_0"],
+        "documents": ["Date: 2020-01-03, Close: 5.87"],
+        "metadatas": [{"source": "c.csv"}],
+        "embeddings": [[0.1] * 384]
+    }
+
+    with patch.object(settings, "STRUCTURED_QUERIES_ENABLED", False):
+        hybrid = asyncio.run(pipeline.process_query("close on 2020-01-03"))
+        lexical_first = asyncio.run(pipeline.process_query("close on 2020-01-03", fusion={"lexical_weight": 2.0}))
+        vector_only = asyncio.run(pipeline.process_query("close on 2020-01-03", fusion={"lexical_weight": 0.0}))
+
+    assert models.collection.query.call_args.kwargs["n_results"] == settings.HYBRID_CANDIDATES
+    assert [source["document_id"] for source in hybrid["sources"]] == ["a.csv", "c.csv", "b.pdf"]
+    assert hybrid["sources"][1]["relevance_score"] == pytest.approx(0.0, abs=1e-6)
+    assert "lexical_search" in hybrid["timings"]
+    assert lexical_first["sources"][0]["document_id"] == "c.csv"
+    assert [source["document_id"] for source in vector_only["sources"]] == ["a.csv", "b.pdf"]
+
+def test_session_history_is_sent_and_summarized(models, pipeline, api):
+    """Test that a session's turns reach the prompt, bypass the cache and are summarized past the budget"""
+    prompts = []
+
+    def answer(prompt):
+        prompts.append(prompt.to_messages())
+        return f"Answer to {prompts[-1][-1].content}"
+
+    async def converse():
+        for query in ("What is RAG?", "What is RAG?", "And BM25?"):
+            await pipeline.process_query(query, session_id="s1")
+            await asyncio.gather(*pipeline._background_tasks)
+
+    with patch.object(pipeline, "_generation_chain", return_value=RunnableLambda(answer)), \
+            patch.object(settings, "STRUCTURED_QUERIES_ENABLED", False), \
+            patch.object(settings, "SESSION_HISTORY_TOKENS", 12):
+        asyncio.run(converse())
+
+    assert models.collection.query.call_count == 3
+    assert [message.content for message in prompts[1][1:-1]] == ["What is RAG?", "Answer to What is RAG?"]
+    session = pipeline.sessions.get("s1")
+    assert session.summary == "Test response"
+    assert session.turns == [("And BM25?", "Answer to And BM25?")]
+    assert prompts[2][1].content.endswith("Test response")
+
+    assert api.delete("/api/sessions/s1").status_code == 204
+    assert api.delete("/api/sessions/s1").status_code == 404
+    batch = api.post("/api/query/batch", json=[{"text": "What is RAG?", "session_id": "s1"}])
+    assert batch.status_code == 400
+
+@pytest.mark.parametrize("pipeline", [{**NUMPY_STORE, "HYBRID_SEARCH_ENABLED": False}], indirect=True)
+def test_numpy_vector_store_backend(models, pipeline):
+    """Test that VECTOR_STORE=numpy stores and retrieves chunks without Chroma"""
+    batch = [("NVIDIA revenue grew", {}), ("Margins were stable", {})]
+    pipeline._write_batch(pipeline._chunk_rows(batch, "a.pdf", 0, {}), [[1.0, 0.0], [0.6, 0.8]])
+    models.embeddings.embed_documents.side_effect = lambda texts: [[1.0, 0.1] for _ in texts]
+    result = asyncio.run(pipeline.process_query("How did revenue develop?"))
+
+    models.client.assert_not_called()
+    assert [source["content"] for source in result["sources"]] == ["NVIDIA revenue grew", "Margins were stable"]
+    assert result["sources"][0]["document_id"] == "a.pdf"
+
+@pytest.mark.parametrize("pipeline", [NUMPY_STORE], indirect=True)
+def test_collections_and_metadata_filters(models, pipeline, api):
+    """Test that queries search only their collection and honour metadata filters, lexical hits included"""
+    pipeline._write_batch(pipeline._chunk_rows([("Default revenue", {})], "default.pdf", 0, {}), [[1.0, 0.0]])
+    pipeline._write_batch(pipeline._chunk_rows(
+        [("Tenant revenue report", {"page": 1}), ("Tenant revenue rows", {"day_start": 20230101, "day_end": 20230131})],
+        "report.pdf", 0, {}
+    ), [[1.0, 0.0], [0.0, 1.0]], collection="tenant-a")
+    pipeline._write_batch(pipeline._chunk_rows(
+        [("Tenant revenue 2024", {"day_start": 20240101, "day_end": 20240131})], "rows.csv", 0, {}
+    ), [[0.6, 0.8]], collection="tenant-a")
+    pipeline.lexical_index.commit()
+    pipeline.lexical_index_for("tenant-a").commit()
+    models.embeddings.embed_documents.side_effect = lambda texts: [[1.0, 0.1] for _ in texts]
+
+    default = api.post("/api/query", json={"text": "revenue"}).json()
+    tenant = api.post("/api/query", json={"text": "revenue", "collection": "tenant-a"}).json()
+    filtered = api.post("/api/query", json={
+        "text": "revenue",
+        "collection": "tenant-a",
+        "filters": {"file_types": ["csv"], "date_from": "2024-01-15"}
+    }).json()
+    missing = api.post("/api/query", json={"text": "revenue", "collection": "tenant-b"})
+
+    assert [source["content"] for source in default["sources"]] == ["Default revenue"]
+    assert {source["content"] for source in tenant["sources"]} == {"Tenant revenue report", "Tenant revenue rows", "Tenant revenue 2024"}
+    assert [source["content"] for source in filtered["sources"]] == ["Tenant revenue 2024"]
+    assert missing.status_code == 404
+
+@pytest.mark.parametrize("pipeline", [{**NUMPY_STORE, "RETRIEVAL_TOP_K": 2}], indirect=True)
+def test_filtered_query_fills_top_k_despite_lexical_hits_outside_the_filter(models, pipeline, api):
+    """Test that BM25 hits outside a filter are dropped before fusion rather than taking top-k places"""
+    pipeline._write_batch(pipeline._chunk_rows(
+        [("revenue revenue revenue", {"page": 1}), ("revenue and more revenue", {"page": 2})], "report.pdf", 0, {}
+    ), [[0.0, 1.0], [0.0, 1.0]])
+    pipeline._write_batch(pipeline._chunk_rows(
+        [("Quarterly revenue", {}), ("Sales by region", {})], "rows.csv", 0, {}
+    ), [[1.0, 0.0], [0.6, -0.8]])
+    pipeline.lexical_index.commit()
+    models.embeddings.embed_documents.side_effect = lambda texts: [[1.0, 0.1] for _ in texts]
+
+    filtered = api.post("/api/query", json={"text": "revenue", "filters": {"file_types": ["csv"]}}).json()
+
+    assert [source["content"] for source in filtered["sources"]] == ["Quarterly revenue", "Sales by region"]
+
+def test_query_filters_where_clause():
+    """Test that request filters become a vector store where clause"""
+    assert QueryRequest(text="q").where_filter() is None
+    assert QueryRequest(text="q", filters={"sources": ["a.pdf"]}).where_filter() == {"source": {"$in": ["a.pdf"]}}
+    assert QueryRequest(text="q", filters={"file_types": ["csv"], "date_to": "2023-03-31"}).where_filter() == {
+        "$and": [{"file_type": {"$in": ["csv"]}}, {"day_start": {"$lte": 20230331}}]
+    }
+
+def test_analytical_query_uses_structured_data(models, pipeline):
+    """Test that aggregations over an ingested CSV bypass vector search"""
+    with open(EXAMPLES_DIR / "nvda_stock_data.csv", "rb") as f:
+        asyncio.run(pipeline.ingest_document(UploadFile(file=f, filename="nvda_stock_data.csv")))
+    result = asyncio.run(pipeline.process_query("What was the average closing price in Q3 2023?"))
+    with patch.object(StructuredStore, "plan", autospec=True, side_effect=StructuredStore.plan) as plan:
+        batch = asyncio.run(pipeline.process_queries(["What was the average closing price in Q4 2023?"]))
+
+    models.collection.query.assert_not_called()
+    assert result["sources"][0]["document_id"] == "nvda_stock_data.csv"
+    assert "448.0284, 63" in result["sources"][0]["content"]
+    assert result["confidence"] == 1.0
+    # Batch queries are planned once, before retrieval, not again in the workflow
+    assert batch[0]["confidence"] == 1.0
+    assert plan.call_count == 1
+
+def _parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+def test_query_stream_endpoint(api):
+    """Test that the SSE endpoint sends sources first, then streamed tokens"""
+    response = api.post("/api/query/stream", json={"text": "What is RAG?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    tokens = [data for name, data in events if name == "token"]
+
+    assert events[0][0] == "sources"
+    assert [source["document_id"] for source in events[0][1]] == ["a.csv", "b.pdf"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Test response"
+    assert events[-1] == ("done", {"confidence": pytest.approx(0.7), "context_tokens_saved": 0})
+
+def test_batch_query_endpoint(models, pipeline, api):
+    """Test that a batch shares one embedding call and one search, and isolates failures"""
+    models.collection.query.side_effect = lambda query_embeddings, **kwargs: {
+        "ids": [["a_0"]] * len(query_embeddings),
+        "documents": [["doc a"]] * len(query_embeddings),
+        "metadatas": [[{"source": "a.csv"}]] * len(query_embeddings),
+        "distances": [[0.2]] * len(query_embeddings)
+    }
+
+    def answer(prompt):
+        query = prompt.to_messages()[-1].content
+        if query == "boom":
+            raise ValueError("generation failed")
+        return f"Answer to {query}"
+
+    queries = [{"text": "first"}, {"text": "boom"}, {"text": "third"}]
+    with patch.object(pipeline, "_generation_chain", return_value=RunnableLambda(answer)):
+        response = api.post("/api/query/batch", json=queries)
+
+    assert response.status_code == 200
+    results = response.json()
+    assert models.embeddings.embed_documents.call_count == 1
+    assert models.collection.query.call_count == 1
+    assert len(models.collection.query.call_args.kwargs["query_embeddings"]) == 3
+    assert [r["answer"] for r in results] == ["Answer to first", "", "Answer to third"]
+    assert results[1]["error"] == "generation failed"
+    assert results[0]["error"] is None
+
 @patch('app.services.rag_pipeline.HuggingFaceEmbeddings')
 def test_structured_data_ingestion(mock_embeddings):
     """Test ingestion of structured data (CSV)"""
@@ -47,7 +529,7 @@ def test_structured_data_ingestion(mock_embeddings):
             "/api/ingest/document",
             files={"file": ("nvda_stock_data.csv", f, "text/csv")}
         )
-    assert response.status_code == 200
+    assert response.status_code == 202
     assert "message" in response.json()
     assert "details" in response.json()
 
@@ -67,7 +549,7 @@ def test_unstructured_data_ingestion(mock_embeddings):
             "/api/ingest/document",
             files={"file": ("NVIDIAAn.pdf", f, "application/pdf")}
         )
-    assert response.status_code == 200
+    assert response.status_code == 202
     assert "message" in response.json()
     assert "details" in response.json()
 
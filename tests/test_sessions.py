@@ -0,0 +1,66 @@
+import time
+
+from app.services.sessions import Session, SessionStore, SqliteSessionStore
+
+
+def test_lru_and_ttl_eviction():
+    """Test that the least recently used session is evicted at capacity and idle ones expire"""
+    store = SessionStore(max_sessions=2, ttl_seconds=60)
+    store.add_turn("a", "q1", "a1")
+    store.add_turn("b", "q1", "a1")
+    store.get("a")
+    store.add_turn("c", "q1", "a1")
+
+    assert store.get("b") is None
+    assert store.get("a").turns == [("q1", "a1")]
+
+    store.ttl_seconds = 0
+    assert store.get("a") is None
+    assert len(store) == 1
+
+
+def test_byte_cap_drops_oldest_turns():
+    """Test that a session never holds more than max_bytes, keeping the latest turn"""
+    store = SessionStore(max_bytes=50)
+    for i in range(5):
+        session = store.add_turn("s", f"question {i}", "x" * 10)
+
+    assert session.size_bytes <= 50
+    assert session.turns[-1] == ("question 4", "x" * 10)
+    assert len(session.turns) < 5
+
+
+def test_overflow_and_compact():
+    """Test that only the oldest turns past the token budget are summarized, and only once"""
+    session = Session("s", turns=[("one two three", "four five six")] * 3)
+
+    assert session.overflow(max_tokens=20) == []
+    overflow = session.overflow(max_tokens=10, target_tokens=6)
+    assert len(overflow) == 2
+
+    store = SessionStore()
+    for question, answer in session.turns:
+        store.add_turn("s", question, answer)
+    assert store.compact("s", overflow, "summary")
+    assert not store.compact("s", overflow, "stale summary")
+    assert store.get("s").summary == "summary"
+    assert len(store.get("s").turns) == 1
+
+
+def test_sqlite_store_persists_sessions(tmp_path):
+    """Test that SQLite sessions survive a new store instance and can be deleted"""
+    db_path = str(tmp_path / "sessions.db")
+    store = SqliteSessionStore(db_path, max_sessions=1)
+    store.add_turn("a", "q1", "a1")
+    store.add_turn("b", "q1", "a1")
+    store.compact("b", [("q1", "a1")], "summary")
+
+    reopened = SqliteSessionStore(db_path)
+    assert reopened.get("a") is None
+    session = reopened.get("b")
+    assert (session.summary, session.turns) == ("summary", [])
+    assert session.updated_at <= time.time()
+
+    assert reopened.delete("b")
+    assert not reopened.delete("b")
+    assert len(reopened) == 0
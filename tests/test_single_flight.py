@@ -0,0 +1,94 @@
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+
+def _producer(calls, tokens=("a", "b", "c"), delay=0.01, error=None):
+    async def produce():
+        calls.append(1)
+        for token in tokens:
+            await asyncio.sleep(delay)
+            yield token
+        if error is not None:
+            raise error
+    return produce
+
+
+async def _collect(stream):
+    return [token async for token in stream]
+
+
+def test_concurrent_callers_share_one_stream():
+    """Test that callers joining an in-flight stream replay its tokens and get the rest"""
+    calls, shared = [], []
+    flights = SingleFlight(on_shared=lambda: shared.append(1))
+
+    async def run():
+        first = asyncio.create_task(_collect(flights.stream("key", _producer(calls))))
+        await asyncio.sleep(0.015)
+        # Joins after the first token was produced
+        second = await _collect(flights.stream("key", _producer(calls)))
+        return await first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == second == ["a", "b", "c"]
+    assert len(calls) == 1
+    assert len(shared) == 1
+    assert len(flights) == 0
+
+
+def test_finished_streams_are_not_reused():
+    """Test that a caller arriving after a stream ended starts a new one"""
+    calls = []
+    flights = SingleFlight()
+
+    async def run():
+        await _collect(flights.stream("key", _producer(calls)))
+        await _collect(flights.stream("key", _producer(calls)))
+
+    asyncio.run(run())
+
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_caller():
+    """Test that a failed stream raises its error in every caller sharing it"""
+    flights = SingleFlight()
+
+    async def run():
+        produce = _producer([], error=RuntimeError("rate limited"))
+        return await asyncio.gather(
+            *(_collect(flights.stream("key", produce)) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_stream_is_cancelled_when_every_caller_leaves():
+    """Test that the producer is cancelled once no caller is listening"""
+    flights = SingleFlight()
+    cancelled = []
+
+    async def produce():
+        try:
+            yield "a"
+            await asyncio.sleep(10)
+            yield "b"
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        stream = flights.stream("key", produce)
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return len(flights)
+
+    assert asyncio.run(run()) == 0
+    assert cancelled == [1]
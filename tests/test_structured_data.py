@@ -0,0 +1,54 @@
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from app.services.structured_data import StructuredStore
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StructuredStore(str(tmp_path / "structured.db"))
+    append = store.table_writer("nvda_stock_data.csv")
+    for frame in pd.read_csv(EXAMPLES_DIR / "nvda_stock_data.csv", chunksize=250):
+        append(frame)
+    return store
+
+
+def test_plan_parses_aggregation_column_and_period(store):
+    """Test that an analytical question becomes an aggregate over a date range"""
+    plan = store.plan("What was the average closing price in Q3 2023?")
+
+    assert plan.aggregation == "AVG"
+    assert plan.columns == ["Close"]
+    assert plan.date_range == (date(2023, 7, 1), date(2023, 9, 30))
+
+
+def test_non_analytical_queries_fall_back(store):
+    """Test that open-ended questions are left to vector search"""
+    assert store.plan("What is NVIDIA's business?") is None
+    assert store.plan("How many employees does NVIDIA have?") is None
+
+
+def test_execute_returns_compact_table(store):
+    """Test aggregate, extreme-value and lookup results"""
+    average = store.execute(store.plan("average close in Q3 2023"))
+    highest = store.execute(store.plan("highest volume in 2021"))
+    lookup = store.execute(store.plan("closing price on 2020-01-03"))
+
+    assert average.rows[0][1] == 63
+    assert average.rows[0][0] == pytest.approx(448.0284, abs=1e-4)
+    assert highest.rows == [("2021-11-04 00:00:00", 115363100)]
+    assert lookup.to_context().splitlines()[-1] == "2020-01-03 00:00:00, 59.0175"
+
+
+def test_reingesting_replaces_table(store):
+    """Test that writing the same source again replaces its rows"""
+    append = store.table_writer("nvda_stock_data.csv")
+    append(pd.read_csv(EXAMPLES_DIR / "nvda_stock_data.csv").head(10))
+
+    count = store.execute(store.plan("how many rows in 2020"))
+    assert count.rows[0][0] == 10
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from app.services import vector_store
+from app.services.vector_store import NumpyVectorStore
+
+
+def _clustered(num_vectors, dimensions=16, clusters=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions))
+    vectors = centers[rng.integers(clusters, size=num_vectors)] + 0.1 * rng.normal(size=(num_vectors, dimensions))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _fill(store, vectors, prefix="c"):
+    ids = [f"{prefix}_{i}" for i in range(len(vectors))]
+    store.upsert(ids, vectors.tolist(), [f"text {i}" for i in ids], [{"source": f"{i}.csv"} for i in ids])
+    return ids
+
+
+def test_exact_search_matches_brute_force(tmp_path):
+    """Test that exact search returns the true nearest chunks with cosine distances and stored fields"""
+    vectors = _clustered(500)
+    store = NumpyVectorStore(str(tmp_path), dtype="float32")
+    ids = _fill(store, vectors)
+    queries = _clustered(3, seed=1)
+
+    results = store.query(queries.tolist(), n_results=5, include=["documents", "metadatas", "distances", "embeddings"])
+
+    for query, result_ids, distances in zip(queries, results["ids"], results["distances"]):
+        expected = np.argsort(-(vectors @ query))[:5]
+        assert result_ids == [ids[i] for i in expected]
+        assert distances == pytest.approx((1 - vectors[expected] @ query).tolist(), abs=1e-5)
+    assert results["documents"][0][0] == f"text {results['ids'][0][0]}"
+    assert results["metadatas"][0][0] == {"source": f"{results['ids'][0][0]}.csv"}
+    assert len(results["embeddings"][0][0]) == 16
+
+
+def test_upsert_delete_and_reopen(tmp_path):
+    """Test that replaced and deleted chunks disappear, survive a reopen, and compaction keeps results"""
+    vectors = _clustered(100)
+    store = NumpyVectorStore(str(tmp_path))
+    ids = _fill(store, vectors)
+    store.upsert(["c_0"], [vectors[1].tolist()], ["replaced"], [{"source": "new.csv"}])
+    store.delete(["c_1"])
+
+    assert store.count() == 99
+    reopened = NumpyVectorStore(str(tmp_path))
+    top = reopened.query([vectors[1].tolist()], n_results=1)
+    assert top["ids"] == [["c_0"]]
+    assert top["documents"] == [["replaced"]]
+    assert reopened.get(["c_1", "c_2"])["ids"] == ["c_2"]
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(vector_store, "COMPACT_MIN_DEAD_ROWS", 1)
+        reopened.upsert(ids[2:], vectors[2:].tolist(), ["again"] * 98, [{}] * 98)
+        reopened.commit()
+    assert len(list(tmp_path.glob("vectors_*.bin"))) == 1
+    assert reopened.count() == 99
+    assert reopened.query([vectors[1].tolist()], n_results=1)["ids"] == [["c_0"]]
+    assert NumpyVectorStore(str(tmp_path)).query([vectors[5].tolist()], n_results=1)["ids"] == [["c_5"]]
+
+
+def test_ivf_search_recall(tmp_path):
+    """Test that IVF search finds nearly all true neighbours and covers rows added after training"""
+    vectors = _clustered(4000)
+    store = NumpyVectorStore(str(tmp_path), ivf_lists=16, ivf_probes=4)
+    ids = _fill(store, vectors)
+    store.commit()
+    assert store._ivf is not None
+    store.upsert(["late"], [vectors[0].tolist()], ["late"], [{}])
+
+    queries = _clustered(20, seed=1)
+    results = store.query(queries.tolist(), n_results=10)
+    recall = np.mean([
+        len(set(result) & {ids[i] for i in np.argsort(-(vectors @ query))[:10]}) / 10
+        for query, result in zip(queries, results["ids"])
+    ])
+    assert recall >= 0.9
+    assert set(store.query([vectors[0].tolist()], n_results=2)["ids"][0]) == {"c_0", "late"}
+
+
+def test_where_filters(tmp_path):
+    """Test that where filters restrict query and get to matching chunks, as Chroma would"""
+    vectors = _clustered(200)
+    store = NumpyVectorStore(str(tmp_path), dtype="float32")
+    ids = [f"c_{i}" for i in range(len(vectors))]
+    metadatas = [{"file_type": "csv" if i % 2 else "pdf", "day_start": 20200100 + i % 30} for i in range(len(vectors))]
+    store.upsert(ids, vectors.tolist(), ids, metadatas)
+    where = {"$and": [{"file_type": {"$in": ["csv"]}}, {"day_start": {"$lte": 20200110}}]}
+    matching = {doc_id for doc_id, metadata in zip(ids, metadatas) if metadata["file_type"] == "csv" and metadata["day_start"] <= 20200110}
+
+    results = store.query(vectors[:2].tolist(), n_results=5, where=where)
+    fetched = store.get(ids=ids[:20], where={"$or": [{"file_type": "pdf"}, {"day_start": 20200101}]})
+
+    for query, result_ids in zip(vectors[:2], results["ids"]):
+        rows = sorted((int(doc_id[2:]) for doc_id in matching), key=lambda i: -float(vectors[i] @ query))
+        assert result_ids == [ids[i] for i in rows[:5]]
+    assert set(fetched["ids"]) == {f"c_{i}" for i in range(20) if i % 2 == 0 or i == 1}
+    assert store.query(vectors[:1].tolist(), n_results=5, where={"file_type": "docx"})["ids"] == [[]]
+    assert vector_store.where_sql({"source": {"$ne": "a.pdf"}}) == ('json_extract(metadata, ?) != ?', ['$."source"', "a.pdf"])